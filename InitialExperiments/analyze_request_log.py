@@ -0,0 +1,122 @@
+import argparse
+import csv
+import gzip
+import json
+import math
+
+# Upper bounds of the section size groups, same as the section size histogram of the server.
+SIZE_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000]
+QUANTILES = [0.5, 0.9, 0.99]
+
+
+class QuantileSketch:
+    """
+    Latency distribution in logarithmic bins, each quantile is estimated within the relative accuracy.
+    The number of bins only depends on the range of the values, not on how many were added.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zeros = 0
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.max = max(self.max, value)
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Middle of the bin, in relative terms.
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return self.max
+
+
+def open_log(path: str):
+    # Rotated logs may have been compressed.
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def size_bucket(rows: int) -> int:
+    for bound in SIZE_BUCKETS:
+        if rows <= bound:
+            return bound
+    return math.inf
+
+
+def analyze(paths: list[str], stage: str, knowledge_base: str | None) -> (dict, int, int):
+    """
+    Reads the request logs line by line and groups the duration of the stage by (strategy, section size group).
+    :return: tuple of (groups, records used, lines skipped)
+    """
+
+    groups = {}
+    used = 0
+    skipped = 0
+    for path in paths:
+        with open_log(path) as log_file:
+            for line in log_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+
+                # Only the guess turns that scored a section, answered with success.
+                if record.get("status") != 200 or "strategy" not in record or "section_rows" not in record:
+                    continue
+                if knowledge_base is not None and record.get("knowledge_base") != knowledge_base:
+                    continue
+                duration = record["total_ms"] if stage == "total" else record.get("stages_ms", {}).get(stage)
+                if duration is None:
+                    continue
+
+                key = (record["strategy"], size_bucket(record["section_rows"]))
+                if key not in groups:
+                    groups[key] = QuantileSketch()
+                groups[key].add(duration)
+                used += 1
+    return groups, used, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency quantiles per strategy and section size of the "
+                                                 "JSON-lines request logs of the server.")
+    parser.add_argument("paths", nargs="+", help="Request log files, rotated and .gz ones included.")
+    parser.add_argument("--stage", default="total", help="Stage to analyze: total, retrieve, dataframe or score.")
+    parser.add_argument("--knowledge-base", default=None, help="Only the requests of this knowledge base.")
+    parser.add_argument("--output", default="Output/request_latency.csv", help="CSV file of the table.")
+    args = parser.parse_args()
+
+    groups, used, skipped = analyze(args.paths, args.stage, args.knowledge_base)
+    print(f"{used} requests, {skipped} unreadable lines, stage: {args.stage} (ms)")
+
+    header = ["strategy", "max_section_rows", "count"] + [f"p{round(q * 100)}_ms" for q in QUANTILES] + ["max_ms"]
+    rows = []
+    for (strategy, bucket), sketch in sorted(groups.items()):
+        rows.append([strategy, bucket, sketch.count] + [round(sketch.quantile(q), 3) for q in QUANTILES] +
+                    [round(sketch.max, 3)])
+
+    print(("{:>22} {:>16} {:>8}" + " {:>10}" * (len(QUANTILES) + 1)).format(*header))
+    for row in rows:
+        print(("{:>22} {:>16} {:>8}" + " {:>10}" * (len(QUANTILES) + 1)).format(*row))
+
+    with open(args.output, "w", newline="") as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(header)
+        writer.writerows(rows)
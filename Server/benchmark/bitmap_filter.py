@@ -0,0 +1,77 @@
+"""
+Filter time of the bitmap index as the number of answered questions grows from 0 to max_depth,
+compared with a boolean mask filter over the code columns.
+Run from the Server directory: python -m benchmark.bitmap_filter
+"""
+import random
+import time
+
+import numpy as np
+
+from benchmark.datasets import load_snapshot
+from model.dto.guess_model import GuessInput, Question
+from service.strategy.kernels import MISSING_CODE
+
+GAMES = 200
+REPETITIONS = 20
+
+
+def mask_filter(snapshot, questions: list[Question]) -> np.ndarray:
+    mask = np.ones(snapshot.n_rows, dtype=bool)
+    for question in questions:
+        index = snapshot.attribute_indices.get(question.name)
+        if not question.answer or index is None:
+            continue
+        column = snapshot.codes[:, index]
+        mask &= (column == MISSING_CODE) | (column == snapshot.value_codes[index].get(question.answer, -1))
+    return mask
+
+
+def random_game(snapshot, max_depth: int, unknown_rate: float = 0.1) -> list[Question]:
+    """
+    Answers of a random item, for random attributes, sometimes answered as unknown.
+    """
+
+    row = random.randrange(snapshot.n_rows)
+    attributes = random.sample(snapshot.attributes, max_depth)
+    questions = []
+    for attribute in attributes:
+        index = snapshot.attribute_indices[attribute]
+        code = snapshot.codes[row, index]
+        answer = None
+        if code != MISSING_CODE and random.random() >= unknown_rate:
+            answer = snapshot.values[index][code - 1]
+        questions.append(Question(name=attribute, answer=answer))
+    return questions
+
+
+def measure(function, repetitions: int) -> float:
+    start_time = time.perf_counter()
+    for __ in range(repetitions):
+        function()
+    return (time.perf_counter() - start_time) / repetitions
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    max_depth = GuessInput(questions=[]).max_depth
+
+    for dataset_name in ["criminal", "anime_full"]:
+        snapshot = load_snapshot(dataset_name)
+        games = [random_game(snapshot, max_depth) for __ in range(GAMES)]
+        print(f"{dataset_name}: {snapshot.n_rows} items, {len(snapshot.attributes)} attributes")
+        print(f"{'depth':>5} {'items':>8} {'bitmap us':>10} {'mask us':>10}")
+
+        for depth in range(max_depth + 1):
+            sizes = []
+            bitmap_time = 0.0
+            mask_time = 0.0
+            for questions in games:
+                questions = questions[:depth]
+                bitmap = snapshot.filter(questions)
+                assert np.array_equal(snapshot.index.to_rows(bitmap), np.flatnonzero(mask_filter(snapshot, questions)))
+                sizes.append(snapshot.index.count(bitmap))
+                bitmap_time += measure(lambda: snapshot.filter(questions), REPETITIONS)
+                mask_time += measure(lambda: mask_filter(snapshot, questions), REPETITIONS)
+
+            print(f"{depth:>5} {np.mean(sizes):>8.1f} {bitmap_time / GAMES * 1e6:>10.2f} {mask_time / GAMES * 1e6:>10.2f}")
@@ -0,0 +1,109 @@
+"""
+Latency of cheap guess requests (cached paths) while heavy requests (uncached strategies on the full anime set)
+run on the same event loop, with the strategy work inline (the previous endpoints) and offloaded to the CPU executor.
+Run from the Server directory: python -m benchmark.concurrency [--workers N] [--heavy-clients N]
+"""
+import argparse
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmark.bitmap_filter import random_game
+from benchmark.datasets import load_snapshot
+from model.dto.guess_model import GuessInput
+from service.best_question_cache import BestQuestionCache
+from service.find_question_service import FindQuestionService, FindStrategy
+from service.guess_service import GuessService, GuessOptions
+
+# Interval between two cheap requests, and duration of a run.
+CHEAP_INTERVAL_SECONDS = 0.005
+RUN_SECONDS = 3.0
+
+
+async def cheap_client(service: GuessService, guess_input: GuessInput, stop_time: float) -> list[float]:
+    """
+    Sends a cheap request every CHEAP_INTERVAL_SECONDS. The latency is measured from the time the request was due,
+    so the time spent waiting for a blocked event loop is counted.
+    """
+
+    tasks = []
+
+    async def request(due_time: float) -> float:
+        await service.predict_next_question_async(guess_input)
+        return time.perf_counter() - due_time
+
+    start_time = time.perf_counter()
+    index = 0
+    while time.perf_counter() < stop_time:
+        due_time = start_time + index * CHEAP_INTERVAL_SECONDS
+        delay = due_time - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(request(due_time)))
+        index += 1
+    return list(await asyncio.gather(*tasks))
+
+
+async def heavy_client(service: GuessService, games: list, offloaded: bool, stop_time: float,
+                       strategy: FindStrategy = FindStrategy.GINI_IMPURITY) -> int:
+    requests = 0
+    while time.perf_counter() < stop_time:
+        questions = random.choice(games)[:random.randrange(3)]
+        guess_input = GuessInput(questions=questions)
+        if offloaded:
+            await service.predict_next_question_async(guess_input, strategy)
+        else:
+            # What the endpoints did before: the strategy runs on the event loop.
+            service.predict_next_question(guess_input, strategy)
+            await asyncio.sleep(0)
+        requests += 1
+    return requests
+
+
+async def run(cheap_service: GuessService, cheap_input: GuessInput, heavy_service: GuessService, games: list,
+              heavy_clients: int, offloaded: bool, strategy: FindStrategy = FindStrategy.GINI_IMPURITY,
+              run_seconds: float = RUN_SECONDS) -> (list[float], int):
+    stop_time = time.perf_counter() + run_seconds
+    heavy = [heavy_client(heavy_service, games, offloaded, stop_time, strategy) for __ in range(heavy_clients)]
+    latencies, *heavy_requests = await asyncio.gather(cheap_client(cheap_service, cheap_input, stop_time), *heavy)
+    return latencies, sum(heavy_requests)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cheap request latency while heavy requests run.")
+    parser.add_argument("--workers", type=int, default=2, help="Size of the CPU executor.")
+    parser.add_argument("--heavy-clients", type=int, default=4, help="Concurrent clients sending heavy requests.")
+    args = parser.parse_args()
+
+    random.seed(0)
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    find_question_service = FindQuestionService()
+
+    # Cheap requests hit the cache of the criminal set.
+    criminal_snapshot = load_snapshot("criminal")
+    cheap_service = GuessService(None, find_question_service, criminal_snapshot.target_field, criminal_snapshot,
+                                 "criminal", GuessOptions(cache=BestQuestionCache(), executor=executor))
+    cheap_input = GuessInput(questions=[])
+    cheap_service.predict_next_question(cheap_input)
+
+    # Heavy requests evaluate a strategy on the full anime set, without cache.
+    anime_snapshot = load_snapshot("anime_full")
+    heavy_service = GuessService(None, find_question_service, anime_snapshot.target_field, anime_snapshot,
+                                 "anime", GuessOptions(executor=executor))
+    max_depth = GuessInput(questions=[]).max_depth
+    games = [random_game(anime_snapshot, max_depth) for __ in range(50)]
+
+    print(f"CPU executor: {args.workers} workers, {args.heavy_clients} heavy clients, {RUN_SECONDS} s per run")
+    print(f"{'mode':>10} {'cheap':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'heavy':>6}")
+    for mode, heavy_clients, offloaded in [("idle", 0, True), ("inline", args.heavy_clients, False),
+                                           ("offloaded", args.heavy_clients, True)]:
+        latencies, heavy_requests = asyncio.run(run(cheap_service, cheap_input, heavy_service, games,
+                                                    heavy_clients, offloaded))
+        latencies = np.array(latencies) * 1e3
+        print(f"{mode:>10} {len(latencies):>6} {np.percentile(latencies, 50):>8.2f} "
+              f"{np.percentile(latencies, 99):>8.2f} {latencies.max():>8.2f} {heavy_requests:>6}")
+
+    executor.shutdown()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+
+import pandas as pd
+from pandas import DataFrame
+
+from service.knowledge_snapshot import KnowledgeSnapshot
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "InitialExperiments", "Resources")
+
+
+class Dataset:
+    def __init__(self, name: str, file_name: str, target_field: str, drop_columns: list[str] = None):
+        self.name = name
+        self.path = os.path.join(RESOURCES_DIR, file_name)
+        self.target_field = target_field
+        self.drop_columns = drop_columns or []
+
+    def load(self) -> DataFrame:
+        data = pd.read_csv(self.path)
+        data = data.drop([column for column in self.drop_columns if column in data.columns], axis=1)
+
+        # Same as the knowledge base import, 1/0 columns are stored as Yes/No.
+        for column_name in data.columns:
+            if set(data[column_name].unique()) == {0, 1}:
+                data[column_name] = data[column_name].map({0: 'No', 1: 'Yes'})
+        return data
+
+
+DATASETS = {
+    "criminal": Dataset("criminal", "CriminalAkinatorDB.knowledge.csv", "ProfileId", ["_id"]),
+    "anime_full": Dataset("anime_full", "anime_traits_better.csv", "Names", ["Id"]),
+    "anime_25": Dataset("anime_25", "anime_25_classes_93_features.csv", "Names", ["Id"]),
+    "anime_82": Dataset("anime_82", "anime_82_classes_172_features.csv", "Names", ["Id"]),
+    "play_tennis": Dataset("play_tennis", "PlayTennis.csv", "Play Tennis"),
+}
+
+
+def load_dataset(name: str) -> (DataFrame, str):
+    dataset = DATASETS[name]
+    return dataset.load(), dataset.target_field
+
+
+def to_documents(data: DataFrame) -> list[dict]:
+    """
+    Knowledge items as stored in the knowledge collection: missing attributes are left out.
+    """
+
+    return [{attribute: value for attribute, value in row.items() if value == value}
+            for row in data.to_dict("records")]
+
+
+def to_attribute_values(data: DataFrame) -> dict[str, list]:
+    return {column: [value for value in data[column].unique() if value == value] for column in data.columns}
+
+
+def load_snapshot(name: str) -> KnowledgeSnapshot:
+    data, target_field = load_dataset(name)
+    return KnowledgeSnapshot.from_documents(to_documents(data), to_attribute_values(data), target_field)
@@ -0,0 +1,96 @@
+"""
+Time of image lookups with a "name contains" query per lookup, and with the folder index, against a fake Drive client
+answering after a fixed latency. Also checks that both return the same files.
+Run from the Server directory: python -m benchmark.drive_index
+"""
+import random
+import re
+import time
+
+from service.google_drive_service import GoogleDriveService, MediaCategory
+
+API_LATENCY_SECONDS = 0.05
+FILES_PER_FOLDER = 2500
+LOOKUPS = 100
+
+
+class FakeDriveService:
+    """
+    The part of the Drive v3 client used by GoogleDriveService: files().list(...).execute(), with paging
+    and the "in parents" and "name contains" conditions.
+    """
+
+    def __init__(self, folders: dict[str, list[dict]], latency_seconds: float):
+        self.folders = folders
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+
+    def files(self):
+        return self
+
+    def list(self, pageSize: int = 100, pageToken: str = None, fields: str = None, q: str = ""):
+        return FakeRequest(self, pageSize, pageToken, q)
+
+
+class FakeRequest:
+
+    def __init__(self, drive: FakeDriveService, page_size: int, page_token: str | None, query: str):
+        self.drive = drive
+        self.page_size = page_size
+        self.page_token = page_token
+        self.query = query
+
+    def execute(self) -> dict:
+        self.drive.calls += 1
+        time.sleep(self.drive.latency_seconds)
+
+        folder_id = re.search(r'"([^"]+)" in parents', self.query).group(1)
+        name_match = re.search(r'name contains "([^"]+)"', self.query)
+        files = [file for file in self.drive.folders.get(folder_id, [])
+                 if name_match is None or name_match.group(1) in file["name"]]
+
+        start = int(self.page_token or 0)
+        response = {"files": [dict(file) for file in files[start:start + self.page_size]]}
+        if start + self.page_size < len(files):
+            response["nextPageToken"] = str(start + self.page_size)
+        return response
+
+
+def make_folders() -> dict[str, list[dict]]:
+    folders = {}
+    for category in MediaCategory:
+        folder_id = GoogleDriveService(None, lambda: FakeDriveService({}, 0.0)).indices[category].folder_id
+        folders[folder_id] = [{"id": f"{category.value}-{index}", "name": f"{index:06d}.jpg", "mimeType": "image/jpeg",
+                               "size": "20480", "thumbnailLink": f"https://lh3.example/{category.value}/{index}=s220"}
+                              for index in range(FILES_PER_FOLDER)]
+    return folders
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    folders = make_folders()
+    names = [f"{random.randrange(FILES_PER_FOLDER):06d}.jpg" for __ in range(LOOKUPS)]
+
+    query_drive = FakeDriveService(folders, API_LATENCY_SECONDS)
+    query_service = GoogleDriveService(None, lambda: query_drive)
+    start_time = time.perf_counter()
+    query_results = [query_service.get_image_url(name, MediaCategory.METADATA) for name in names]
+    query_time = time.perf_counter() - start_time
+
+    index_drive = FakeDriveService(folders, API_LATENCY_SECONDS)
+    index_service = GoogleDriveService(None, lambda: index_drive)
+    start_time = time.perf_counter()
+    for category in MediaCategory:
+        index_service.refresh_index(category)
+    load_time = time.perf_counter() - start_time
+    load_calls = index_drive.calls
+
+    start_time = time.perf_counter()
+    index_results = [index_service.get_image_url(name, MediaCategory.METADATA) for name in names]
+    index_time = time.perf_counter() - start_time
+
+    assert [result["files"] for result in query_results] == [result["files"] for result in index_results]
+    print(f"{LOOKUPS} lookups, {FILES_PER_FOLDER} files per folder, {API_LATENCY_SECONDS * 1000:.0f} ms per API call")
+    print(f"query per lookup: {query_time * 1000 / LOOKUPS:8.3f} ms per lookup, {query_drive.calls} API calls")
+    print(f"folder index:     {index_time * 1000 / LOOKUPS:8.3f} ms per lookup, "
+          f"{index_drive.calls - load_calls} API calls (+{load_calls} calls, {load_time:.2f} s to load 3 folders)")
@@ -0,0 +1,81 @@
+"""
+Time to resolve the metadata images of a question, one Drive query after the other and with get_image_urls,
+through the real Drive client against a local stand-in server answering files.list after a fixed latency.
+The folder index is left empty, so every image is queried. One image answers after the client timeout.
+Run from the Server directory: python -m benchmark.drive_lookups
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import httplib2
+from googleapiclient.discovery import build
+
+from service.google_drive_service import GoogleDriveService, MediaCategory
+
+LATENCY_SECONDS = 0.1
+TIMEOUT_SECONDS = 1.0
+SLOW_IMAGE = "slow.jpg"
+IMAGES_PER_QUESTION = [1, 4, 8, 16]
+
+
+class DriveStandInHandler(BaseHTTPRequestHandler):
+    """
+    GET /drive/v3/files?q=... answering one file per "name contains" query, after LATENCY_SECONDS
+    (SLOW_IMAGE answers after twice the client timeout).
+    """
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        name = re.search(r'name contains "([^"]+)"', query).group(1)
+        time.sleep(2 * TIMEOUT_SECONDS if name == SLOW_IMAGE else LATENCY_SECONDS)
+
+        body = json.dumps({"files": [{"id": f"id-{name}", "name": name, "mimeType": "image/jpeg", "size": "1024",
+                                      "thumbnailLink": f"https://lh3.example/{name}=s220"}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def client_factory(port: int):
+    def build_client():
+        return build("drive", "v3", http=httplib2.Http(timeout=TIMEOUT_SECONDS), static_discovery=True,
+                     client_options={"api_endpoint": f"http://127.0.0.1:{port}/"})
+
+    return build_client
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DriveStandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service = GoogleDriveService(None, client_factory(server.server_address[1]), timeout_seconds=TIMEOUT_SECONDS)
+
+    print(f"stand-in latency {LATENCY_SECONDS * 1000:.0f} ms per query")
+    print(f"{'images':>7} {'serial ms':>10} {'concurrent ms':>14}")
+    for count in IMAGES_PER_QUESTION:
+        names = [f"{index:06d}.jpg" for index in range(count)]
+
+        start_time = time.perf_counter()
+        serial = [service.get_image_url(name, MediaCategory.METADATA) for name in names]
+        serial_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        concurrent = service.get_image_urls(names, MediaCategory.METADATA)
+        concurrent_time = time.perf_counter() - start_time
+
+        assert serial == concurrent
+        print(f"{count:>7} {serial_time * 1000:>10.1f} {concurrent_time * 1000:>14.1f}")
+
+    start_time = time.perf_counter()
+    results = service.get_image_urls(["000000.jpg", SLOW_IMAGE, "000001.jpg"], MediaCategory.METADATA)
+    print(f"with a query past the {TIMEOUT_SECONDS} s timeout: {(time.perf_counter() - start_time) * 1000:.1f} ms, "
+          f"resolved {[result is not None for result in results]}")
+    server.shutdown()
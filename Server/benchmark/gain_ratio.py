@@ -0,0 +1,126 @@
+"""
+Compares the contingency table gain ratio kernel with the list based implementation it replaced.
+Run from the Server directory: python -m benchmark.gain_ratio
+"""
+import math
+import time
+
+from benchmark.datasets import load_dataset
+from service.strategy.kernels import check_not_null_nan
+from service.strategy.strategies import GainRatioQuestionStrategy, RATIO_TOLERANCE
+
+
+def legacy_gain_ratio(entries: list[list], feature_list: list[str], weights: list[float],
+                      as_c45: bool = False) -> str:
+    """
+    Previous GainRatioQuestionStrategy.__calculate, kept as reference.
+    With as_c45=True the split info is reset for each feature, unknown values are treated as in C4.5
+    (the gain is scaled by the known fraction and the unknown subset is one more branch of the split info)
+    and only the features with at least the average gain are candidates.
+    """
+
+    def get_entropy(subset_entries, subset_weights):
+        class_counts = {}
+        total_weight = 0.0
+        for i, record in enumerate(subset_entries):
+            label = record[-1]
+            class_counts[label] = class_counts.get(label, 0.0) + subset_weights[i]
+            total_weight += subset_weights[i]
+
+        entropy = 0.0
+        for count in class_counts.values():
+            probability = count / total_weight
+            entropy -= probability * math.log2(probability)
+        return entropy
+
+    def split_data(subset_entries, feature_index, feature_value, subset_weights):
+        split_entries = []
+        split_weights = []
+        for i, record in enumerate(subset_entries):
+            if record[feature_index] == feature_value:
+                split_entries.append(record[:feature_index] + record[feature_index + 1:])
+                split_weights.append(subset_weights[i])
+        return split_entries, split_weights
+
+    gains = []
+    split_info = 0.0
+
+    for feature_index in range(len(feature_list)):
+        if as_c45:
+            split_info = 0.0
+
+        filtered_entries_weights = [(entry, weight) for entry, weight in zip(entries, weights)
+                                    if check_not_null_nan(entry[feature_index])]
+        filtered_entries = [entry for entry, __ in filtered_entries_weights]
+        filtered_weights = [weight for __, weight in filtered_entries_weights]
+
+        feature_entropy = 0.0
+        for value in set(record[feature_index] for record in filtered_entries):
+            subset, subset_weights = split_data(filtered_entries, feature_index, value, filtered_weights)
+            subset_probability = sum(subset_weights) / sum(weights)
+            feature_entropy += subset_probability * get_entropy(subset, subset_weights)
+            if subset_probability != 0:
+                split_info -= subset_probability * math.log2(subset_probability)
+
+        known_probability = 1.0
+        if as_c45:
+            known_probability = sum(filtered_weights) / sum(weights)
+            if known_probability < 1:
+                split_info -= (1 - known_probability) * math.log2(1 - known_probability)
+
+        gain = known_probability * get_entropy(filtered_entries, filtered_weights) - feature_entropy
+        gains.append((gain, split_info))
+
+    average_gain = sum(gain for gain, __ in gains) / len(gains) if as_c45 else -math.inf
+    gain_ratios = [gain / feature_split_info if feature_split_info != 0.0 and gain >= average_gain - 1e-12 else 0.0
+                   for gain, feature_split_info in gains]
+
+    if not as_c45:
+        # Strictly greater ratio wins, in column order.
+        best_attribute = None
+        best_gain_ratio = 0.0
+        for feature_index, gain_ratio in enumerate(gain_ratios):
+            if gain_ratio > best_gain_ratio:
+                best_gain_ratio = gain_ratio
+                best_attribute = feature_list[feature_index]
+        return best_attribute
+
+    # First feature among the (rounding) equal best ratios.
+    best_gain_ratio = max(gain_ratios)
+    if best_gain_ratio <= 0.0:
+        return None
+    return next(feature_list[index] for index, gain_ratio in enumerate(gain_ratios)
+                if gain_ratio >= best_gain_ratio - RATIO_TOLERANCE)
+
+
+def run_legacy(data, target_field: str, as_c45: bool) -> str:
+    features = [column for column in data.columns if column != target_field]
+    entries = data[features + [target_field]].values.tolist()
+    return legacy_gain_ratio(entries, features, [1] * len(entries), as_c45)
+
+
+def measure(function, repetitions: int):
+    result = None
+    start_time = time.perf_counter()
+    for __ in range(repetitions):
+        result = function()
+    return result, (time.perf_counter() - start_time) / repetitions
+
+
+if __name__ == "__main__":
+    strategy = GainRatioQuestionStrategy()
+
+    for dataset_name, repetitions in [("criminal", 5), ("anime_full", 1)]:
+        data, target_field = load_dataset(dataset_name)
+        print(f"{dataset_name}: {len(data)} rows, {len(data.columns) - 1} features")
+
+        legacy_feature, legacy_time = measure(lambda: run_legacy(data, target_field, False), repetitions)
+        reference_feature, __ = measure(lambda: run_legacy(data, target_field, True), 1)
+        (kernel_feature, __), kernel_time = measure(lambda: strategy.find_best_feature(data, target_field),
+                                                    repetitions * 20)
+
+        print(f"  legacy: {legacy_time:.4f} seconds -> {legacy_feature}")
+        print(f"  kernel: {kernel_time:.4f} seconds -> {kernel_feature}")
+        print(f"  speedup: {legacy_time / kernel_time:.1f}x")
+        print(f"  matches the C4.5 reference ({reference_feature}): "
+              f"{kernel_feature == reference_feature}")
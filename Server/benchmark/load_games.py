@@ -0,0 +1,258 @@
+"""
+End-to-end load of whole games against the FastAPI app: N concurrent players each pick a character of the knowledge
+base and answer the /guess/{set} questions truthfully from its row ("don't know" at --unknown-rate, and for the
+attributes the character does not have) until a guess comes back. Reports per strategy the turn latency p50/p99,
+the throughput in turns per second, the game length and how many guesses were right.
+The app runs in process (httpx ASGI transport) from a temporary working directory, on a Mongo stand-in (mongomock)
+filled from the bundled CSV files; the Drive background tasks are disabled.
+Run from the Server directory:
+    python -m benchmark.load_games [--set criminal] [--players 16] [--games 200] [--sessions]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import httpx
+import mongomock
+import numpy as np
+import pymongo
+
+from benchmark.datasets import load_dataset, to_documents, to_attribute_values
+
+# Knowledge base of each set, as imported by KnowledgeBase/save_to_mongo.py, and its connection string.
+STAND_IN_CONNECTION = "mongodb://stand-in:27017/"
+SETS = {
+    "anime": ("anime_full", "anime_knowledge_base", "mongodb://localhost:27017/"),
+    "criminal": ("criminal", "CriminalAkinatorDB", STAND_IN_CONNECTION),
+}
+MAX_TURNS = 100
+
+
+class MongoStandIn:
+    """
+    One mongomock client per connection string, shared by the sync and async services as a server would be.
+    """
+
+    clients = {}
+
+    @classmethod
+    def client(cls, connection_str: str = STAND_IN_CONNECTION, *args, **kwargs) -> mongomock.MongoClient:
+        if connection_str not in cls.clients:
+            cls.clients[connection_str] = mongomock.MongoClient(connection_str)
+        return cls.clients[connection_str]
+
+    @classmethod
+    def fill(cls, connection_str: str, database_name: str, dataset: str):
+        data, target_field = load_dataset(dataset)
+        database = cls.client(connection_str)[database_name]
+        database["metadata"].insert_one({"target_column": target_field})
+        database["knowledge"].insert_many(to_documents(data))
+        database["attributes"].insert_many([{"_id": attribute, "values": values}
+                                            for attribute, values in to_attribute_values(data).items()])
+
+
+class AsyncCursorStandIn:
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def to_list(self, length: int | None = None) -> list[dict]:
+        return list(self.cursor)
+
+
+class AsyncCollectionStandIn:
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, *args, **kwargs) -> AsyncCursorStandIn:
+        return AsyncCursorStandIn(self.collection.find(*args, **kwargs))
+
+    async def find_one(self, *args, **kwargs) -> dict | None:
+        return self.collection.find_one(*args, **kwargs)
+
+    def aggregate(self, *args, **kwargs) -> AsyncCursorStandIn:
+        return AsyncCursorStandIn(self.collection.aggregate(*args, **kwargs))
+
+    async def count_documents(self, *args, **kwargs) -> int:
+        return self.collection.count_documents(*args, **kwargs)
+
+
+class AsyncClientStandIn:
+    """
+    The part of AsyncIOMotorClient used by AsyncMongoService, over the mongomock client.
+    """
+
+    def __init__(self, connection_str: str, *args, **kwargs):
+        self.client = MongoStandIn.client(connection_str)
+
+    def __getitem__(self, database_name: str):
+        database = self.client[database_name]
+
+        class Database:
+            def __getitem__(self, collection_name: str) -> AsyncCollectionStandIn:
+                return AsyncCollectionStandIn(database[collection_name])
+
+        return Database()
+
+
+def load_app():
+    """
+    Imports and starts the app on the stand-ins, from a temporary working directory holding its files (books, shards,
+    logs...).
+    """
+
+    # The app loads both knowledge bases.
+    for dataset, database_name, connection_str in SETS.values():
+        MongoStandIn.fill(connection_str, database_name, dataset)
+
+    os.chdir(tempfile.mkdtemp(prefix="load-games-"))
+    os.makedirs("resources")
+    os.makedirs("tmp")
+    with open("resources/MongoCreds.txt", "w") as file:
+        file.write(STAND_IN_CONNECTION)
+
+    import service.async_mongo_service
+    import service.google_drive_service
+    from service.google_drive_service import GoogleDriveService
+    from service.question_document_cache import QuestionDocumentCache
+
+    patches = [
+        mock.patch.object(pymongo, "MongoClient", MongoStandIn.client),
+        mock.patch.object(service.async_mongo_service, "AsyncIOMotorClient", AsyncClientStandIn),
+        mock.patch.object(service.google_drive_service.service_account.Credentials, "from_service_account_file",
+                          lambda *args, **kwargs: None),
+        mock.patch.object(GoogleDriveService, "start_index_refresh", lambda self: None),
+        mock.patch.object(QuestionDocumentCache, "start_refresh", lambda self, *args, **kwargs: None),
+    ]
+    for patch in patches:
+        patch.start()
+
+    import server
+    from business import business
+
+    # The ASGI transport does not run the lifespan of the app.
+    business.start()
+    return server.app
+
+
+async def play(client: httpx.AsyncClient, set_type: str, strategy: str, character: dict, unknown_rate: float,
+               sessions: bool) -> (list[float], str | None, int):
+    """
+    :return: tuple of (turn latencies in seconds, guess or None, status code of the last response)
+    """
+
+    latencies = []
+    questions = []
+    session_id = None
+    new_answers = []
+    for __ in range(MAX_TURNS):
+        if sessions:
+            body = {"questions": new_answers, "session_id": session_id, "start_session": session_id is None}
+        else:
+            body = {"questions": questions}
+
+        start_time = time.perf_counter()
+        response = await client.post(f"/guess/{set_type}", params={"strategy": strategy}, json=body)
+        latencies.append(time.perf_counter() - start_time)
+        if response.status_code != 200:
+            return latencies, None, response.status_code
+
+        output = response.json()
+        if output.get("guess") is not None:
+            return latencies, output["guess"], 200
+        session_id = output.get("session_id")
+
+        value = character.get(output["question"])
+        answer = str(value) if value == value and value is not None and random.random() >= unknown_rate else None
+        new_answers = [{"name": output["question"], "answer": answer}]
+        questions += new_answers
+    return latencies, None, 200
+
+
+async def run_strategy(app, set_type: str, strategy: str, characters: list[dict], target_field: str,
+                       players: int, games: int, unknown_rate: float, sessions: bool) -> dict:
+    latencies = []
+    lengths = []
+    right = 0
+    errors = {}
+    remaining = iter(range(games))
+
+    async def player(client: httpx.AsyncClient):
+        nonlocal right
+        for __ in remaining:
+            character = random.choice(characters)
+            game_latencies, guess, status = await play(client, set_type, strategy, character, unknown_rate,
+                                                       sessions)
+            latencies.extend(game_latencies)
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+                continue
+            lengths.append(len(game_latencies))
+            right += guess == character[target_field]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-games") as client:
+        start_time = time.perf_counter()
+        await asyncio.gather(*(player(client) for __ in range(players)))
+        elapsed = time.perf_counter() - start_time
+
+    latencies = np.array(latencies) * 1e3
+    return {
+        "strategy": strategy,
+        "games": len(lengths),
+        "errors": errors,
+        "turns": len(latencies),
+        "turns_per_second": round(len(latencies) / elapsed, 1),
+        "turn_p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "turn_p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "game_length_mean": round(float(np.mean(lengths)), 2) if lengths else None,
+        "game_length_p50": float(np.percentile(lengths, 50)) if lengths else None,
+        "game_length_max": int(max(lengths)) if lengths else None,
+        "right_guesses": round(right / len(lengths), 3) if lengths else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent whole games against the app.")
+    parser.add_argument("--set", dest="set_type", default="criminal", choices=list(SETS))
+    parser.add_argument("--strategies", nargs="+", default=["information_gain", "gini_impurity", "gain_ratio"],
+                        help="Strategy parameters of the endpoint (mr_information_gain... are much slower).")
+    parser.add_argument("--players", type=int, default=16, help="Concurrent players.")
+    parser.add_argument("--games", type=int, default=200, help="Games per strategy.")
+    parser.add_argument("--unknown-rate", type=float, default=0.1, help="Rate of \"don't know\" answers.")
+    parser.add_argument("--sessions", action="store_true", help="Play in session mode, sending the newest answer.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON file of the results.")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output) if args.output else None
+    random.seed(args.seed)
+    data, target_field = load_dataset(SETS[args.set_type][0])
+    characters = data.to_dict("records")
+    app = load_app()
+
+    print(f"{args.set_type}: {len(characters)} characters, {args.players} players, {args.games} games per strategy, "
+          f"unknown rate {args.unknown_rate}, {'session' if args.sessions else 'stateless'} mode", file=sys.stderr)
+    print(f"{'strategy':>20} {'games':>6} {'errors':>7} {'turns/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'length':>7} {'max':>4} {'right':>6}", file=sys.stderr)
+    results = []
+    for strategy in args.strategies:
+        result = asyncio.run(run_strategy(app, args.set_type, strategy, characters, target_field, args.players,
+                                          args.games, args.unknown_rate, args.sessions))
+        results.append(result)
+        print(f"{strategy:>20} {result['games']:>6} {sum(result['errors'].values()):>7} "
+              f"{result['turns_per_second']:>8} {result['turn_p50_ms']:>8} {result['turn_p99_ms']:>8} "
+              f"{result['game_length_mean']!s:>7} {result['game_length_max']!s:>4} {result['right_guesses']!s:>6}",
+              file=sys.stderr)
+
+    if output_path:
+        with open(output_path, "w") as output_file:
+            json.dump({"set": args.set_type, "players": args.players, "sessions": args.sessions,
+                       "unknown_rate": args.unknown_rate, "results": results}, output_file, indent=2)
@@ -0,0 +1,135 @@
+"""
+Media proxy path of the /media/{media_id}/content endpoint: cold requests (downloaded from a fake Drive client
+answering after a fixed latency), warm requests (served from the disk cache), revalidations answered with a 304,
+requests served while the Drive is unreachable, and the eviction of the cache past its byte budget.
+Run from the Server directory: python -m benchmark.media_proxy
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import httplib2
+import numpy as np
+
+from benchmark.drive_index import FakeDriveService, FakeRequest, make_folders
+from service.google_drive_service import GoogleDriveService, MediaCategory
+from service.media_cache import MediaCache
+
+API_LATENCY_SECONDS = 0.05
+IMAGE_BYTES = 20480
+IMAGES = 50
+
+
+class FakeMediaDriveService(FakeDriveService):
+    """
+    FakeDriveService with files().get_media(fileId).execute(), returning bytes derived from the file id,
+    that also serves the thumbnail links as an httplib2 client: request(uri) returns bytes derived from the link.
+    """
+
+    def __init__(self, folders: dict[str, list[dict]], latency_seconds: float):
+        super().__init__(folders, latency_seconds)
+        self.downloads = 0
+        self.uris = []
+        self.down = False
+
+    def get_media(self, fileId: str):
+        return FakeMediaRequest(self, fileId)
+
+    def request(self, uri: str, method: str = "GET") -> (httplib2.Response, bytes):
+        if self.down:
+            raise ConnectionError("Drive unreachable")
+        self.downloads += 1
+        self.uris.append(uri)
+        time.sleep(self.latency_seconds)
+        response = httplib2.Response({"status": 200, "content-type": "image/jpeg"})
+        return response, random.Random(uri).randbytes(IMAGE_BYTES)
+
+
+class FakeMediaRequest(FakeRequest):
+
+    def __init__(self, drive: FakeMediaDriveService, file_id: str):
+        super().__init__(drive, 0, None, "")
+        self.file_id = file_id
+
+    def execute(self) -> bytes:
+        if self.drive.down:
+            raise ConnectionError("Drive unreachable")
+        self.drive.downloads += 1
+        time.sleep(self.drive.latency_seconds)
+        return random.Random(self.file_id).randbytes(IMAGE_BYTES)
+
+
+def fetch(drive_service: GoogleDriveService, media_cache: MediaCache, file_name: str,
+          if_none_match: str | None = None) -> (int, str):
+    """
+    The path of business.retrieve_media_content, without the response.
+    :return: tuple of (status code, ETag)
+    """
+
+    key = MediaCache.make_key(MediaCategory.METADATA.name, file_name)
+    cached = media_cache.lookup(key)
+    content = None
+    if cached is not None:
+        digest, __ = cached
+        if if_none_match == f'"{digest}"':
+            return 304, if_none_match
+        content = media_cache.read(digest)
+    if content is None:
+        __, __, digest = media_cache.fetch(key, lambda: drive_service.download_image(file_name, MediaCategory.METADATA))
+    return 200, f'"{digest}"'
+
+
+def timed(names: list[str], request) -> (np.ndarray, list):
+    latencies, results = [], []
+    for name in names:
+        start_time = time.perf_counter()
+        results.append(request(name))
+        latencies.append(time.perf_counter() - start_time)
+    return np.array(latencies) * 1e3, results
+
+
+def report(label: str, latencies: np.ndarray):
+    print(f"{label:>14} {np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f}")
+
+
+if __name__ == "__main__":
+    directory = tempfile.mkdtemp()
+    try:
+        drive = FakeMediaDriveService(make_folders(), API_LATENCY_SECONDS)
+        drive_service = GoogleDriveService(None, lambda: drive, http_factory=lambda: drive)
+        drive_service.refresh_index(MediaCategory.METADATA)
+        media_cache = MediaCache(os.path.join(directory, "media_cache"))
+        names = [f"{index:06d}.jpg" for index in range(IMAGES)]
+
+        print(f"{IMAGES} images of {IMAGE_BYTES} bytes, {API_LATENCY_SECONDS * 1000:.0f} ms per API call")
+        print(f"{'request':>14} {'p50 ms':>8} {'p99 ms':>8}")
+        cold, etags = timed(names, lambda name: fetch(drive_service, media_cache, name))
+        report("cold", cold)
+        warm, __ = timed(names, lambda name: fetch(drive_service, media_cache, name))
+        report("warm", warm)
+        revalidated, statuses = timed(list(zip(names, etags)),
+                                      lambda pair: fetch(drive_service, media_cache, pair[0], pair[1][1]))
+        report("304", revalidated)
+        assert all(status == 304 for status, __ in statuses)
+
+        # Cache reopened from the disk, with the Drive down.
+        drive.down = True
+        downloads = drive.downloads
+        reopened = MediaCache(os.path.join(directory, "media_cache"))
+        offline, offline_etags = timed(names, lambda name: fetch(drive_service, reopened, name))
+        report("drive down", offline)
+        assert offline_etags == etags and drive.downloads == downloads
+        print(f"downloads: {drive.downloads} for {4 * IMAGES} requests")
+
+        # Cache bounded to half the images: the least recently used ones are evicted.
+        drive.down = False
+        bounded = MediaCache(os.path.join(directory, "bounded"), max_bytes=IMAGES // 2 * IMAGE_BYTES)
+        for name in names:
+            fetch(drive_service, bounded, name)
+        stats = bounded.stats()
+        assert stats["used_bytes"] <= stats["max_bytes"]
+        print(f"bounded cache: {stats}")
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,52 @@
+"""
+Time of the three MapReduce criteria as three separate jobs and as the single CriteriaMapReducer job,
+through the mrjob runner and in memory, with the best feature found per criterion.
+Run from the Server directory: python -m benchmark.mr_fused
+"""
+import os
+import time
+
+from benchmark.datasets import load_dataset
+from service.strategy.strategies import InformationGainMRQuestionStrategy, GiniMRQuestionStrategy, \
+    GainRatioMRQuestionStrategy
+
+# The runner mode is left out for the full anime set, the separate jobs take minutes there.
+DATASETS = [("play_tennis", True), ("anime_25", True), ("anime_82", True), ("criminal", True),
+            ("anime_full", False)]
+
+
+def run_separate(data, target_field, in_memory: bool) -> dict:
+    return {strategy_class().get_criterion(): strategy_class(in_memory).find_best_feature(data, target_field)[0]
+            for strategy_class in [InformationGainMRQuestionStrategy, GainRatioMRQuestionStrategy,
+                                   GiniMRQuestionStrategy]}
+
+
+def run_fused(data, target_field, in_memory: bool) -> dict:
+    strategy = InformationGainMRQuestionStrategy(in_memory, fused=True)
+    return {criterion: feature for criterion, (feature, __) in
+            strategy.find_best_feature_per_criterion(data, target_field).items()}
+
+
+def measure(function) -> (float, dict):
+    start_time = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start_time, result
+
+
+if __name__ == "__main__":
+    # The runner mode writes its input under tmp/.
+    os.makedirs("tmp", exist_ok=True)
+
+    print(f"{'dataset':>12} {'mode':>7} {'3 jobs s':>9} {'fused s':>8} {'speedup':>8}  best feature per criterion")
+    for dataset_name, with_runner in DATASETS:
+        data, target_field = load_dataset(dataset_name)
+        for in_memory in ([False, True] if with_runner else [True]):
+            # Slightly different rows each time, so that the fused results are not shared between the runs.
+            section = data.sample(frac=1.0, random_state=int(in_memory))
+            separate_time, separate_best = measure(lambda: run_separate(section, target_field, in_memory))
+            fused_time, fused_best = measure(lambda: run_fused(section, target_field, in_memory))
+            print(f"{dataset_name:>12} {'memory' if in_memory else 'runner':>7} {separate_time:>9.3f} "
+                  f"{fused_time:>8.3f} {separate_time / fused_time:>8.2f}  {fused_best}")
+            for criterion, feature in separate_best.items():
+                if fused_best[criterion] != feature:
+                    print(f"{'':>40}  {criterion}: separate job picked {feature}")
@@ -0,0 +1,39 @@
+"""
+Time of the MapReduce strategies through the mrjob runner (section exported to a temporary csv file)
+and in memory, for sections of growing size. Checks that both modes find the same question.
+Run from the Server directory: python -m benchmark.mr_in_memory
+"""
+import os
+import time
+
+from benchmark.datasets import load_dataset
+from service.strategy.strategies import InformationGainMRQuestionStrategy, GiniMRQuestionStrategy, \
+    GainRatioMRQuestionStrategy
+
+# (dataset, number of rows) of the benchmarked sections.
+SECTIONS = [("criminal", 50), ("criminal", 200), ("criminal", 478), ("anime_full", 100), ("anime_full", 300)]
+
+
+def measure(function) -> (float, tuple):
+    start_time = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start_time, result
+
+
+if __name__ == "__main__":
+    # The runner mode writes its input under tmp/.
+    os.makedirs("tmp", exist_ok=True)
+    strategy_classes = [InformationGainMRQuestionStrategy, GiniMRQuestionStrategy, GainRatioMRQuestionStrategy]
+
+    print(f"{'dataset':>10} {'rows':>5} {'cells':>7} {'strategy':>20} {'runner s':>9} {'memory s':>9} {'speedup':>8}")
+    for dataset_name, rows in SECTIONS:
+        data, target_field = load_dataset(dataset_name)
+        section = data.head(rows)
+        cells = section.shape[0] * (section.shape[1] - 1)
+        for strategy_class in strategy_classes:
+            runner_time, runner_best = measure(lambda: strategy_class().find_best_feature(section, target_field))
+            memory_time, memory_best = measure(lambda: strategy_class(in_memory=True).find_best_feature(section,
+                                                                                                      target_field))
+            assert runner_best == memory_best, (runner_best, memory_best)
+            print(f"{dataset_name:>10} {rows:>5} {cells:>7} {strategy_class.__name__[:-16]:>20} "
+                  f"{runner_time:>9.3f} {memory_time:>9.3f} {runner_time / memory_time:>8.2f}")
@@ -0,0 +1,111 @@
+"""
+Latency of cheap strategy requests while clients send MR strategy requests (in-memory runner on the criminal set),
+with the MR requests run on the CPU executor of the endpoints and in job mode (queued on worker processes, long-polled).
+The mrjob runner itself changes the working directory and standard streams of the process, so several runner jobs
+cannot share the threads of the executor; the job mode runs them in separate processes.
+Run from the Server directory: python -m benchmark.mr_job_queue [--workers N] [--job-workers N] [--heavy-clients N]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmark.bitmap_filter import random_game
+from benchmark.datasets import load_snapshot
+from model.dto.guess_model import GuessInput
+from service.find_question_service import FindQuestionService, FindStrategy
+from service.guess_service import GuessService, GuessOptions
+from service.mr_job_queue import MRJobQueue, QueuedJob
+
+# Interval between two cheap requests, and duration of a run.
+CHEAP_INTERVAL_SECONDS = 0.02
+RUN_SECONDS = 10.0
+
+
+async def cheap_client(service: GuessService, games: list, stop_time: float) -> list[float]:
+    """
+    Sends an uncached cheap strategy request every CHEAP_INTERVAL_SECONDS, the latency is measured from the time
+    the request was due.
+    """
+
+    tasks = []
+
+    async def request(due_time: float, guess_input: GuessInput) -> float:
+        await service.predict_next_question_async(guess_input, FindStrategy.INFORMATION_GAIN)
+        return time.perf_counter() - due_time
+
+    start_time = time.perf_counter()
+    index = 0
+    while time.perf_counter() < stop_time:
+        due_time = start_time + index * CHEAP_INTERVAL_SECONDS
+        delay = due_time - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        guess_input = GuessInput(questions=random.choice(games)[:random.randrange(1, 4)])
+        tasks.append(asyncio.create_task(request(due_time, guess_input)))
+        index += 1
+    return list(await asyncio.gather(*tasks))
+
+
+async def heavy_client(service: GuessService, job_queue: MRJobQueue | None, games: list, stop_time: float) -> int:
+    requests = 0
+    while time.perf_counter() < stop_time:
+        # Few distinct games, so that some requests are submitted while the same one is running.
+        guess_input = GuessInput(questions=random.choice(games)[:random.randrange(1, 4)])
+        if job_queue is None:
+            await service.predict_next_question_async(guess_input, FindStrategy.INFORMATION_GAIN_MR)
+        else:
+            job = await service.submit_next_question(guess_input, FindStrategy.INFORMATION_GAIN_MR)
+            while job.status not in (QueuedJob.DONE, QueuedJob.FAILED):
+                job = (await job_queue.wait(job.job_id, 5.0)).to_output()
+        requests += 1
+    return requests
+
+
+async def run(cheap_service: GuessService, heavy_service: GuessService, job_queue: MRJobQueue | None, games: list,
+              heavy_clients: int) -> (list[float], int):
+    stop_time = time.perf_counter() + RUN_SECONDS
+    heavy = [heavy_client(heavy_service, job_queue, games, stop_time) for __ in range(heavy_clients)]
+    latencies, *heavy_requests = await asyncio.gather(cheap_client(cheap_service, games, stop_time), *heavy)
+    return latencies, sum(heavy_requests)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cheap request latency while MR strategy requests run.")
+    parser.add_argument("--workers", type=int, default=4, help="Size of the CPU executor.")
+    parser.add_argument("--job-workers", type=int, default=2, help="Worker processes of the job queue.")
+    parser.add_argument("--heavy-clients", type=int, default=8, help="Concurrent clients sending MR requests.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    random.seed(0)
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    job_queue = MRJobQueue(workers=args.job_workers, mr_in_memory=True)
+    find_question_service = FindQuestionService(mr_in_memory=True)
+
+    # No result cache: every request evaluates its strategy.
+    snapshot = load_snapshot("criminal")
+    max_depth = GuessInput(questions=[]).max_depth
+    games = [random_game(snapshot, max_depth) for __ in range(8)]
+    cheap_service = GuessService(None, find_question_service, snapshot.target_field, snapshot, "criminal",
+                                 GuessOptions(executor=executor))
+    heavy_service = GuessService(None, find_question_service, snapshot.target_field, snapshot, "criminal",
+                                 GuessOptions(executor=executor, job_queue=job_queue))
+
+    print(f"CPU executor: {args.workers} workers, job queue: {args.job_workers} processes, "
+          f"{args.heavy_clients} MR clients, {RUN_SECONDS} s per run")
+    print(f"{'mode':>10} {'cheap':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'MR done':>8}")
+    for mode, heavy_clients, queue in [("idle", 0, None), ("executor", args.heavy_clients, None),
+                                       ("jobs", args.heavy_clients, job_queue)]:
+        latencies, heavy_requests = asyncio.run(run(cheap_service, heavy_service, queue, games, heavy_clients))
+        latencies = np.array(latencies) * 1e3
+        print(f"{mode:>10} {len(latencies):>6} {np.percentile(latencies, 50):>8.2f} "
+              f"{np.percentile(latencies, 99):>8.2f} {latencies.max():>8.2f} {heavy_requests:>8}")
+
+    print(job_queue.stats())
+    job_queue.close()
+    executor.shutdown()
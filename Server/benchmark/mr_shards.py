@@ -0,0 +1,79 @@
+"""
+Time per request of the MapReduce strategies when the section is built and exported for the job (csv through the
+runner, or in memory), compared with the job filtering the knowledge base shards by the answers.
+Run from the Server directory: python -m benchmark.mr_shards
+"""
+import logging
+import os
+import random
+import tempfile
+import time
+
+from benchmark.bitmap_filter import random_game
+from benchmark.datasets import load_snapshot
+from service.find_question_service import FindQuestionService
+from service.knowledge_shards import KnowledgeShards
+from service.strategy.strategies import FindStrategy
+
+DATASETS = ["play_tennis", "criminal", "anime_82", "anime_full"]
+GAMES = 5
+DEPTH = 4
+SHARD_COUNT = 4
+
+
+def distinct_paths(snapshot) -> list:
+    """
+    Answer prefixes of random games, each one once: the fused results are cached per section and per answers.
+    """
+
+    paths = {}
+    for __ in range(GAMES):
+        game = random_game(snapshot, DEPTH)
+        for depth in range(1, len(game) + 1):
+            path = game[:depth]
+            paths.setdefault(tuple((question.name, question.answer) for question in path), path)
+    return list(paths.values())
+
+
+def run_section(service: FindQuestionService, snapshot, paths: list) -> float:
+    start_time = time.perf_counter()
+    for questions in paths:
+        section = snapshot.section(questions)
+        if section.n_rows:
+            service.find_best_question(section, snapshot.target_field, FindStrategy.INFORMATION_GAIN_MR)
+    return time.perf_counter() - start_time
+
+
+def run_shards(service: FindQuestionService, shards: KnowledgeShards, paths: list) -> float:
+    start_time = time.perf_counter()
+    for questions in paths:
+        service.find_best_question_in_shards(shards, questions, FindStrategy.INFORMATION_GAIN_MR)
+    return time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    random.seed(7)
+    # The runner mode writes its input under tmp/.
+    os.makedirs("tmp", exist_ok=True)
+
+    print(f"{'dataset':>12} {'requests':>8} {'export s':>9} {'csv runner ms':>14} {'in memory ms':>13} "
+          f"{'shards ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for dataset_name in DATASETS:
+            snapshot = load_snapshot(dataset_name)
+            start_time = time.perf_counter()
+            shards = KnowledgeShards.export(snapshot, os.path.join(directory, dataset_name), SHARD_COUNT)
+            export_time = time.perf_counter() - start_time
+
+            # Each mode gets its own paths, so that none of them reads the results cached by another.
+            times = []
+            for service, run in [(FindQuestionService(mr_fused=True), run_section),
+                                 (FindQuestionService(mr_in_memory=True, mr_fused=True), run_section),
+                                 (FindQuestionService(mr_fused=True), run_shards)]:
+                paths = distinct_paths(snapshot)
+                elapsed = run(service, shards if run is run_shards else snapshot, paths)
+                times.append(elapsed / len(paths) * 1000)
+
+            print(f"{dataset_name:>12} {len(paths):>8} {export_time:>9.3f} {times[0]:>14.1f} {times[1]:>13.1f} "
+                  f"{times[2]:>10.1f}")
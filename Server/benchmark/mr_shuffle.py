@@ -0,0 +1,90 @@
+"""
+Records and JSON bytes shuffled to the reducers by the question finder jobs, and their runner time,
+compared with the previous information gain job (attribute, value and target names in the keys, one record per cell).
+Run from the Server directory: python -m benchmark.mr_shuffle
+"""
+import os
+import time
+
+import pandas as pd
+
+from benchmark.datasets import load_dataset
+from service.mr.query_finder_jobs import InfoGainMapReducer, GiniMapReducer, GainRatioMapReducer
+from service.strategy.strategies import InformationGainMRQuestionStrategy
+
+DATASETS = ["play_tennis", "anime_25", "anime_82", "criminal", "anime_full"]
+
+
+class LegacyInfoGainMapReducer(InfoGainMapReducer):
+    """
+    Information gain job as it was before the in-mapper counts and the integer keys.
+    """
+
+    def read_csv_data_mapper_raw(self, input_path, input_uri):
+        data = pd.read_csv(input_path)
+        for column in data.columns:
+            if column != self.options.target:
+                yield column, list(zip(list(data[column].values), list(data[self.options.target].values)))
+
+    def read_dataframe_mapper(self, data):
+        target_values = data[self.options.target].tolist()
+        for column in data.columns:
+            if column != self.options.target:
+                yield column, list(zip(data[column].tolist(), target_values))
+
+    def mapper_split_count(self, attribute_name, list_of_tuple_value_target):
+        for value, target_value in list_of_tuple_value_target:
+            if value == value:
+                yield (attribute_name, value, target_value), 1
+                yield (attribute_name, target_value), 1
+
+    def decode_attribute(self, attribute_id):
+        return attribute_id
+
+
+class LegacyInformationGainMRQuestionStrategy(InformationGainMRQuestionStrategy):
+
+    def get_job_class(self):
+        return LegacyInfoGainMapReducer
+
+
+def measure(function, repetitions: int) -> (float, tuple):
+    """
+    Best time out of the repetitions, the runner start up time is noisy for small inputs.
+    """
+
+    best_time = None
+    for __ in range(repetitions):
+        start_time = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start_time
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+    return best_time, result
+
+
+if __name__ == "__main__":
+    # The runner mode writes its input under tmp/.
+    os.makedirs("tmp", exist_ok=True)
+    strategy = InformationGainMRQuestionStrategy()
+    jobs = [LegacyInfoGainMapReducer, InfoGainMapReducer, GiniMapReducer, GainRatioMapReducer]
+
+    print(f"{'dataset':>12} {'job':>24} {'records':>10} {'bytes':>12}")
+    for dataset_name in DATASETS:
+        data, target_field = load_dataset(dataset_name)
+        args = strategy.get_job_args(target_field, strategy.get_attributes(data, target_field))
+        for job_class in jobs:
+            stats = {}
+            job_class(args=args).run_in_memory(data, stats)
+            print(f"{dataset_name:>12} {job_class.__name__:>24} {stats['shuffle_records']:>10} "
+                  f"{stats['shuffle_bytes']:>12}")
+
+    print()
+    print(f"{'dataset':>12} {'legacy runner s':>16} {'runner s':>9} {'speedup':>8}")
+    for dataset_name in DATASETS:
+        data, target_field = load_dataset(dataset_name)
+        repetitions = 1 if dataset_name == "anime_full" else 5
+        legacy_time, legacy_best = measure(
+            lambda: LegacyInformationGainMRQuestionStrategy().find_best_feature(data, target_field), repetitions)
+        runner_time, runner_best = measure(lambda: strategy.find_best_feature(data, target_field), repetitions)
+        assert legacy_best == runner_best, (legacy_best, runner_best)
+        print(f"{dataset_name:>12} {legacy_time:>16.3f} {runner_time:>9.3f} {legacy_time / runner_time:>8.2f}")
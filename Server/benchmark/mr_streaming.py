@@ -0,0 +1,69 @@
+"""
+Peak memory and largest record of the read step mappers, for the csv (columns) input and the streamed
+encoded rows input, as the number of rows grows (the criminal set repeated).
+Run from the Server directory: python -m benchmark.mr_streaming
+"""
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmark.datasets import load_dataset
+from service.mr.query_finder_jobs import IQuestionMapReducer, InfoGainMapReducer, CriteriaMapReducer
+
+REPEATS = [1, 4, 16, 64]
+CHUNK_ROWS = 1000
+
+
+def run_read_step(job: IQuestionMapReducer, input_path: str) -> (float, int, int):
+    """
+    Runs the mapper of the read step on the input file, as a map task would.
+    :return: tuple of (seconds, peak traced bytes, largest record in JSON bytes)
+    """
+
+    def records():
+        if job.is_rows_input():
+            job.mapper_init_rows()
+            with open(input_path, "r") as input_file:
+                for line in input_file:
+                    yield from job.mapper_rows(None, line.rstrip("\n"))
+            yield from job.mapper_final_rows()
+        else:
+            yield from job.read_csv_data_mapper_raw(input_path, input_path)
+
+    largest_record = 0
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    for key, value in records():
+        largest_record = max(largest_record, len(json.dumps(key)) + len(json.dumps(value)))
+    elapsed = time.perf_counter() - start_time
+    __, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, largest_record
+
+
+if __name__ == "__main__":
+    data, target_field = load_dataset("criminal")
+    attributes = [column for column in data.columns if column != target_field]
+    args = ["--target", target_field, "--attributes", json.dumps(attributes)]
+
+    print(f"{'rows':>7} {'job':>20} {'mode':>8} {'seconds':>8} {'peak MB':>8} {'largest record KB':>18}")
+    with tempfile.TemporaryDirectory() as directory:
+        for repeat in REPEATS:
+            section = pd.concat([data] * repeat, ignore_index=True)
+            csv_path = os.path.join(directory, "section.csv")
+            rows_path = os.path.join(directory, "section.rows")
+            section.to_csv(csv_path, index=False)
+            IQuestionMapReducer.encode_dataframe(section, target_field, attributes).to_csv(rows_path, index=False,
+                                                                                           header=False)
+
+            for job_class in [InfoGainMapReducer, CriteriaMapReducer]:
+                for mode, input_path in [(IQuestionMapReducer.COLUMNS_INPUT, csv_path),
+                                         (IQuestionMapReducer.ROWS_INPUT, rows_path)]:
+                    job = job_class(args=[input_path] + args + ["--input-mode", mode, "--chunk-rows", str(CHUNK_ROWS)])
+                    elapsed, peak, largest_record = run_read_step(job, input_path)
+                    print(f"{len(section):>7} {job_class.__name__:>20} {mode:>8} {elapsed:>8.3f} "
+                          f"{peak / 2 ** 20:>8.2f} {largest_record / 2 ** 10:>18.1f}")
@@ -0,0 +1,56 @@
+"""
+Feature scoring time of the in-process strategies, in process and on the parallel worker pool,
+on the full anime set and on wider copies of it (the items repeated). Checks that both find the same best feature.
+Run from the Server directory: python -m benchmark.parallel_scoring [--workers N]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmark.datasets import load_snapshot
+from service.strategy.kernels import EncodedSection
+from service.strategy.parallel_scoring import ParallelScorer
+from service.strategy.strategies import InformationGainQuestionStrategy, GainRatioQuestionStrategy, \
+    GiniQuestionStrategy
+
+REPETITIONS = 10
+
+
+def repeat_rows(section: EncodedSection, times: int) -> EncodedSection:
+    return EncodedSection(np.asfortranarray(np.tile(section.codes, (times, 1))), np.tile(section.target, times),
+                          section.features, section.values, section.classes, section.target_feature)
+
+
+def measure(function) -> (float, tuple):
+    result = function()
+    start_time = time.perf_counter()
+    for __ in range(REPETITIONS):
+        function()
+    return (time.perf_counter() - start_time) / REPETITIONS, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel feature scoring benchmark.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # Threshold 0: every section goes to the pool.
+    scorer = ParallelScorer(max(args.workers, 2), threshold_cells=0)
+    section = load_snapshot("anime_full").section([])
+    strategies = [InformationGainQuestionStrategy(), GainRatioQuestionStrategy(), GiniQuestionStrategy()]
+
+    print(f"{max(args.workers, 2)} workers, {os.cpu_count()} cpus")
+    print(f"{'cells':>10} {'strategy':>18} {'serial ms':>10} {'parallel ms':>12} {'speedup':>8}")
+    for times in [1, 4, 16]:
+        wide_section = repeat_rows(section, times)
+        cells = wide_section.n_rows * wide_section.n_features
+        for strategy in strategies:
+            serial_time, serial_best = measure(lambda: strategy.find_best_feature_encoded(wide_section))
+            parallel_time, parallel_best = measure(lambda: strategy.find_best_feature_encoded(wide_section, scorer))
+            assert serial_best == parallel_best, (serial_best, parallel_best)
+            print(f"{cells:>10} {type(strategy).__name__[:-16]:>18} {serial_time * 1e3:>10.2f} "
+                  f"{parallel_time * 1e3:>12.2f} {serial_time / parallel_time:>8.2f}")
+
+    scorer.close()
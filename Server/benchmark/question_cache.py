@@ -0,0 +1,104 @@
+"""
+Time to serve question documents: loaded and resolved on every request (the previous path), from the question cache
+warmed at startup, and revalidated with the ETag. The attributes collection is a fake storage built from the anime
+knowledge base, with a metadata image per value; images are resolved through the drive folder index of a fake client
+answering after a fixed latency.
+Run from the Server directory: python -m benchmark.question_cache
+"""
+import copy
+import random
+import time
+
+import numpy as np
+
+from benchmark.datasets import load_snapshot
+from benchmark.drive_index import FakeDriveService, make_folders, FILES_PER_FOLDER
+from service.google_drive_service import GoogleDriveService, MediaCategory
+from service.question_document_cache import QuestionDocumentCache
+
+API_LATENCY_SECONDS = 0.05
+STORAGE_LATENCY_SECONDS = 0.002
+REQUESTS = 200
+
+
+class FakeQuestionStorage:
+    """
+    get_question and get_all_questions of MongoService, over a list of attribute documents.
+    """
+
+    def __init__(self, documents: list[dict]):
+        self.documents = {document["_id"]: document for document in documents}
+
+    def get_question(self, question: str) -> dict | None:
+        time.sleep(STORAGE_LATENCY_SECONDS)
+        document = self.documents.get(question)
+        return copy.deepcopy(document) if document is not None else None
+
+    def get_all_questions(self) -> list[dict]:
+        time.sleep(STORAGE_LATENCY_SECONDS)
+        return copy.deepcopy(list(self.documents.values()))
+
+
+def make_documents(snapshot) -> list[dict]:
+    return [{"_id": attribute, "values": list(values),
+             "metadata": [{"value": value, "image_id": f"{random.randrange(FILES_PER_FOLDER):06d}.jpg"}
+                          for value in values]}
+            for attribute, values in zip(snapshot.attributes, snapshot.values)]
+
+
+def timed(questions: list[str], request) -> np.ndarray:
+    latencies = []
+    for question in questions:
+        start_time = time.perf_counter()
+        request(question)
+        latencies.append(time.perf_counter() - start_time)
+    return np.array(latencies) * 1e3
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    snapshot = load_snapshot("anime_full")
+    storage = FakeQuestionStorage(make_documents(snapshot))
+    drive_service = GoogleDriveService(None, lambda: FakeDriveService(make_folders(), API_LATENCY_SECONDS))
+    drive_service.refresh_index(MediaCategory.METADATA)
+
+    def resolve_images(documents: list[dict]):
+        elements = [element for document in documents for element in document.get("metadata", [])]
+        results = drive_service.get_image_urls([element["image_id"] for element in elements], MediaCategory.METADATA)
+        for element, result in zip(elements, results):
+            if result and result["files"]:
+                element["image_url"] = result["files"][0]["thumbnailLink"]
+
+    cache = QuestionDocumentCache(resolve_images)
+    cache.register("anime", storage, lambda: snapshot.version)
+    start_time = time.perf_counter()
+    cache.warm("anime")
+    warm_time = time.perf_counter() - start_time
+    questions = [random.choice(snapshot.attributes) for __ in range(REQUESTS)]
+
+    def uncached(question: str):
+        document = storage.get_question(question)
+        resolve_images([document])
+        return document
+
+    def cached(question: str):
+        return cache.get("anime", question, snapshot.version).body
+
+    etags = {question: cache.get("anime", question, snapshot.version).etag for question in set(questions)}
+
+    def revalidated(question: str):
+        return cache.get("anime", question, snapshot.version).etag == etags[question]
+
+    print(f"{len(storage.documents)} questions, warmed in {warm_time * 1000:.1f} ms, {REQUESTS} requests")
+    print(f"{'request':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, request in [("uncached", uncached), ("cached", cached), ("304", revalidated)]:
+        latencies = timed(questions, request)
+        print(f"{label:>10} {np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f}")
+
+    # A refresh with the same images keeps the validators.
+    last_modified = {question: cache.get("anime", question, snapshot.version).last_modified for question in etags}
+    cache.warm("anime")
+    assert all(cache.get("anime", question, snapshot.version).etag == etags[question] and
+               cache.get("anime", question, snapshot.version).last_modified == last_modified[question]
+               for question in etags)
+    print(cache.stats())
@@ -0,0 +1,103 @@
+"""
+Guess turns without a snapshot, scored from the section items or from the section counts aggregated by the database,
+for random games (seeded) at several depths on a scratch copy of a bundled dataset. Checks that both modes ask the
+same question (or make the same guess) for the information gain, gain ratio and Gini strategies, and reports the
+BSON bytes sent back by the database and the turn time of each mode. Exits with status 1 on a different result.
+Without --connection, the queries run on mongomock, whose aggregations are orders of magnitude slower than a server's:
+only the results and the bytes are meaningful then.
+Run from the Server directory:
+    python -m benchmark.section_counts --dataset criminal --connection mongodb://localhost:27017/
+"""
+import argparse
+import random
+import sys
+import time
+
+import bson
+import numpy as np
+
+from benchmark.bitmap_filter import random_game
+from benchmark.datasets import DATASETS
+from benchmark.section_queries import create_storage, SCRATCH_DATABASE
+from model.dto.guess_model import GuessInput, GuessOutput
+from service.find_question_service import FindQuestionService
+from service.guess_service import GuessService, GuessOptions
+from service.mongo_service import MongoService
+from service.strategy.strategies import FindStrategy
+
+STRATEGIES = [FindStrategy.INFORMATION_GAIN, FindStrategy.GAIN_RATIO, FindStrategy.GINI_IMPURITY]
+
+
+def to_comparable(result: GuessOutput) -> tuple:
+    # The values are listed in the order of the section items or of the knowledge base attributes.
+    return result.question, sorted(result.values or []), result.guess
+
+
+def transfer_bytes(storage_service: MongoService, questions: list, target_field: str) -> (int, int):
+    """
+    :return: tuple of (BSON bytes of the section items, BSON bytes of the section counts)
+    """
+
+    section_bytes = sum(len(bson.encode(item)) for item in storage_service.get_knowledge_section(questions))
+    pipeline = MongoService.build_section_counts_pipeline(questions, target_field, storage_service.token_attributes)
+    counts_bytes = sum(len(bson.encode(cell)) for cell in
+                       storage_service.db["knowledge"].aggregate(pipeline, allowDiskUse=True))
+    return section_bytes, counts_bytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Section items and section counts guess turns.")
+    parser.add_argument("--connection", default=None, help="MongoDB server, the scratch database is dropped.")
+    parser.add_argument("--dataset", default="criminal", choices=list(DATASETS))
+    parser.add_argument("--depths", nargs="+", type=int, default=[0, 2, 4, 8])
+    parser.add_argument("--games", type=int, default=10, help="Random games per depth.")
+    parser.add_argument("--token-schema", action="store_true", help="Migrate the scratch copy to the token schema.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    storage_service, snapshot = create_storage(args.connection, args.dataset)
+    if args.token_schema:
+        storage_service.migrate_to_token_schema()
+    target_field = storage_service.get_target_field()
+
+    find_question_service = FindQuestionService(parallel_workers=0)
+    section_service = GuessService(storage_service, find_question_service, target_field, knowledge_base=args.dataset)
+    counts_service = GuessService(storage_service, find_question_service, target_field, knowledge_base=args.dataset,
+                                  options=GuessOptions(section_counts=True))
+
+    failures = []
+    for depth in args.depths:
+        section_ms = []
+        counts_ms = []
+        section_bytes = []
+        counts_bytes = []
+        for __ in range(args.games):
+            questions = random_game(snapshot, min(depth, len(snapshot.attributes) - 1))
+            items_size, cells_size = transfer_bytes(storage_service, questions, target_field)
+            section_bytes.append(items_size)
+            counts_bytes.append(cells_size)
+
+            for strategy in STRATEGIES:
+                guess_input = GuessInput(questions=questions)
+                start_time = time.perf_counter()
+                section_result = section_service.predict_next_question(guess_input, strategy)
+                section_ms.append((time.perf_counter() - start_time) * 1e3)
+                start_time = time.perf_counter()
+                counts_result = counts_service.predict_next_question(guess_input, strategy)
+                counts_ms.append((time.perf_counter() - start_time) * 1e3)
+
+                if to_comparable(section_result) != to_comparable(counts_result):
+                    failures.append(f"{strategy.name.lower()} depth {depth} {questions}: "
+                                    f"{to_comparable(counts_result)}, {to_comparable(section_result)} from the items")
+
+        print(f"depth {depth:>2}: items {np.mean(section_bytes) / 1024:>9.1f} KiB, counts "
+              f"{np.mean(counts_bytes) / 1024:>9.1f} KiB, turn p50 items {np.percentile(section_ms, 50):>8.3f} ms, "
+              f"counts {np.percentile(counts_ms, 50):>8.3f} ms", file=sys.stderr)
+
+    if args.connection:
+        storage_service.mongo_client.drop_database(SCRATCH_DATABASE)
+    for failure in failures:
+        print(f"FAILED {failure}", file=sys.stderr)
+    print(f"{len(failures)} failure(s)", file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,144 @@
+"""
+Section queries of the plain and of the token schema (migrate_knowledge_tokens.py), for random games (seeded) at
+several depths, on a scratch copy of a bundled dataset: checks that the token queries return the items of the
+snapshot filter, and with a MongoDB server (--connection), that the winning plan of every token query is an index
+scan. Reports the query time, the games where the plain query differs (attribute names with dots are field paths to
+MongoDB) and, with a server, the documents examined by each schema. Exits with status 1 on a different section or on
+a collection scan. Without --connection, the queries run on mongomock, which has no query planner.
+Run from the Server directory:
+    python -m benchmark.section_queries --connection mongodb://localhost:27017/
+"""
+import argparse
+import random
+import sys
+import time
+from unittest import mock
+
+import mongomock
+import numpy as np
+import pymongo
+
+from benchmark.bitmap_filter import random_game
+from benchmark.datasets import DATASETS, load_dataset, to_documents, to_attribute_values
+from model.dto.guess_model import Question
+from service.knowledge_snapshot import KnowledgeSnapshot
+from service.mongo_service import MongoService
+
+SCRATCH_DATABASE = "section_queries_benchmark"
+
+
+def create_storage(connection_str: str | None, dataset: str) -> (MongoService, KnowledgeSnapshot):
+    """
+    :return: tuple of (storage on a scratch database holding the dataset with the plain schema, its snapshot)
+    """
+
+    if connection_str is None:
+        with mock.patch.object(pymongo, "MongoClient", mongomock.MongoClient):
+            storage_service = MongoService("mongodb://localhost:27017/", SCRATCH_DATABASE)
+    else:
+        storage_service = MongoService(connection_str, SCRATCH_DATABASE)
+    storage_service.mongo_client.drop_database(SCRATCH_DATABASE)
+
+    data, target_field = load_dataset(dataset)
+    documents = to_documents(data)
+    attribute_values = to_attribute_values(data)
+    storage_service.db["metadata"].insert_one({"target_column": target_field})
+    storage_service.db["knowledge"].insert_many([dict(document) for document in documents])
+    storage_service.db["attributes"].insert_many([{"_id": attribute, "values": values}
+                                                  for attribute, values in attribute_values.items()])
+    return storage_service, KnowledgeSnapshot.from_documents(documents, attribute_values, target_field)
+
+
+def plan_stages(plan: dict) -> set[str]:
+    stages = {plan.get("stage")}
+    for child in plan.get("inputStages", []) + [plan.get("inputStage", {})]:
+        if child:
+            stages |= plan_stages(child)
+    return stages - {None}
+
+
+def expected_classes(snapshot: KnowledgeSnapshot, questions: list[Question]) -> list[str]:
+    rows = snapshot.index.to_rows(snapshot.filter(questions))
+    return sorted(snapshot.classes[code] for code in snapshot.target[rows])
+
+
+def explain(storage_service: MongoService, questions: list[Question]) -> (set[str], int):
+    """
+    :return: tuple of (stages of the winning plan, documents examined)
+    """
+
+    query, projection = MongoService.build_section_query(questions, storage_service.token_attributes)
+    output = storage_service.db.command("explain", {"find": "knowledge", "filter": query, "projection": projection},
+                                        verbosity="executionStats")
+    return plan_stages(output["queryPlanner"]["winningPlan"]), output["executionStats"]["totalDocsExamined"]
+
+
+def query_section(storage_service: MongoService, questions: list[Question]) -> (list[dict], float):
+    start_time = time.perf_counter()
+    section = list(storage_service.get_knowledge_section(questions))
+    return sorted(section, key=lambda item: str(item["_id"])), time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plain and token schema section queries.")
+    parser.add_argument("--connection", default=None, help="MongoDB server, the scratch database is dropped.")
+    parser.add_argument("--dataset", default="anime_full", choices=list(DATASETS))
+    parser.add_argument("--depths", nargs="+", type=int, default=[1, 2, 4, 8, 16])
+    parser.add_argument("--games", type=int, default=20, help="Random games per depth.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    storage_service, snapshot = create_storage(args.connection, args.dataset)
+    games = {depth: [random_game(snapshot, min(depth, len(snapshot.attributes))) for __ in range(args.games)]
+             for depth in args.depths}
+
+    plain_results = {}
+    for depth, depth_games in games.items():
+        plain_results[depth] = [query_section(storage_service, questions) for questions in depth_games]
+    plain_examined = {depth: [explain(storage_service, questions)[1] for questions in depth_games]
+                      for depth, depth_games in games.items()} if args.connection else {}
+
+    start_time = time.perf_counter()
+    count = storage_service.migrate_to_token_schema()
+    print(f"{args.dataset}: migrated {count} items in {time.perf_counter() - start_time:.2f} s "
+          f"({'server' if args.connection else 'mongomock'})", file=sys.stderr)
+
+    failures = []
+    plain_differences = 0
+    for depth, depth_games in games.items():
+        plain_ms = []
+        token_ms = []
+        token_examined = []
+        rows = []
+        for questions, (plain_section, plain_seconds) in zip(depth_games, plain_results[depth]):
+            token_section, token_seconds = query_section(storage_service, questions)
+            plain_ms.append(plain_seconds * 1e3)
+            token_ms.append(token_seconds * 1e3)
+            rows.append(len(token_section))
+            plain_differences += token_section != plain_section
+            expected = expected_classes(snapshot, questions)
+            if sorted(item[snapshot.target_field] for item in token_section) != expected:
+                failures.append(f"depth {depth} {questions}: {len(token_section)} items, "
+                                f"{len(expected)} in the snapshot")
+
+            if args.connection:
+                stages, examined = explain(storage_service, questions)
+                token_examined.append(examined)
+                answered = any(question.answer for question in questions)
+                if answered and ("COLLSCAN" in stages or "IXSCAN" not in stages):
+                    failures.append(f"depth {depth} {questions}: winning plan {sorted(stages)}")
+
+        line = f"depth {depth:>2}: {np.mean(rows):>8.1f} rows, plain {np.percentile(plain_ms, 50):>8.3f} ms, " \
+               f"tokens {np.percentile(token_ms, 50):>8.3f} ms (p50)"
+        if args.connection:
+            line += f", examined {np.mean(plain_examined[depth]):>8.1f} / {np.mean(token_examined):>8.1f} documents"
+        print(line, file=sys.stderr)
+
+    if args.connection:
+        storage_service.mongo_client.drop_database(SCRATCH_DATABASE)
+    print(f"{plain_differences} game(s) where the plain query returns another section", file=sys.stderr)
+    for failure in failures:
+        print(f"FAILED {failure}", file=sys.stderr)
+    print(f"{len(failures)} failure(s)", file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,182 @@
+"""
+Microbenchmarks of find_best_feature for the six strategies, on the bundled datasets, for sections carved by random
+games (seeded) at several depths. Writes mean, median, p95 and peak traced memory per strategy, dataset and depth as JSON.
+With --baseline, compares the run with a previous output and exits with status 1 if a case is slower than the
+baseline by more than --threshold (and --min-delta-ms) on --metric (median by default), or if a section does not
+have the same shape.
+The MR strategies run in memory and unfused (the fused result cache would answer the repetitions), or through
+the inline mrjob runner with --mr-runner.
+Run from the Server directory:
+    python -m benchmark.strategy_suite --output baseline.json
+    python -m benchmark.strategy_suite --baseline baseline.json --output current.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmark.bitmap_filter import random_game
+from benchmark.datasets import DATASETS, load_snapshot
+from service.strategy.strategies import InformationGainQuestionStrategy, GainRatioQuestionStrategy, \
+    GiniQuestionStrategy, InformationGainMRQuestionStrategy, GiniMRQuestionStrategy, GainRatioMRQuestionStrategy, \
+    IMRJobQuestionStrategy
+
+
+def make_strategies(mr_runner: bool) -> list:
+    return [
+        InformationGainQuestionStrategy(),
+        GainRatioQuestionStrategy(),
+        GiniQuestionStrategy(),
+        InformationGainMRQuestionStrategy(in_memory=not mr_runner),
+        GiniMRQuestionStrategy(in_memory=not mr_runner),
+        GainRatioMRQuestionStrategy(in_memory=not mr_runner),
+    ]
+
+
+def make_sections(dataset: str, depths: list[int], seed: int) -> list[tuple[int, pd.DataFrame, str]]:
+    """
+    :return: list of (depth, section, target field), the section being the items left by the answers of a random
+    item, as a dataframe.
+    """
+
+    snapshot = load_snapshot(dataset)
+    rng_state = random.getstate()
+    random.seed(f"{seed}-{dataset}")
+    sections = []
+    for depth in depths:
+        questions = random_game(snapshot, min(depth, len(snapshot.attributes) - 1))
+        section = snapshot.section(questions)
+        sections.append((depth, section.to_dataframe(), section.target_feature))
+    random.setstate(rng_state)
+    return sections
+
+
+def measure(strategy, data: pd.DataFrame, target_field: str, repetitions: int) -> dict:
+    # One warm-up call, then the timed ones, then one call traced for the memory peak.
+    strategy.find_best_feature(data, target_field)
+    durations = []
+    for __ in range(repetitions):
+        start_time = time.perf_counter()
+        strategy.find_best_feature(data, target_field)
+        durations.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    strategy.find_best_feature(data, target_field)
+    __, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durations = np.array(durations) * 1e3
+    return {
+        "repetitions": repetitions,
+        "mean_ms": round(float(durations.mean()), 4),
+        "p50_ms": round(float(np.percentile(durations, 50)), 4),
+        "p95_ms": round(float(np.percentile(durations, 95)), 4),
+        "min_ms": round(float(durations.min()), 4),
+        "peak_kib": round(peak_bytes / 1024, 1),
+    }
+
+
+def run(datasets: list[str], depths: list[int], repetitions: int, mr_repetitions: int, mr_runner: bool,
+        seed: int) -> dict:
+    strategies = make_strategies(mr_runner)
+    results = []
+    for dataset in datasets:
+        for depth, data, target_field in make_sections(dataset, depths, seed):
+            for strategy in strategies:
+                is_mr = isinstance(strategy, IMRJobQuestionStrategy)
+                result = {
+                    "strategy": strategy.get_strategy_type().name.lower(),
+                    "dataset": dataset,
+                    "depth": depth,
+                    "rows": len(data),
+                    "features": len(data.columns) - 1,
+                }
+                result.update(measure(strategy, data, target_field, mr_repetitions if is_mr else repetitions))
+                results.append(result)
+                print(f"{result['strategy']:>20} {dataset:>12} depth {depth:>2} {result['rows']:>6} rows "
+                      f"{result['features']:>4} features: mean {result['mean_ms']:>10.3f} ms, "
+                      f"p95 {result['p95_ms']:>10.3f} ms, peak {result['peak_kib']:>9.1f} KiB", file=sys.stderr)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "mr_runner": mr_runner,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float, min_delta_ms: float,
+            metric: str = "p50_ms") -> list[str]:
+    """
+    :param metric: compared duration, the median is the least sensitive to the scheduling noise.
+    :return: the regressions found, as messages. Cases missing from either run are ignored.
+    """
+
+    def key(result: dict) -> tuple:
+        return result["strategy"], result["dataset"], result["depth"]
+
+    baseline_results = {key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        previous = baseline_results.get(key(result))
+        if previous is None:
+            continue
+        name = "{} {} depth {}".format(*key(result))
+        if (result["rows"], result["features"]) != (previous["rows"], previous["features"]):
+            regressions.append(f"{name}: section is {result['rows']}x{result['features']}, "
+                               f"was {previous['rows']}x{previous['features']}")
+            continue
+        delta_ms = result[metric] - previous[metric]
+        if delta_ms > min_delta_ms and result[metric] > previous[metric] * (1 + threshold):
+            regressions.append(f"{name}: {metric} {result[metric]:.3f}, was {previous[metric]:.3f} "
+                               f"(+{delta_ms / previous[metric] * 100:.1f}%)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="find_best_feature microbenchmarks of the six strategies.")
+    parser.add_argument("--datasets", nargs="+", default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument("--depths", nargs="+", type=int, default=[0, 4, 8], help="Answers carving each section.")
+    parser.add_argument("--repetitions", type=int, default=30, help="Timed calls of the in-process strategies.")
+    parser.add_argument("--mr-repetitions", type=int, default=5, help="Timed calls of the MR strategies.")
+    parser.add_argument("--mr-runner", action="store_true", help="Run the MR strategies through the mrjob runner.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON file of the results, printed if not provided.")
+    parser.add_argument("--baseline", default=None, help="JSON output of a previous run to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown reported as regression.")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Smaller slowdowns are noise.")
+    parser.add_argument("--metric", default="p50_ms", choices=["p50_ms", "mean_ms", "p95_ms", "min_ms"],
+                        help="Duration compared with the baseline.")
+    args = parser.parse_args()
+
+    if args.mr_runner:
+        # The runner mode writes its input under tmp/.
+        os.makedirs("tmp", exist_ok=True)
+
+    report = run(args.datasets, args.depths, args.repetitions, args.mr_repetitions, args.mr_runner, args.seed)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.threshold, args.min_delta_ms, args.metric)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        print(f"{len(regressions)} regression(s) against {args.baseline}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
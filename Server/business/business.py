@@ -1,66 +1,354 @@
+import asyncio
+import email.utils
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import fastapi
 
-from model.dto.guess_model import GuessOutput, GuessInput
+from business.config import ServerConfig
+from model.dto.guess_model import GuessOutput, GuessInput, GuessJob
+from service.async_mongo_service import AsyncMongoService
+from service.best_question_cache import BestQuestionCache
 from service.google_drive_service import GoogleDriveService, MediaCategory
+from service.knowledge_shards import KnowledgeShards
+from service.media_cache import MediaCache
+from service.metrics import MetricsRegistry, RequestTrace, SIZE_BUCKETS
+from service.knowledge_snapshot import KnowledgeSnapshot
 from service.mongo_service import MongoService
-from service.find_question_service import FindQuestionService, FindStrategy
-from service.guess_service import GuessService
+from service.mr_job_queue import MRJobQueue
+from service.question_document_cache import QuestionDocumentCache
+from service.request_log import RequestLog
+from service.opening_book import OpeningBook
+from service.session_store import SessionStore
+from service.find_question_service import FindStrategy
+from service.guess_service import GuessService, GuessOptions
 
-# Initialize FindQuestionService.
-find_question_service = FindQuestionService()
+logger = logging.getLogger(__name__)
 
-# Initialize storage services.
-# 1) Anime storage.
-anime_storage_service = MongoService(connection_str='mongodb://localhost:27017/',
-                                     database_name="anime_knowledge_base")
-anime_target_field = anime_storage_service.get_target_field()
-anime_guess_service = GuessService(anime_storage_service, find_question_service, anime_target_field)
+# Long polls of the MR jobs wait at most this many seconds.
+MAX_JOB_WAIT_SECONDS = 30.0
 
-# 2) Criminal face storage.
-creds = "mongodb://localhost:27017/"
-with open("resources/MongoCreds.txt", "r") as file:
-    creds = file.readline()
+# Browsers revalidate the proxied media daily with the ETag.
+MEDIA_CACHE_CONTROL = "public, max-age=86400"
 
-criminal_storage_service = MongoService(connection_str=creds,
-                                        database_name="CriminalAkinatorDB")
-criminal_target_field = criminal_storage_service.get_target_field()
-criminal_guess_service = GuessService(criminal_storage_service, find_question_service, criminal_target_field)
+# Clients revalidate the question documents with their ETag or Last-Modified.
+QUESTION_CACHE_CONTROL = "no-cache"
 
-# 3) Initialize google drive.
-google_drive_service = GoogleDriveService("resources/credentials.json")
+ANIME_CONNECTION = "mongodb://localhost:27017/"
+CRIMINAL_CREDENTIALS_PATH = "resources/MongoCreds.txt"
 
 
-def post_guess_prediction_anime(guess_input: GuessInput, strategy: FindStrategy) -> GuessOutput:
-    return anime_guess_service.predict_next_question(guess_input, strategy)
+class Services:
+    """
+    Services of the endpoints, built from the server configuration when the app starts (see start),
+    so that importing the module connects to nothing and starts no thread nor process.
+    """
 
+    def __init__(self, config: ServerConfig):
+        self.config = config
+        self.cpu_executor = ThreadPoolExecutor(max_workers=config.cpu_workers, thread_name_prefix="guess-cpu")
 
-def post_guess_prediction_criminals(guess_input: GuessInput, strategy: FindStrategy) -> GuessOutput:
-    return criminal_guess_service.predict_next_question(guess_input, strategy)
+        # Histograms of the guess turns and the request durations, rendered with the cache and queue gauges
+        # by /metrics.
+        self.metrics_registry = MetricsRegistry()
+        self.metrics_registry.add_histogram("guess_stage_seconds", "Duration of the stages of a guess turn "
+                                                                   "(retrieve, dataframe, score, total).")
+        self.metrics_registry.add_histogram("guess_section_rows", "Rows of the sections scored by the strategies.",
+                                            SIZE_BUCKETS)
+        self.metrics_registry.add_histogram("http_request_seconds", "Duration of the requests, per route.")
+        self.request_log = RequestLog(config.request_log_path) if config.request_log_path else None
 
+        self.find_question_service = config.create_find_question_service()
+        # Optional job mode of the MR strategies: their requests are queued and run by persistent worker processes,
+        # clients poll for the result. Disabled without workers.
+        self.mr_job_queue = None
+        if config.mr_job_workers > 0:
+            self.mr_job_queue = MRJobQueue(workers=config.mr_job_workers, max_pending=64, result_ttl_seconds=300.0,
+                                           mr_in_memory=config.mr_in_memory, mr_fused=config.mr_fused,
+                                           mr_chunk_rows=config.mr_chunk_rows)
+        # Results of find_best_question, shared by the knowledge bases.
+        self.best_question_cache = BestQuestionCache(max_size=4096, ttl_seconds=3600.0)
+        # Optional incremental game sessions, shared by the knowledge bases.
+        self.session_store = SessionStore(max_bytes=64 * 1024 * 1024, ttl_seconds=900.0)
 
-def retrieve_file_drive(file_name: str, category: MediaCategory):
+        # Initialize storage services.
+        # 1) Anime storage.
+        self.anime_storage_service = MongoService(connection_str=ANIME_CONNECTION,
+                                                  database_name="anime_knowledge_base")
+        self.anime_async_storage_service = AsyncMongoService(connection_str=ANIME_CONNECTION,
+                                                             database_name="anime_knowledge_base")
+        self.anime_guess_service = self.__create_guess_service("anime", self.anime_storage_service,
+                                                               self.anime_async_storage_service)
+
+        # 2) Criminal face storage.
+        creds = "mongodb://localhost:27017/"
+        with open(CRIMINAL_CREDENTIALS_PATH, "r") as file:
+            creds = file.readline()
+        self.criminal_storage_service = MongoService(connection_str=creds, database_name="CriminalAkinatorDB")
+        self.criminal_async_storage_service = AsyncMongoService(connection_str=creds,
+                                                                database_name="CriminalAkinatorDB")
+        self.criminal_guess_service = self.__create_guess_service("criminal", self.criminal_storage_service,
+                                                                  self.criminal_async_storage_service)
+
+        # 3) Initialize google drive. Image lookups are served from an index of each media folder.
+        self.google_drive_service = GoogleDriveService("resources/credentials.json")
+        # Media served by the proxy endpoint, fetched once from the drive.
+        self.media_cache = MediaCache(config.media_cache_directory, config.media_cache_bytes)
 
+        # Resolved question documents, warmed once the drive index is loaded, then refreshed before their image urls
+        # expire.
+        self.question_document_cache = QuestionDocumentCache(self.resolve_image_urls, max_age_seconds=1800.0,
+                                                             refresh_seconds=1500.0)
+        self.question_document_cache.register("anime", self.anime_storage_service,
+                                              lambda: self.__knowledge_version(self.anime_guess_service))
+        self.question_document_cache.register("criminal", self.criminal_storage_service,
+                                              lambda: self.__knowledge_version(self.criminal_guess_service))
 
-    return google_drive_service.get_image_url(file_name, category)
+        self.metrics_registry.add_stats("best_question_cache", self.best_question_cache.stats,
+                                        ("hits", "misses", "evictions"))
+        self.metrics_registry.add_stats("session_store", self.session_store.stats, ("expired", "evicted"))
+        if self.mr_job_queue is not None:
+            self.metrics_registry.add_stats("mr_job_queue", self.mr_job_queue.stats,
+                                            ("submitted", "deduplicated", "rejected", "completed", "failed"))
+        self.metrics_registry.add_stats("question_cache", self.question_document_cache.stats,
+                                        ("hits", "misses", "not_modified"))
+        self.metrics_registry.add_stats("media", self.get_media_stats,
+                                        ("index_hits", "api_queries", "cache_hits", "cache_misses",
+                                         "cache_evictions"))
 
+    def start(self):
+        """
+        Starts the parallel scoring workers, then the background refresh of the drive index and of the question
+        documents.
+        """
 
-def retrieve_question(question: str, set_type: str):
-    question_data = None
-    if set_type == "anime":
-        question_data = anime_storage_service.get_question(question)
-    if set_type == "criminal":
-        # Return from criminal set.
-        question_data = criminal_storage_service.get_question(question)
+        self.find_question_service.start()
+        self.google_drive_service.start_index_refresh()
+        self.question_document_cache.start_refresh(self.google_drive_service.index_ready)
 
-    if question_data is None:
+    def close(self):
+        self.question_document_cache.stop_refresh()
+        self.google_drive_service.stop_index_refresh()
+        if self.mr_job_queue is not None:
+            self.mr_job_queue.close()
+        self.find_question_service.close()
+        self.cpu_executor.shutdown(cancel_futures=True)
+        if self.request_log is not None:
+            self.request_log.close()
+
+    def get_guess_service(self, set_type: str) -> GuessService:
+        if set_type == "anime":
+            return self.anime_guess_service
+        if set_type == "criminal":
+            return self.criminal_guess_service
         raise fastapi.HTTPException(400, "Invalid set type! Use 'anime' or 'criminal'!")
 
-    # Fetch temporary image urls.
-    if "metadata" in question_data:
-        for element in question_data["metadata"]:
-            if "image_id" in element:
-                image_id = element["image_id"]
-                # Get the image
-                element["image_url"] = google_drive_service.get_image_url(image_id, MediaCategory.METADATA)["files"][0][
-                    "thumbnailLink"]
-    return question_data
+    def resolve_image_urls(self, documents: list[dict]):
+        # The images missing from the drive index are queried together.
+        elements = [element for document in documents for element in document.get("metadata", [])
+                    if "image_id" in element]
+        results = self.google_drive_service.get_image_urls([element["image_id"] for element in elements],
+                                                           MediaCategory.METADATA)
+        for element, result in zip(elements, results):
+            # An image that could not be resolved is left without url, the question is still served.
+            if result and result["files"]:
+                element["image_url"] = result["files"][0]["thumbnailLink"]
+
+    def get_media_stats(self) -> dict:
+        return dict(self.google_drive_service.stats(), cache=self.media_cache.stats())
+
+    def __create_guess_service(self, set_type: str, storage_service: MongoService,
+                               async_storage_service: AsyncMongoService) -> GuessService:
+        config = self.config
+        target_field = storage_service.get_target_field()
+        snapshot = KnowledgeSnapshot.load(storage_service, target_field) if config.use_knowledge_snapshot else None
+        options = GuessOptions(cache=self.best_question_cache, session_store=self.session_store,
+                               async_storage_service=async_storage_service, executor=self.cpu_executor,
+                               job_queue=self.mr_job_queue, metrics_registry=self.metrics_registry,
+                               section_counts=config.use_section_counts)
+        if snapshot is not None:
+            options.opening_books = OpeningBook.load_all(config.books_directory, set_type, snapshot.version)
+            if config.use_mr_shards:
+                options.shards = KnowledgeShards.export(snapshot, os.path.join(config.mr_shards_directory, set_type),
+                                                        config.mr_shard_count)
+        return GuessService(storage_service, self.find_question_service, target_field, snapshot, set_type, options)
+
+    @staticmethod
+    def __knowledge_version(guess_service: GuessService) -> str:
+        # Without snapshot the version is unknown, the entries are only dropped by reload_knowledge_base.
+        return guess_service.snapshot.version if guess_service.snapshot is not None else "live"
+
+
+# Set by start, when the app starts.
+services: Services | None = None
+
+
+def start(config: ServerConfig | None = None) -> Services:
+    """
+    Builds the services from the configuration (by default read from the environment) and starts their
+    background tasks.
+    """
+
+    global services
+    config = config or ServerConfig.from_environment()
+    logger.info(f"[Startup]: {config}")
+    services = Services(config)
+    services.start()
+    return services
+
+
+def stop():
+    global services
+    if services is not None:
+        services.close()
+        services = None
+
+
+async def post_guess_prediction_anime(guess_input: GuessInput, strategy: FindStrategy) -> GuessOutput:
+    return await services.anime_guess_service.predict_next_question_async(guess_input, strategy)
+
+
+async def post_guess_prediction_criminals(guess_input: GuessInput, strategy: FindStrategy) -> GuessOutput:
+    return await services.criminal_guess_service.predict_next_question_async(guess_input, strategy)
+
+
+async def submit_guess_job_anime(guess_input: GuessInput, strategy: FindStrategy) -> GuessJob:
+    return await services.anime_guess_service.submit_next_question(guess_input, strategy)
+
+
+async def submit_guess_job_criminals(guess_input: GuessInput, strategy: FindStrategy) -> GuessJob:
+    return await services.criminal_guess_service.submit_next_question(guess_input, strategy)
+
+
+async def retrieve_guess_job(job_id: str, wait_seconds: float) -> GuessJob:
+    if services.mr_job_queue is None:
+        raise fastapi.HTTPException(404, "Unknown or expired job!")
+    job = await services.mr_job_queue.wait(job_id, min(max(wait_seconds, 0.0), MAX_JOB_WAIT_SECONDS))
+    if job is None:
+        raise fastapi.HTTPException(404, "Unknown or expired job!")
+    return job.to_output()
+
+
+def reload_knowledge_base(set_type: str):
+    services.get_guess_service(set_type).reload_snapshot()
+    # The questions may have changed with the same knowledge base version.
+    services.question_document_cache.invalidate(set_type)
+    services.question_document_cache.warm(set_type)
+
+
+def get_cache_stats() -> dict:
+    return services.best_question_cache.stats()
+
+
+def get_session_stats() -> dict:
+    return services.session_store.stats()
+
+
+def get_question_stats() -> dict:
+    return services.question_document_cache.stats()
+
+
+def get_job_stats() -> dict:
+    if services.mr_job_queue is None:
+        return {"workers": 0}
+    return services.mr_job_queue.stats()
+
+
+def render_metrics() -> str:
+    return services.metrics_registry.render()
+
+
+def record_request(trace: RequestTrace, method: str, route: str, status_code: int, seconds: float):
+    services.metrics_registry.observe("http_request_seconds", seconds, route=route, method=method,
+                                      status=status_code)
+    if services.request_log is not None:
+        services.request_log.write(trace, method, route, status_code, seconds)
+
+
+def get_media_stats() -> dict:
+    return services.get_media_stats()
+
+
+def retrieve_file_drive(file_name: str, category: MediaCategory):
+
+
+    return services.google_drive_service.get_image_url(file_name, category)
+
+
+def retrieve_media_content(file_name: str, category: MediaCategory, if_none_match: str | None) -> fastapi.Response:
+    """
+    The media content, from the cache or fetched once from the drive, with its content digest as strong ETag.
+    A request already holding the current content gets a 304.
+    """
+
+    key = MediaCache.make_key(category.name, file_name)
+    # One lookup per request: a 304 does not read the content.
+    cached = services.media_cache.lookup(key)
+    content = None
+    if cached is not None:
+        digest, content_type = cached
+        if if_none_match and _etag_matches(if_none_match, _to_etag(digest)):
+            return fastapi.Response(status_code=304, headers={"ETag": _to_etag(digest),
+                                                              "Cache-Control": MEDIA_CACHE_CONTROL})
+        content = services.media_cache.read(digest)
+    if content is None:
+        content, content_type, digest = services.media_cache.fetch(
+            key, lambda: services.google_drive_service.download_image(file_name, category))
+
+    headers = {"ETag": _to_etag(digest), "Cache-Control": MEDIA_CACHE_CONTROL}
+    if if_none_match and _etag_matches(if_none_match, headers["ETag"]):
+        return fastapi.Response(status_code=304, headers=headers)
+    return fastapi.Response(content=content, media_type=content_type, headers=headers)
+
+
+def _to_etag(digest: str) -> str:
+    return f'"{digest}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: the W/ prefix is ignored.
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+async def retrieve_question(question: str, set_type: str, if_none_match: str | None = None,
+                            if_modified_since: str | None = None) -> fastapi.Response:
+    """
+    The question document with its image urls, from the question cache or loaded and cached.
+    A request whose ETag (or else Last-Modified date) is still current gets a 304.
+    """
+
+    storage_service = services.get_guess_service(set_type).async_storage_service
+    question_document_cache = services.question_document_cache
+    version = question_document_cache.get_version(set_type)
+    entry = question_document_cache.get(set_type, question, version)
+    if entry is None:
+        question_data = await storage_service.get_question(question)
+        if question_data is None:
+            raise fastapi.HTTPException(400, "Invalid set type! Use 'anime' or 'criminal'!")
+        # Fetch temporary image urls, the drive client is blocking.
+        await asyncio.to_thread(services.resolve_image_urls, [question_data])
+        entry = question_document_cache.put(set_type, question, version, question_data)
+
+    headers = {"ETag": entry.etag, "Last-Modified": email.utils.formatdate(entry.last_modified, usegmt=True),
+               "Cache-Control": QUESTION_CACHE_CONTROL}
+    if _is_not_modified(entry.etag, entry.last_modified, if_none_match, if_modified_since):
+        question_document_cache.record_not_modified()
+        return fastapi.Response(status_code=304, headers=headers)
+    return fastapi.Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def _is_not_modified(etag: str, last_modified: float, if_none_match: str | None,
+                     if_modified_since: str | None) -> bool:
+    # If-Modified-Since is ignored when If-None-Match is present.
+    if if_none_match:
+        return _etag_matches(if_none_match, etag)
+    if if_modified_since:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have a precision of one second.
+        return int(last_modified) <= since
+    return False
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+from service.find_question_service import FindQuestionService
+
+
+@dataclass(frozen=True)
+class ServerConfig:
+    """
+    Feature flags and sizes of the server, read once at startup (see from_environment).
+    Also used by the offline tools, so that they evaluate the strategies with the settings of the server.
+    """
+
+    # Serve the guess endpoints from an in-memory snapshot of each knowledge base, loaded at startup.
+    use_knowledge_snapshot: bool = True
+
+    # Without the snapshot, the information gain, gain ratio and Gini strategies receive the (attribute, value, class)
+    # counts of the section aggregated by Mongo, instead of its items.
+    use_section_counts: bool = True
+
+    # Opening books compiled with compile_opening_books.py, used for the snapshot versions they were compiled for.
+    books_directory: str = "books"
+
+    # Size of the executor running the CPU bound work of the guess endpoints (section filtering, strategies),
+    # so that a slow strategy does not stall the event loop.
+    cpu_workers: int = 4
+
+    # Worker processes scoring the features of wide sections in parallel, 0 or 1 to score in process (default).
+    # Only worth it on wide knowledge bases with spare cores: the workers compete with the CPU executor.
+    parallel_scoring_workers: int = 0
+
+    # Run the MapReduce strategies on the section (or the shards) in memory, instead of through the mrjob runner.
+    mr_in_memory: bool = True
+
+    # The MapReduce strategies share a single job scoring the three criteria.
+    mr_fused: bool = True
+
+    # Rows per chunk streamed by the MapReduce mappers, None to map the whole section at once.
+    mr_chunk_rows: int | None = None
+
+    # Export each knowledge base snapshot once per version into shard files, the input of the MR strategies.
+    # Their jobs then filter the shards by the answers, instead of receiving the section of each request.
+    # Only the current version is kept on disk. Off by default: the export writes the whole snapshot to disk.
+    use_mr_shards: bool = False
+    mr_shards_directory: str = "shards"
+    mr_shard_count: int = 4
+
+    # Job mode of the MR strategies: their requests are queued and run by persistent worker processes, 0 disables it.
+    mr_job_workers: int = 2
+
+    # One JSON line per request with its stage durations, see InitialExperiments/analyze_request_log.py.
+    # Empty to disable the log.
+    request_log_path: str = "logs/requests.jsonl"
+
+    # Media served by the proxy endpoint, fetched once from the drive.
+    media_cache_directory: str = "media_cache"
+    media_cache_bytes: int = 512 * 1024 * 1024
+
+    @classmethod
+    def from_environment(cls) -> ServerConfig:
+        """
+        The defaults, with the flags set by the USE_KNOWLEDGE_SNAPSHOT, USE_SECTION_COUNTS, MR_IN_MEMORY, MR_FUSED and
+        USE_MR_SHARDS variables (1/true/yes/on or 0/false/no/off), and the sizes and paths set by the GUESS_CPU_WORKERS,
+        PARALLEL_SCORING_WORKERS, MR_CHUNK_ROWS, MR_SHARD_COUNT, MR_JOB_WORKERS, REQUEST_LOG_PATH and MEDIA_CACHE_BYTES
+        variables.
+        """
+
+        mr_chunk_rows = os.environ.get("MR_CHUNK_ROWS")
+        return cls(use_knowledge_snapshot=_flag("USE_KNOWLEDGE_SNAPSHOT", cls.use_knowledge_snapshot),
+                   use_section_counts=_flag("USE_SECTION_COUNTS", cls.use_section_counts),
+                   mr_in_memory=_flag("MR_IN_MEMORY", cls.mr_in_memory),
+                   mr_fused=_flag("MR_FUSED", cls.mr_fused),
+                   use_mr_shards=_flag("USE_MR_SHARDS", cls.use_mr_shards),
+                   cpu_workers=int(os.environ.get("GUESS_CPU_WORKERS", min(4, os.cpu_count() or 1))),
+                   parallel_scoring_workers=int(os.environ.get("PARALLEL_SCORING_WORKERS", 0)),
+                   mr_chunk_rows=int(mr_chunk_rows) if mr_chunk_rows else None,
+                   mr_shard_count=int(os.environ.get("MR_SHARD_COUNT", 4)),
+                   mr_job_workers=int(os.environ.get("MR_JOB_WORKERS", 2)),
+                   request_log_path=os.environ.get("REQUEST_LOG_PATH", "logs/requests.jsonl"),
+                   media_cache_bytes=int(os.environ.get("MEDIA_CACHE_BYTES", 512 * 1024 * 1024)))
+
+    def create_find_question_service(self) -> FindQuestionService:
+        return FindQuestionService(parallel_workers=self.parallel_scoring_workers, mr_in_memory=self.mr_in_memory,
+                                   mr_fused=self.mr_fused, mr_chunk_rows=self.mr_chunk_rows)
+
+
+def _flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"{name} must be a boolean flag, not {value!r}")
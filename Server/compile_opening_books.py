@@ -0,0 +1,62 @@
+"""
+Compiles the opening books (precompiled question trees) of a knowledge base, one per strategy.
+The server loads the books matching the version of its knowledge base snapshot from the books directory.
+
+Example:
+    python compile_opening_books.py --set anime --strategy information_gain --strategy gini_impurity --depth 8
+"""
+import argparse
+import dataclasses
+import logging
+import os
+import time
+
+from business.config import ServerConfig
+from service.knowledge_snapshot import KnowledgeSnapshot
+from service.mongo_service import MongoService
+from service.opening_book import OpeningBookCompiler
+from service.strategy.strategies import STRATEGY_NAMES
+
+BOOKS_DIRECTORY = ServerConfig.books_directory
+
+databases = {
+    "anime": "anime_knowledge_base",
+    "criminal": "CriminalAkinatorDB"
+}
+
+
+def read_connection_str(set_type: str) -> str:
+    if set_type == "criminal" and os.path.exists("resources/MongoCreds.txt"):
+        with open("resources/MongoCreds.txt", "r") as file:
+            return file.readline()
+    return "mongodb://localhost:27017/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile opening books for the guess endpoints.")
+    parser.add_argument("--set", dest="set_type", choices=list(databases), required=True)
+    parser.add_argument("--strategy", action="append", default=None, choices=list(STRATEGY_NAMES),
+                        help="Strategy name of the endpoints, e.g. information_gain. Can be repeated.")
+    parser.add_argument("--depth", type=int, default=6, help="Number of questions compiled on each path.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes compiling the subtrees.")
+    parser.add_argument("--no-unknown", action="store_true", help="Do not compile the unknown answer branches.")
+    parser.add_argument("--output", default=BOOKS_DIRECTORY)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    storage_service = MongoService(connection_str=read_connection_str(args.set_type),
+                                   database_name=databases[args.set_type])
+    snapshot = KnowledgeSnapshot.load(storage_service, storage_service.get_target_field())
+    # The strategies are evaluated with the settings of the server. The compiler runs its own worker processes,
+    # so each of them scores in process.
+    config = dataclasses.replace(ServerConfig.from_environment(), parallel_scoring_workers=0)
+    compiler = OpeningBookCompiler(snapshot, args.set_type, config.create_find_question_service,
+                                   include_unknown=not args.no_unknown)
+
+    for strategy_name in args.strategy or ["information_gain"]:
+        strategy = STRATEGY_NAMES[strategy_name]
+        start_time = time.time()
+        book = compiler.compile(strategy, args.depth, workers=args.workers)
+        path = book.save(args.output)
+        print(f"{strategy_name}: compiled to {path} in {time.time() - start_time:.1f} seconds.")
@@ -0,0 +1,36 @@
+"""
+Migrates a knowledge base to the token schema: every knowledge item also stores the multikey indexed arrays of its
+"attribute=value" tokens and of its missing attributes, and the sections are queried through their indexes
+instead of scanning the collection. Run again after importing items or attributes, and reload the knowledge base
+of a running server (POST /knowledge/{set}/reload): until then, its section queries fail on the items without
+tokens instead of leaving them out.
+
+Example:
+    python migrate_knowledge_tokens.py --set anime
+    python migrate_knowledge_tokens.py --set anime --revert
+"""
+import argparse
+import logging
+import time
+
+from compile_opening_books import databases, read_connection_str
+from service.mongo_service import MongoService
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate a knowledge base to the token schema.")
+    parser.add_argument("--set", dest="set_type", choices=list(databases), required=True)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Items updated by each bulk write.")
+    parser.add_argument("--revert", action="store_true", help="Go back to the plain schema.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    storage_service = MongoService(connection_str=read_connection_str(args.set_type),
+                                   database_name=databases[args.set_type])
+    start_time = time.time()
+    if args.revert:
+        storage_service.revert_token_schema()
+        print(f"{args.set_type}: reverted to the plain schema in {time.time() - start_time:.1f} seconds.")
+    else:
+        count = storage_service.migrate_to_token_schema(args.batch_size)
+        print(f"{args.set_type}: migrated {count} items in {time.time() - start_time:.1f} seconds.")
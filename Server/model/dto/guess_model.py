@@ -10,9 +10,22 @@ class Question(BaseModel):
 class GuessInput(BaseModel):
     questions: list[Question]
     max_depth: int = 20
+    # Session mode: start_session asks for a session token, then only the newest answers are sent with it.
+    session_id: str | None = None
+    start_session: bool = False
 
 
 class GuessOutput(BaseModel):
     question: str | None = None
     values: list[str] | None = None
     guess: str | None = None
+    session_id: str | None = None
+
+
+class GuessJob(BaseModel):
+    # None when the result was known without running a job.
+    job_id: str | None = None
+    # queued, running, done or failed.
+    status: str
+    result: GuessOutput | None = None
+    detail: str | None = None
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import logging
+import time
+from contextlib import asynccontextmanager
 from typing import Annotated
 
 import fastapi
@@ -8,9 +10,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from business.business import post_guess_prediction_anime, post_guess_prediction_criminals, retrieve_file_drive, \
-    retrieve_question
-from model.dto.guess_model import GuessInput, GuessOutput
-from service.find_question_service import FindStrategy
+    retrieve_question, reload_knowledge_base, get_cache_stats, \
+    get_session_stats, submit_guess_job_anime, submit_guess_job_criminals, retrieve_guess_job, get_job_stats, \
+    get_media_stats, retrieve_media_content, get_question_stats, render_metrics, record_request, start, stop
+from model.dto.guess_model import GuessInput, GuessOutput, GuessJob
+from service import metrics
+from service.strategy.strategies import STRATEGY_NAMES
 from service.google_drive_service import MediaCategory
 
 origins = [
@@ -19,7 +24,17 @@ origins = [
 
 logging.basicConfig(level=logging.INFO, filename='app.log', filemode='a',
                     format='%(asctime)s - %(levelname)s - %(message)s')
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The knowledge bases are loaded and the background tasks started when the server starts, not on import.
+    start()
+    yield
+    stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,21 +44,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-strategy_map = {
-    "information_gain": FindStrategy.INFORMATION_GAIN,
-    "gini_impurity": FindStrategy.GINI_IMPURITY,
-    "gain_ratio": FindStrategy.GAIN_RATIO,
-    "mr_information_gain": FindStrategy.INFORMATION_GAIN_MR,
-    "mr_gini_impurity": FindStrategy.GINI_IMPURITY_MR,
-    "mr_gain_ratio": FindStrategy.GAIN_RATIO_MR
-}
+
+@app.middleware("http")
+async def trace_request(request: fastapi.Request, call_next):
+    # The stages recorded while serving the request go out in the Server-Timing header and the request log.
+    start_time = time.perf_counter()
+    token, trace = metrics.start_request(request.headers.get("x-request-id"))
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.end_request(token)
+    total_seconds = time.perf_counter() - start_time
+
+    response.headers["Server-Timing"] = metrics.format_server_timing(trace, total_seconds)
+    response.headers["X-Request-ID"] = trace.request_id
+    route = request.scope.get("route")
+    record_request(trace, request.method, route.path if route is not None else "unmatched", response.status_code,
+                   total_seconds)
+    return response
+
+
+strategy_map = STRATEGY_NAMES
 
 
 @app.post("/guess/anime")
 async def get_guess_anime(guess: GuessInput, strategy: str = "information_gain") -> GuessOutput:
     if strategy in strategy_map:
         find_strategy = strategy_map[strategy]
-        return post_guess_prediction_anime(guess, find_strategy)
+        return await post_guess_prediction_anime(guess, find_strategy)
     else:
         raise fastapi.HTTPException(status_code=400, detail=f"Not supported strategy: {strategy}")
 
@@ -52,21 +80,90 @@ async def get_guess_anime(guess: GuessInput, strategy: str = "information_gain")
 async def get_guess_criminals(guess: GuessInput, strategy: str = "information_gain"):
     if strategy in strategy_map:
         find_strategy = strategy_map[strategy]
-        return post_guess_prediction_criminals(guess, find_strategy)
+        return await post_guess_prediction_criminals(guess, find_strategy)
+    else:
+        raise fastapi.HTTPException(status_code=400, detail=f"Not supported strategy: {strategy}")
+
+
+# Job mode of the MR strategies: the job is returned right away, then polled with GET /guess/jobs/{job_id}.
+@app.post("/guess/anime/jobs")
+async def post_guess_job_anime(guess: GuessInput, strategy: str = "mr_information_gain") -> GuessJob:
+    if strategy in strategy_map:
+        return await submit_guess_job_anime(guess, strategy_map[strategy])
+    else:
+        raise fastapi.HTTPException(status_code=400, detail=f"Not supported strategy: {strategy}")
+
+
+@app.post("/guess/criminal/jobs")
+async def post_guess_job_criminals(guess: GuessInput, strategy: str = "mr_information_gain") -> GuessJob:
+    if strategy in strategy_map:
+        return await submit_guess_job_criminals(guess, strategy_map[strategy])
     else:
         raise fastapi.HTTPException(status_code=400, detail=f"Not supported strategy: {strategy}")
 
 
+# Long poll: wait up to this many seconds for the job to finish.
+@app.get("/guess/jobs/{job_id}")
+async def get_guess_job(job_id: str, wait: float = 0.0) -> GuessJob:
+    return await retrieve_guess_job(job_id, wait)
+
+
+# Plain function: a name missing from the folder index queries the drive, FastAPI runs it on its thread pool.
 @app.get("/media/{media_id}")
-async def get_media(media_id: str, category: int):
+def get_media(media_id: str, category: int):
     return retrieve_file_drive(media_id, MediaCategory(category))
 
 
+# Media proxy: the image itself, cached on disk, with ETag revalidation.
+# Plain function: a cache miss downloads the image, FastAPI runs it on its thread pool.
+@app.get("/media/{media_id}/content")
+def get_media_content(media_id: str, category: int, request: fastapi.Request):
+    return retrieve_media_content(media_id, MediaCategory(category), request.headers.get("if-none-match"))
+
+
 @app.get("/question/anime/{question}")
-async def get_question_anime(question: str):
-    return retrieve_question(question, "anime")
+async def get_question_anime(question: str, request: fastapi.Request):
+    return await retrieve_question(question, "anime", request.headers.get("if-none-match"),
+                                   request.headers.get("if-modified-since"))
 
 
 @app.get("/question/criminal/{question}")
-async def get_question_criminal(question: str):
-    return retrieve_question(question, "criminal")
+async def get_question_criminal(question: str, request: fastapi.Request):
+    return await retrieve_question(question, "criminal", request.headers.get("if-none-match"),
+                                   request.headers.get("if-modified-since"))
+
+
+# Plain function: reloading reads the whole collection, FastAPI runs it on its thread pool.
+@app.post("/knowledge/{set_type}/reload")
+def post_reload_knowledge(set_type: str):
+    reload_knowledge_base(set_type)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return fastapi.Response(content=render_metrics(), media_type=metrics.MetricsRegistry.CONTENT_TYPE)
+
+
+@app.get("/stats/cache")
+async def get_stats_cache():
+    return get_cache_stats()
+
+
+@app.get("/stats/sessions")
+async def get_stats_sessions():
+    return get_session_stats()
+
+
+@app.get("/stats/jobs")
+async def get_stats_jobs():
+    return get_job_stats()
+
+
+@app.get("/stats/media")
+async def get_stats_media():
+    return get_media_stats()
+
+
+@app.get("/stats/questions")
+async def get_stats_questions():
+    return get_question_stats()
@@ -0,0 +1,58 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from model.dto.guess_model import Question
+from service.mongo_service import MongoService
+from service.strategy.kernels import SectionCounts
+
+
+class AsyncMongoService:
+    """
+    Non-blocking access to the knowledge base, used by the async endpoints.
+    Queries are the same as the ones of MongoService, which is still used for the startup loads.
+    """
+
+    __KNOWLEDGE_COLLECTION_NAME = 'knowledge'
+    __METADATA_COLLECTION_NAME = 'metadata'
+    __ATTRIBUTE_COLLECTION_NAME = 'attributes'
+
+    def __init__(self, connection_str: str, database_name: str):
+        self.mongo_client = AsyncIOMotorClient(connection_str)
+        self.db = self.mongo_client[database_name]
+        self.token_attributes = None
+        self.attribute_values = None
+
+    def reset_section_schema(self):
+        self.token_attributes = None
+        self.attribute_values = None
+
+    async def get_knowledge_section(self, questions: list[Question]) -> list[dict]:
+        knowledge_collection = self.db[AsyncMongoService.__KNOWLEDGE_COLLECTION_NAME]
+        query, projection = MongoService.build_section_query(questions, await self.__get_token_attributes())
+        return await knowledge_collection.find(query, projection).to_list(length=None)
+
+    async def get_section_counts(self, questions: list[Question], target_field: str) -> SectionCounts:
+        knowledge_collection = self.db[AsyncMongoService.__KNOWLEDGE_COLLECTION_NAME]
+        pipeline = MongoService.build_section_counts_pipeline(questions, target_field,
+                                                              await self.__get_token_attributes())
+        if self.attribute_values is None:
+            attribute_collection = self.db[AsyncMongoService.__ATTRIBUTE_COLLECTION_NAME]
+            self.attribute_values = {attribute['_id']: attribute.get('values', [])
+                                     for attribute in await attribute_collection.find({}).to_list(length=None)}
+        cells = await knowledge_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+        return MongoService.to_section_counts(cells, target_field, self.attribute_values)
+
+    async def __get_token_attributes(self) -> frozenset:
+        if self.token_attributes is None:
+            metadata = await self.db[AsyncMongoService.__METADATA_COLLECTION_NAME].find_one()
+            token_attributes = MongoService.read_token_attributes(metadata or {})
+            if token_attributes:
+                knowledge_collection = self.db[AsyncMongoService.__KNOWLEDGE_COLLECTION_NAME]
+                MongoService.check_untokenized_items(await knowledge_collection.count_documents(
+                    MongoService.UNTOKENIZED_QUERY))
+            self.token_attributes = token_attributes
+        return self.token_attributes
+
+    async def get_question(self, question):
+        attribute_collection = self.db[AsyncMongoService.__ATTRIBUTE_COLLECTION_NAME]
+        query = {'_id': question}
+        return await attribute_collection.find_one(query)
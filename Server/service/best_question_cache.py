@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+
+from model.dto.guess_model import GuessOutput, Question
+from service.strategy.strategies import FindStrategy
+
+
+class BestQuestionCache:
+    """
+    Bounded LRU cache of find_best_question results, with a time to live for each entry.
+    The key does not depend on the order of the answered questions, since the section only depends on the set of
+    answers. Questions answered as unknown are part of the key, they still remove the attribute from the section.
+    """
+
+    def __init__(self, max_size: int = 4096, ttl_seconds: float = 3600.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(knowledge_base: str, version: str, strategy: FindStrategy, questions: list[Question]) -> tuple:
+        answers = tuple(sorted((question.name, question.answer or "") for question in questions))
+        return knowledge_base, version, strategy.value, answers
+
+    def get(self, key: tuple) -> GuessOutput | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result.model_copy(deep=True)
+
+    def put(self, key: tuple, result: GuessOutput):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, result.model_copy(deep=True))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, knowledge_base: str | None = None):
+        """
+        Drops the entries of a knowledge base, or all of them.
+        """
+
+        with self.lock:
+            if knowledge_base is None:
+                self.evictions += len(self.entries)
+                self.entries.clear()
+                return
+
+            stale_keys = [key for key in self.entries if key[0] == knowledge_base]
+            for key in stale_keys:
+                del self.entries[key]
+            self.evictions += len(stale_keys)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import numpy as np
+
+from model.dto.guess_model import Question
+from service.strategy.kernels import MISSING_CODE
+
+
+class BitmapIndex:
+    """
+    Inverted index over the items of a knowledge snapshot.
+    Every (attribute, value) pair owns a bitset of the items holding it, and every attribute owns the bitset of
+    the items where it is missing (code MISSING_CODE, but for the items of null_rows, which hold a null value).
+    Bitsets are Python ints, bit i standing for item i, so filtering is a few ORs and ANDs and int.bit_count()
+    gives the section size.
+    """
+
+    def __init__(self, codes: np.ndarray, attribute_indices: dict[str, int], value_codes: list[dict],
+                 null_rows: dict[int, np.ndarray] | None = None):
+        self.n_rows = codes.shape[0]
+        self.all_rows = (1 << self.n_rows) - 1
+        self.attribute_indices = attribute_indices
+        self.value_codes = value_codes
+
+        # bitmaps[attribute][code], code MISSING_CODE holding the items without the attribute.
+        self.bitmaps = []
+        for index in range(codes.shape[1]):
+            column = codes[:, index]
+            self.bitmaps.append([self.to_bitmap(column == code) for code in range(len(value_codes[index]) + 1)])
+        # A null value is not missing for the knowledge base query: no answer matches it.
+        for index, rows in (null_rows or {}).items():
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[rows] = True
+            self.bitmaps[index][MISSING_CODE] &= ~self.to_bitmap(mask)
+
+    @staticmethod
+    def to_bitmap(mask: np.ndarray) -> int:
+        return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+    def to_rows(self, bitmap: int) -> np.ndarray:
+        """
+        Returns the (sorted) indices of the items present in the bitmap.
+        """
+
+        packed = np.frombuffer(bitmap.to_bytes((self.n_rows + 7) // 8, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(packed, count=self.n_rows, bitorder="little"))
+
+    @staticmethod
+    def count(bitmap: int) -> int:
+        return bitmap.bit_count()
+
+    def match(self, attribute: str, answer: str | None) -> int:
+        """
+        Items where the attribute equals the answer or is missing.
+        An unknown answer, or an attribute no item has, keeps every item.
+        """
+
+        index = self.attribute_indices.get(attribute)
+        if not answer or index is None:
+            return self.all_rows
+
+        bitmaps = self.bitmaps[index]
+        code = self.value_codes[index].get(answer)
+        if code is None:
+            return bitmaps[MISSING_CODE]
+        return bitmaps[MISSING_CODE] | bitmaps[code]
+
+    def filter(self, questions: list[Question], bitmap: int | None = None) -> int:
+        """
+        Narrows the bitmap (all the items by default) with the answers of the questions.
+        """
+
+        if bitmap is None:
+            bitmap = self.all_rows
+        for question in questions:
+            bitmap &= self.match(question.name, question.answer)
+        return bitmap
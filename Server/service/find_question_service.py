@@ -7,9 +7,14 @@ from pandas import DataFrame
 
 from sklearn import preprocessing
 
-from model.dto.guess_model import GuessOutput
+from model.dto.guess_model import GuessOutput, Question
+from service import metrics
+from service.knowledge_shards import KnowledgeShards
+from service.strategy.kernels import EncodedSection, SectionCounts
+from service.strategy.parallel_scoring import ParallelScorer, PARALLEL_THRESHOLD_CELLS
 from service.strategy.strategies import FindStrategy, InformationGainQuestionStrategy, GainRatioQuestionStrategy, \
-    GiniQuestionStrategy, InformationGainMRQuestionStrategy, GiniMRQuestionStrategy, GainRatioMRQuestionStrategy
+    GiniQuestionStrategy, InformationGainMRQuestionStrategy, GiniMRQuestionStrategy, GainRatioMRQuestionStrategy, \
+    IContingencyQuestionStrategy, IFindBestQuestionStrategy, IMRJobQuestionStrategy
 
 logger = logging.getLogger(__name__)
 
@@ -28,26 +33,42 @@ def trim_data(data: DataFrame):
 class IFindQuestionService(metaclass=abc.ABCMeta):
 
     @abc.abstractmethod
-    def find_best_question(self, section: list[dict], target_field: str,
+    def find_best_question(self, section: list[dict] | EncodedSection | SectionCounts, target_field: str,
                            strategy: FindStrategy = FindStrategy.INFORMATION_GAIN) -> GuessOutput:
         pass
 
 
 class FindQuestionService(IFindQuestionService):
 
-    def __init__(self):
+    def __init__(self, parallel_workers: int = 0, parallel_threshold_cells: int = PARALLEL_THRESHOLD_CELLS,
+                 mr_in_memory: bool = False, mr_fused: bool = False, mr_chunk_rows: int | None = None):
+        """
+        :param parallel_workers: size of the process pool scoring wide encoded sections, 0 or 1 to score in process.
+        :param parallel_threshold_cells: smallest section (rows x features) scored by the pool.
+        :param mr_in_memory: run the MapReduce strategies in memory instead of through the mrjob runner.
+        :param mr_fused: the MapReduce strategies share one job scoring every criterion.
+        :param mr_chunk_rows: if provided, the MapReduce mappers stream the section in chunks of this many rows.
+        """
+
+        self.parallel_scorer = ParallelScorer(parallel_workers, parallel_threshold_cells) \
+            if parallel_workers > 1 else None
         self.label_encoder = preprocessing.LabelEncoder()
         self.evaluator_list = [
             InformationGainQuestionStrategy(),
             GainRatioQuestionStrategy(),
             GiniQuestionStrategy(),
-            InformationGainMRQuestionStrategy(),
-            GiniMRQuestionStrategy(),
-            GainRatioMRQuestionStrategy()
+            InformationGainMRQuestionStrategy(mr_in_memory, mr_fused, mr_chunk_rows),
+            GiniMRQuestionStrategy(mr_in_memory, mr_fused, mr_chunk_rows),
+            GainRatioMRQuestionStrategy(mr_in_memory, mr_fused, mr_chunk_rows)
         ]
 
-    def find_best_question(self, section: list[dict], target_field: str,
+    def find_best_question(self, section: list[dict] | EncodedSection | SectionCounts, target_field: str,
                            strategy: FindStrategy = FindStrategy.INFORMATION_GAIN) -> GuessOutput:
+        if isinstance(section, EncodedSection):
+            return self.__find_best_question_encoded(section, strategy)
+        if isinstance(section, SectionCounts):
+            return self.__find_best_question_counts(section, strategy)
+
         data = self.__preprocess_input(section)
         guess = self.__handle_guess_cases(data, target_field)
 
@@ -57,31 +78,111 @@ class FindQuestionService(IFindQuestionService):
             result.guess = guess
             return result
 
+        evaluator = self.__get_evaluator(strategy)
+        with metrics.stage("score"):
+            best_feature, feature_values = evaluator.find_best_feature(data, target_field)
+
+        # The majority class is needed only when no question can split the classes.
+        majority_class = None
+        if not feature_values or len(feature_values) == 1:
+            logger.info(f"Classes with same feature: {set(data[target_field].values)}")
+            majority_class = data[target_field].mode().iloc[0]
+
+        return self.__to_output(best_feature, feature_values, majority_class, strategy)
+
+    def __find_best_question_encoded(self, section: EncodedSection, strategy: FindStrategy) -> GuessOutput:
+        # Same guess cases as for the dataframe, evaluated on the codes.
+        if section.n_classes() == 1 or section.has_constant_features():
+            result = GuessOutput()
+            result.guess = section.majority_class()
+            return result
+
+        evaluator = self.__get_evaluator(strategy)
+        if isinstance(evaluator, IContingencyQuestionStrategy):
+            with metrics.stage("score"):
+                best_feature, feature_values = evaluator.find_best_feature_encoded(section, self.parallel_scorer)
+        else:
+            with metrics.stage("dataframe"):
+                data = section.to_dataframe()
+            with metrics.stage("score"):
+                best_feature, feature_values = evaluator.find_best_feature(data, section.target_feature)
+
+        return self.__to_output(best_feature, feature_values, section.majority_class(), strategy)
+
+    def __find_best_question_counts(self, section_counts: SectionCounts, strategy: FindStrategy) -> GuessOutput:
+        # Same guess cases as for the dataframe, evaluated on the counts.
+        if section_counts.n_classes() == 1 or section_counts.has_constant_features():
+            result = GuessOutput()
+            result.guess = section_counts.majority_class()
+            return result
+
+        evaluator = self.__get_evaluator(strategy)
+        if not isinstance(evaluator, IContingencyQuestionStrategy):
+            raise fastapi.HTTPException(500, "Only the contingency strategies are scored from counts!")
+        with metrics.stage("score"):
+            best_feature, feature_values = evaluator.find_best_feature_counts(section_counts)
+        return self.__to_output(best_feature, feature_values, section_counts.majority_class(), strategy)
+
+    def is_contingency_strategy(self, strategy: FindStrategy) -> bool:
+        return isinstance(self.__get_evaluator(strategy), IContingencyQuestionStrategy)
+
+    def is_mr_strategy(self, strategy: FindStrategy) -> bool:
+        return isinstance(self.__get_evaluator(strategy), IMRJobQuestionStrategy)
+
+    def find_best_question_in_shards(self, shards: KnowledgeShards, questions: list[Question],
+                                     strategy: FindStrategy) -> GuessOutput | None:
+        """
+        Same as find_best_question, for the section left by the answers in the knowledge base shards.
+        Only the MR strategies support it, the section is filtered by their job.
+        :return: None if no item is left.
+        """
+
+        evaluator = self.__get_evaluator(strategy)
+        with metrics.stage("score"):
+            best_feature, feature_values, class_counts = evaluator.find_best_feature_in_shards(shards, questions)
+        metrics.annotate(section_rows=sum(class_counts.values()))
+        if not class_counts:
+            return None
+
+        # Same guess cases as for the dataframe, the majority class is the first label among the most common ones.
+        majority_class = max(sorted(class_counts), key=class_counts.get)
+        if len(class_counts) == 1 or best_feature is None:
+            result = GuessOutput()
+            result.guess = majority_class
+            return result
+
+        return self.__to_output(best_feature, feature_values, majority_class, strategy)
+
+    def start(self):
+        if self.parallel_scorer is not None:
+            self.parallel_scorer.start()
+
+    def close(self):
+        if self.parallel_scorer is not None:
+            self.parallel_scorer.close()
+
+    def __get_evaluator(self, strategy: FindStrategy) -> IFindBestQuestionStrategy:
         # Get the strategy based on input.
-        evaluator = None
         for item in self.evaluator_list:
             if item.get_strategy_type() == strategy:
-                evaluator = item
-                break
+                return item
 
         # No evaluator was found.
-        if evaluator is None:
-            raise fastapi.HTTPException(500, "Unknown operation!")
-
-        best_feature, feature_values = evaluator.find_best_feature(data, target_field)
+        raise fastapi.HTTPException(500, "Unknown operation!")
 
+    def __to_output(self, best_feature: str, feature_values: list[str], majority_class: str | None,
+                    strategy: FindStrategy) -> GuessOutput:
         logger.info(f"[Best][{strategy}][Feature]: {best_feature}")
         logger.info(f"[Best][{strategy}][Values]: {feature_values}")
 
+        result = GuessOutput()
+
         # Treat the case when only one possible value is returned (two classes have the same attributes).
         if not feature_values or len(feature_values) == 1:
-            logger.info(f"Classes with same feature: {set(data[target_field].values)}")
-            result = GuessOutput()
-            result.guess = data[target_field].mode().iloc[0]
+            result.guess = majority_class
             return result
 
         # Return the result.
-        result = GuessOutput()
         result.question = best_feature
         result.values = list(feature_values)
         return result
@@ -89,8 +190,9 @@ class FindQuestionService(IFindQuestionService):
     def __preprocess_input(self, section: list[dict]):
         # Preprocess data.
         # TODO: Beware that there are attributes with nan value.
-        data = to_dataframe(section)
-        trim_data(data)
+        with metrics.stage("dataframe"):
+            data = to_dataframe(section)
+            trim_data(data)
         return data
 
     def __handle_guess_cases(self, data: DataFrame, target_field: str) -> str | None:
@@ -1,34 +1,245 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from typing import Callable
 
 import fastapi
+import google_auth_httplib2
+import httplib2
 from googleapiclient.discovery import build
 from google.oauth2 import service_account
 
+logger = logging.getLogger(__name__)
+
 
 class MediaCategory(Enum):
     CRIMINAL_PROFILE = 0
     ANIME_PROFILE = 1
     METADATA = 2
 
+
+class DriveFolderIndex:
+    """
+    Local copy of the file list of a Drive folder: file name -> file (id, name, mimeType, size, thumbnailLink).
+    The whole folder is listed page by page and the new index replaces the previous one at once.
+    Lookups follow the "name contains" query: exact name first, then the names containing it.
+    """
+
+    FILE_FIELDS = "id, name, mimeType, size, thumbnailLink"
+
+    def __init__(self, folder_id: str):
+        self.folder_id = folder_id
+        self.files = {}
+        self.loaded_at = None
+
+    def load(self, list_page, page_size: int = 1000) -> int:
+        """
+        :param list_page: function(query, page_size, page_token) returning a files().list() response.
+        :return: the number of files in the folder.
+        """
+
+        files = {}
+        page_token = None
+        while True:
+            response = list_page(f'"{self.folder_id}" in parents and trashed = false', page_size, page_token)
+            for file in response.get("files", []):
+                files[file["name"]] = file
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+
+        self.files = files
+        self.loaded_at = time.monotonic()
+        return len(files)
+
+    def age(self) -> float | None:
+        return time.monotonic() - self.loaded_at if self.loaded_at is not None else None
+
+    def find(self, file_name: str) -> list[dict]:
+        files = self.files
+        file = files.get(file_name)
+        if file is not None:
+            return [dict(file)]
+        return [dict(file) for name, file in files.items() if file_name in name]
+
+
 class GoogleDriveService:
+    """
+    Image links of the media folders. Lookups are answered from a local index of each folder, refreshed in the
+    background every refresh_seconds (start_index_refresh). The thumbnail links of the listing expire, so an index
+    older than max_age_seconds is not used; names missing from the index are queried, they may be newer files.
+    The Drive client is not thread safe: every thread builds its own, with a socket timeout of timeout_seconds.
+    """
 
     __CRIMINAL_FOLDER_ID = "1S7W1-h7_14HY1OmZdR6UuMZVZqjlSHOP"
     __ANIME_FOLDER_ID = "1TP8QJoaRIqd3kmWJTV9KSqNRDR8Ii094"
     __METADATA_FOLDER_ID = "183HxLaypaP5RDNwK-F9YaZWhTQFB4TXt"
 
-    def __init__(self, credentials_file_path: str):
-        credentials = service_account.Credentials.from_service_account_file(
-            credentials_file_path, scopes=['https://www.googleapis.com/auth/drive']
-        )
+    def __init__(self, credentials_file_path: str | None, client_factory: Callable[[], object] | None = None,
+                 refresh_seconds: float = 1800.0, max_age_seconds: float = 3000.0, timeout_seconds: float = 10.0,
+                 lookup_workers: int = 8, image_size: int = 800, http_factory: Callable[[], object] | None = None):
+        """
+        :param client_factory: builds the Drive v3 client of a thread, instead of the one of the credentials file.
+        :param lookup_workers: threads querying the images of get_image_urls concurrently.
+        :param image_size: longest side in pixels of the thumbnails downloaded by download_image.
+        :param http_factory: builds the httplib2 client of a thread downloading the thumbnails.
+        """
+
+        if client_factory is None:
+            credentials = service_account.Credentials.from_service_account_file(
+                credentials_file_path, scopes=['https://www.googleapis.com/auth/drive']
+            )
+            client_factory = lambda: GoogleDriveService.build_client(credentials, timeout_seconds)
+            if http_factory is None:
+                http_factory = lambda: google_auth_httplib2.AuthorizedHttp(
+                    credentials, http=httplib2.Http(timeout=timeout_seconds))
+        if http_factory is None:
+            http_factory = lambda: httplib2.Http(timeout=timeout_seconds)
+
+        self.client_factory = client_factory
+        self.http_factory = http_factory
+        self.image_size = image_size
+        self.clients = threading.local()
+        self.lookup_executor = ThreadPoolExecutor(max_workers=lookup_workers, thread_name_prefix="drive-lookup")
+        self.refresh_seconds = refresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.indices = {category: DriveFolderIndex(self.__get_folder_id(category)) for category in MediaCategory}
+
+        self.stop_event = threading.Event()
+        self.refresh_thread = None
+        # Set once the first refresh of every folder is done, successful or not.
+        self.index_ready = threading.Event()
+
+        self.index_hits = 0
+        self.api_queries = 0
+
+    @staticmethod
+    def build_client(credentials, timeout_seconds: float):
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=timeout_seconds))
+        return build("drive", "v3", http=http, cache_discovery=False)
 
-        self.service = build("drive", "v3", credentials=credentials)
+    def start_index_refresh(self):
+        """
+        Loads the folder indices in a background thread, then refreshes them every refresh_seconds.
+        Until the first load, lookups query the API.
+        """
+
+        if self.refresh_thread is not None:
+            return
+        self.stop_event.clear()
+        self.refresh_thread = threading.Thread(target=self.__refresh_loop, name="drive-index", daemon=True)
+        self.refresh_thread.start()
+
+    def stop_index_refresh(self):
+        self.stop_event.set()
+        if self.refresh_thread is not None:
+            self.refresh_thread.join()
+            self.refresh_thread = None
+
+    def refresh_index(self, category: MediaCategory):
+        start_time = time.time()
+        count = self.indices[category].load(self.__list_page)
+        end_time = time.time()
+        logger.info(f"[DriveIndex][{category.name}]: {count} files in {end_time - start_time} seconds")
 
     def get_image_url(self, file_name: str, category: MediaCategory):
+        return self.__find_in_index(file_name, category) or self.__query_image(file_name, category)
+
+    def download_image(self, file_name: str, category: MediaCategory) -> (bytes, str):
+        """
+        Thumbnail of image_size pixels of the first file matching the name, the same file as the one of get_image_url,
+        from the thumbnail link of the index: the originals are much larger than what the clients display.
+        Only a file without thumbnail is downloaded in full.
+        :return: tuple of (content, mime type)
+        """
+
+        files = self.get_image_url(file_name, category)["files"]
+        if not files:
+            raise fastapi.HTTPException(status_code=404, detail="Media not found!")
+        file = files[0]
+        if not file.get("thumbnailLink"):
+            content = self.__get_client().files().get_media(fileId=file["id"]).execute()
+            return content, file.get("mimeType") or "application/octet-stream"
+
+        response, content = self.__get_http().request(f"{file['thumbnailLink']}=s{self.image_size}", "GET")
+        if response.status != 200:
+            logger.warning(f"[DriveMedia][{category.name}]: {file_name} thumbnail answered {response.status}")
+            raise fastapi.HTTPException(status_code=502, detail="Media download failed!")
+        return content, response.get("content-type") or file.get("mimeType") or "application/octet-stream"
+
+    def get_image_urls(self, file_names: list[str], category: MediaCategory) -> list[dict | None]:
+        """
+        get_image_url of every name, the ones missing from the index being queried concurrently,
+        so the names cost about one round trip together.
+        :return: the results in the order of the names, None for a query that failed (e.g. timed out).
+        """
+
+        results = [self.__find_in_index(file_name, category) for file_name in file_names]
+        futures = {position: self.lookup_executor.submit(self.__query_image, file_names[position], category)
+                   for position, result in enumerate(results) if result is None}
+        for position, future in futures.items():
+            try:
+                results[position] = future.result()
+            except Exception:
+                logger.exception(f"[DriveLookup][{category.name}]: {file_names[position]} failed")
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "index_hits": self.index_hits,
+            "api_queries": self.api_queries,
+            "folders": {category.name: {"files": len(index.files), "age_seconds": index.age()}
+                        for category, index in self.indices.items()},
+        }
+
+    def __refresh_loop(self):
+        while not self.stop_event.is_set():
+            for category in MediaCategory:
+                try:
+                    self.refresh_index(category)
+                except Exception:
+                    # The previous index is kept, it is dropped by lookups once older than max_age_seconds.
+                    logger.exception(f"[DriveIndex][{category.name}]: refresh failed")
+            self.index_ready.set()
+            self.stop_event.wait(self.refresh_seconds)
+
+    def __find_in_index(self, file_name: str, category: MediaCategory) -> dict | None:
+        index = self.indices[category]
+        age = index.age()
+        if age is None or age >= self.max_age_seconds:
+            return None
+        files = index.find(file_name)
+        if not files:
+            return None
+        self.index_hits += 1
+        return {"files": files}
+
+    def __query_image(self, file_name: str, category: MediaCategory) -> dict:
+        self.api_queries += 1
         folder_id = self.__get_folder_id(category)
-        results = self.service.files().list(pageSize=1000,
-                                            fields="nextPageToken, files(id, name, mimeType, size, thumbnailLink)",
-                                            q=f'"{folder_id}" in parents and name contains "{file_name}"').execute()
-        for result in results["files"]:
+        return self.__list_page(f'"{folder_id}" in parents and name contains "{file_name}"', 1000, None)
+
+    def __get_client(self):
+        client = getattr(self.clients, "client", None)
+        if client is None:
+            client = self.clients.client = self.client_factory()
+        return client
+
+    def __get_http(self):
+        http = getattr(self.clients, "http", None)
+        if http is None:
+            http = self.clients.http = self.http_factory()
+        return http
+
+    def __list_page(self, query: str, page_size: int, page_token: str | None) -> dict:
+        results = self.__get_client().files().list(pageSize=page_size, pageToken=page_token,
+                                                   fields=f"nextPageToken, files({DriveFolderIndex.FILE_FIELDS})",
+                                                   q=query).execute()
+        for result in results.get("files", []):
             if "thumbnailLink" in result:
                 result["thumbnailLink"] = self.__get_max_size_thumbnail(result["thumbnailLink"])
 
@@ -1,62 +1,384 @@
 import time
 from collections import Counter
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
 
 import fastapi
 import logging
 
-from model.dto.guess_model import GuessInput, GuessOutput, Question
+from model.dto.guess_model import GuessInput, GuessOutput, Question, GuessJob
+from service import metrics
+from service.best_question_cache import BestQuestionCache
+from service.knowledge_shards import KnowledgeShards
+from service.knowledge_snapshot import KnowledgeSnapshot
+from service.metrics import MetricsRegistry, TimingScope
+from service.async_mongo_service import AsyncMongoService
 from service.mongo_service import MongoService
+from service.mr_job_queue import MRJobQueue, QueuedJob
+from service.opening_book import OpeningBook
+from service.session_store import SessionStore, GameSession
 from service.find_question_service import FindQuestionService, FindStrategy
+from service.strategy.kernels import EncodedSection, SectionCounts
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class GuessOptions:
+    """
+    Optional components and features of a GuessService, all disabled by default.
+    """
+
+    # Results are cached only for a versioned (snapshot) knowledge base, so that changes are detected.
+    cache: BestQuestionCache | None = None
+    # Precompiled question trees, per strategy, for the current snapshot version.
+    opening_books: dict[FindStrategy, OpeningBook] = field(default_factory=dict)
+    # Optional incremental sessions, they keep the surviving items between turns.
+    session_store: SessionStore | None = None
+    # Used by predict_next_question_async: non-blocking storage, and the executor of the CPU bound work.
+    async_storage_service: AsyncMongoService | None = None
+    executor: Executor | None = None
+    # Shards of the snapshot version: the MR strategies filter them in their job, without a section.
+    shards: KnowledgeShards | None = None
+    # Queue running the MR strategies in the background, see submit_next_question.
+    job_queue: MRJobQueue | None = None
+    # Histograms of the stage durations and section sizes of the turns.
+    metrics_registry: MetricsRegistry | None = None
+    # Without a snapshot, the contingency strategies are scored from the (attribute, value, class) counts
+    # aggregated by the storage, instead of receiving the items of the section.
+    section_counts: bool = False
+
+
 class GuessService:
 
     def __init__(self, storage_service: MongoService, find_question_service: FindQuestionService,
-                 target_field: str):
+                 target_field: str, snapshot: KnowledgeSnapshot | None = None, knowledge_base: str = None,
+                 options: GuessOptions | None = None):
+        options = options or GuessOptions()
         self.storage_service = storage_service
         self.find_question_service = find_question_service
         self.target_field = target_field
+        # When a snapshot is provided, sections are filtered in memory instead of querying the storage.
+        self.snapshot = snapshot
+        self.knowledge_base = knowledge_base
+        self.cache = options.cache
+        self.opening_books = dict(options.opening_books)
+        self.session_store = options.session_store
+        self.async_storage_service = options.async_storage_service
+        self.executor = options.executor
+        self.shards = options.shards
+        self.job_queue = options.job_queue
+        self.metrics_registry = options.metrics_registry
+        self.section_counts = options.section_counts
+
+    def reload_snapshot(self):
+        """
+        Reloads the knowledge base snapshot and drops the cached results of the previous version.
+        The section schema of the storage is read again.
+        """
+
+        self.storage_service.reset_section_schema()
+        if self.async_storage_service is not None:
+            self.async_storage_service.reset_section_schema()
+        if self.snapshot is None:
+            return
+        self.snapshot = KnowledgeSnapshot.load(self.storage_service, self.target_field)
+        if self.cache is not None:
+            self.cache.invalidate(self.knowledge_base)
+        self.opening_books = {strategy: book for strategy, book in self.opening_books.items()
+                              if book.version == self.snapshot.version}
+        if self.shards is not None:
+            self.shards = KnowledgeShards.export(self.snapshot, self.shards.directory, self.shards.n_shards)
 
     def predict_next_question(self, guess_input: GuessInput,
                               strategy: FindStrategy = FindStrategy.INFORMATION_GAIN) -> GuessOutput:
+        scope = self.__start_scope(strategy)
+        try:
+            session, questions, bitmap = self.__start_turn(guess_input)
+            cache_key, result = self.__lookup(questions, guess_input.max_depth, strategy)
+            if result is None and self.__use_shards(questions, bitmap, guess_input.max_depth, strategy):
+                result = self.__compute_in_shards(questions, strategy, cache_key)
+            elif result is None:
+                section = self.__retrieve_section(questions, bitmap, strategy)
+                result = self.__compute(section, questions, guess_input.max_depth, strategy, cache_key)
+        finally:
+            stages, total_seconds = scope.close()
+        self.__observe_turn(strategy, stages, total_seconds)
+        return self.__finish_turn(session, questions, bitmap, result)
+
+    async def predict_next_question_async(self, guess_input: GuessInput,
+                                          strategy: FindStrategy = FindStrategy.INFORMATION_GAIN) -> GuessOutput:
+        """
+        Same as predict_next_question, without blocking the event loop.
+        Cached paths are answered right away, the storage is queried with the async client when there is no snapshot,
+        and the section filtering and strategy evaluation run on the CPU executor.
+        """
+
+        scope = self.__start_scope(strategy)
+        try:
+            session, questions, bitmap = self.__start_turn(guess_input)
+            cache_key, result = self.__lookup(questions, guess_input.max_depth, strategy)
+            if result is None and self.__use_shards(questions, bitmap, guess_input.max_depth, strategy):
+                result = await metrics.run_in_executor(self.executor, self.__compute_in_shards,
+                                                       questions, strategy, cache_key)
+            elif result is None:
+                if self.snapshot is None and self.async_storage_service is not None:
+                    section = await self.__retrieve_section_async(questions, strategy)
+                else:
+                    section = await metrics.run_in_executor(self.executor, self.__retrieve_section, questions, bitmap,
+                                                            strategy)
+                result = await metrics.run_in_executor(self.executor, self.__compute, section, questions,
+                                                       guess_input.max_depth, strategy, cache_key)
+        finally:
+            stages, total_seconds = scope.close()
+        self.__observe_turn(strategy, stages, total_seconds)
+        return self.__finish_turn(session, questions, bitmap, result)
+
+    async def submit_next_question(self, guess_input: GuessInput, strategy: FindStrategy) -> GuessJob:
+        """
+        Job mode of the MR strategies: queues the evaluation and returns its job, to be polled for the result.
+        Results already known (cache, opening book, last turn) are returned right away, as a finished job.
+        The same answers submitted while their job is unfinished get that job.
+        """
+
+        if self.job_queue is None:
+            raise fastapi.HTTPException(status_code=503, detail="The job mode is disabled, use the guess endpoint!")
+        if not self.find_question_service.is_mr_strategy(strategy):
+            raise fastapi.HTTPException(status_code=400, detail="Only the MR strategies can run as jobs!")
+        if guess_input.session_id is not None or guess_input.start_session:
+            raise fastapi.HTTPException(status_code=400, detail="Sessions are not supported by the jobs!")
+
+        questions = guess_input.questions
+        cache_key, result = self.__lookup(questions, guess_input.max_depth, strategy)
+        if result is None and len(questions) >= guess_input.max_depth:
+            result = await self.predict_next_question_async(guess_input, strategy)
+        if result is not None:
+            return GuessJob(status=QueuedJob.DONE, result=result)
+
+        key = BestQuestionCache.make_key(self.knowledge_base, self.snapshot.version if self.snapshot else None,
+                                         strategy, questions)
+        job = self.job_queue.get_in_flight(key)
+        if job is not None:
+            return job.to_output()
+
+        def on_result(job_result: GuessOutput):
+            if cache_key is not None:
+                self.cache.put(cache_key, job_result)
+
+        if self.__use_shards(questions, None, guess_input.max_depth, strategy):
+            job = self.job_queue.submit(key, None, self.target_field, strategy, self.shards, questions, on_result)
+            return job.to_output()
+
+        if self.snapshot is None and self.async_storage_service is not None:
+            section = await self.__retrieve_section_async(questions)
+        else:
+            section = await metrics.run_in_executor(self.executor, self.__retrieve_section, questions)
+        if not self.__get_section_size(section):
+            raise fastapi.HTTPException(status_code=404, detail="No character was found based on the provided answers!")
+        job = self.job_queue.submit(key, section, self.target_field, strategy, on_result=on_result)
+        return job.to_output()
+
+    def __start_turn(self, guess_input: GuessInput) -> (GameSession | None, list[Question], int | None):
+        """
+        Resolves the session of the request, if any.
+        :return: tuple of:
+            - GameSession: the session to update after the turn, None in stateless mode
+            - list[Question]: all the questions answered in the game
+            - int: bitmap of the surviving items, None in stateless mode
+        """
+
+        if guess_input.session_id is None:
+            if not guess_input.start_session or self.session_store is None or self.snapshot is None:
+                return None, guess_input.questions, None
+            session = SessionStore.new_session(self.snapshot.version, self.snapshot.index.all_rows)
+        else:
+            session = self.session_store.get(guess_input.session_id) if self.session_store is not None else None
+            if session is None or self.snapshot is None or session.version != self.snapshot.version:
+                raise fastapi.HTTPException(status_code=410,
+                                            detail="Session expired! Send the full list of questions without it.")
+
+        # Answers to attributes already answered are ignored: a retried turn does not record them twice.
+        answered = {question.name for question in session.questions}
+        new_questions = []
+        for question in guess_input.questions:
+            if question.name not in answered:
+                answered.add(question.name)
+                new_questions.append(question)
+
+        # Only the newest answers narrow the items surviving the previous turns.
+        bitmap = self.snapshot.index.filter(new_questions, session.bitmap)
+        return session, session.questions + new_questions, bitmap
+
+    def __finish_turn(self, session: GameSession | None, questions: list[Question], bitmap: int | None,
+                      result: GuessOutput) -> GuessOutput:
+        # The turn is recorded only once it succeeded, so a rejected answer can be sent again.
+        # The stored session is replaced, not updated: a concurrent turn keeps the state it started from,
+        # and is refused if this one is recorded first.
+        if session is not None:
+            updated = GameSession(session.session_id, session.version, questions, bitmap, session.turn + 1)
+            if not self.session_store.put(updated, expected_turn=session.turn):
+                raise fastapi.HTTPException(status_code=409,
+                                            detail="Another turn of the session was recorded first! "
+                                                   "Send the answers again.")
+            result.session_id = session.session_id
+        return result
+
+    def __lookup(self, questions: list[Question], max_depth: int, strategy: FindStrategy) -> (tuple, GuessOutput):
+        """
+        Looks for an already computed result of the questions, in the cache and in the opening book.
+        :return: tuple of (cache key, result), both None when there is nothing to look up.
+        """
+
+        if self.snapshot is None or len(questions) >= max_depth:
+            return None, None
+
+        # Same answers, in any order, lead to the same question.
+        cache_key = None
+        if self.cache is not None:
+            cache_key = BestQuestionCache.make_key(self.knowledge_base, self.snapshot.version, strategy, questions)
+            result = self.cache.get(cache_key)
+            if result is not None:
+                logger.info(f"[CacheHit][{strategy}]: {questions}")
+                metrics.annotate(source="cache")
+                return cache_key, result
+
+        # Paths covered by the opening book are a node lookup.
+        result = self.__lookup_opening_book(questions, strategy)
+        if result is not None:
+            logger.info(f"[OpeningBookHit][{strategy}]: {questions}")
+            metrics.annotate(source="opening_book")
+        return cache_key, result
+
+    def __retrieve_section(self, questions: list[Question], bitmap: int | None = None,
+                           strategy: FindStrategy | None = None) -> list | EncodedSection | SectionCounts:
         start_time = time.time()
-        section = self.__get_knowledge_section(guess_input.questions)
+        with metrics.stage("retrieve"):
+            section = self.__get_knowledge_section(questions, bitmap, strategy)
         end_time = time.time()
         logger.info(f"[RetrieveTime]: {end_time - start_time} seconds")
-        logger.info(f"[RetrieveInstances]: {len(section)}")
+        return section
+
+    async def __retrieve_section_async(self, questions: list[Question],
+                                       strategy: FindStrategy | None = None) -> list[dict] | SectionCounts:
+        start_time = time.time()
+        with metrics.stage("retrieve"):
+            if self.__use_section_counts(strategy):
+                section = await self.async_storage_service.get_section_counts(questions, self.target_field)
+            else:
+                section = await self.async_storage_service.get_knowledge_section(questions)
+        end_time = time.time()
+        logger.info(f"[RetrieveTime]: {end_time - start_time} seconds")
+        return section
+
+    def __compute(self, section: list | EncodedSection | SectionCounts, questions: list[Question], max_depth: int,
+                  strategy: FindStrategy, cache_key: tuple | None) -> GuessOutput:
+        logger.info(f"[RetrieveInstances]: {self.__get_section_size(section)}")
+        metrics.annotate(source="counts" if isinstance(section, SectionCounts) else "section",
+                         section_rows=self.__get_section_size(section),
+                         features=self.__get_feature_count(section))
+        if self.metrics_registry is not None:
+            self.metrics_registry.observe("guess_section_rows", self.__get_section_size(section),
+                                          knowledge_base=self.knowledge_base)
 
         # Treat the case when no character is returned.
         # TODO: Implement strategy to find out the wrong arguments.
-        if not len(section):
+        if not self.__get_section_size(section):
             raise fastapi.HTTPException(status_code=404, detail="No character was found based on the provided answers!")
 
         # If maximum depth has been reached, return the majority class.
-        if len(guess_input.questions) >= guess_input.max_depth:
+        if len(questions) >= max_depth:
             __, majority_class = self.__get_majority(section)
             result = GuessOutput()
             result.guess = majority_class
             return result
 
-        logger.info(f"[Question]: {guess_input.questions}")
+        logger.info(f"[Question]: {questions}")
         start_time = time.time()
         result = self.find_question_service.find_best_question(section, self.target_field, strategy)
         end_time = time.time()
         logger.info(f"[BestQuestionTime][{strategy}]: {end_time - start_time} seconds.")
 
+        if cache_key is not None:
+            self.cache.put(cache_key, result)
+        return result
+
+    def __start_scope(self, strategy: FindStrategy) -> TimingScope:
+        scope = TimingScope()
+        metrics.annotate(knowledge_base=self.knowledge_base, strategy=strategy.name.lower())
+        return scope
+
+    def __observe_turn(self, strategy: FindStrategy, stages: list[tuple[str, float]], total_seconds: float):
+        if self.metrics_registry is None:
+            return
+        labels = {"knowledge_base": self.knowledge_base, "strategy": strategy.name.lower()}
+        for name, seconds in stages:
+            self.metrics_registry.observe("guess_stage_seconds", seconds, stage=name, **labels)
+        self.metrics_registry.observe("guess_stage_seconds", total_seconds, stage="total", **labels)
+
+    def __use_shards(self, questions: list[Question], bitmap: int | None, max_depth: int,
+                     strategy: FindStrategy) -> bool:
+        # Sessions already hold their section, and the last turn only needs the majority class.
+        return (self.shards is not None and bitmap is None and len(questions) < max_depth
+                and self.shards.version == self.snapshot.version
+                and self.find_question_service.is_mr_strategy(strategy))
+
+    def __compute_in_shards(self, questions: list[Question], strategy: FindStrategy,
+                            cache_key: tuple | None) -> GuessOutput:
+        logger.info(f"[Question]: {questions}")
+        metrics.annotate(source="shards",
+                         features=len(self.snapshot.attributes) - len({question.name for question in questions}))
+        start_time = time.time()
+        result = self.find_question_service.find_best_question_in_shards(self.shards, questions, strategy)
+        end_time = time.time()
+        logger.info(f"[BestQuestionTime][{strategy}][Shards]: {end_time - start_time} seconds.")
+
+        if result is None:
+            raise fastapi.HTTPException(status_code=404, detail="No character was found based on the provided answers!")
+
+        if cache_key is not None:
+            self.cache.put(cache_key, result)
         return result
 
-    def __get_knowledge_section(self, attributes: list[Question]) -> list:
+    def __lookup_opening_book(self, questions: list[Question], strategy: FindStrategy) -> GuessOutput | None:
+        book = self.opening_books.get(strategy)
+        if book is None or book.version != self.snapshot.version:
+            return None
+        return book.lookup(questions)
+
+    def __get_knowledge_section(self, attributes: list[Question], bitmap: int | None = None,
+                                strategy: FindStrategy | None = None) -> list | EncodedSection | SectionCounts:
         """
             Private method responsible for retrieving a section of the items present in the knowledge base.
             The items are filtered by the answers of the already provided questions and projected after question names that
             were not provided.
+            In session mode, the bitmap already holds the filtered items.
+            In section counts mode, only the counts of the section are retrieved for the strategy.
         """
 
+        if bitmap is not None:
+            return self.snapshot.section_from_bitmap(bitmap, {attribute.name for attribute in attributes})
+        if self.snapshot is not None:
+            return self.snapshot.section(attributes)
+        if self.__use_section_counts(strategy):
+            return self.storage_service.get_section_counts(attributes, self.target_field)
         return list(self.storage_service.get_knowledge_section(attributes))
 
-    def __get_majority(self, section: list[dict]) -> (int, str):
+    def __use_section_counts(self, strategy: FindStrategy | None) -> bool:
+        # The MR strategies and their jobs need the items.
+        return (self.section_counts and self.snapshot is None and strategy is not None
+                and self.find_question_service.is_contingency_strategy(strategy))
+
+    def __get_section_size(self, section: list | EncodedSection | SectionCounts) -> int:
+        if isinstance(section, (EncodedSection, SectionCounts)):
+            return section.n_rows
+        return len(section)
+
+    def __get_feature_count(self, section: list | EncodedSection | SectionCounts) -> int:
+        if isinstance(section, (EncodedSection, SectionCounts)):
+            return section.n_features
+        return len(section[0].keys() - {"_id", self.target_field}) if section else 0
+
+    def __get_majority(self, section: list[dict] | EncodedSection | SectionCounts) -> (int, str):
         """
            Finds out the majority class and returns it.
         :param section: list of elements provided by __get_knowledge_section() method.
@@ -65,6 +387,9 @@ class GuessService:
             str: the most common label from the target column.
         """
 
+        if isinstance(section, (EncodedSection, SectionCounts)):
+            return section.n_classes(), section.majority_class()
+
         labels = map(lambda item: item[self.target_field], section)
         counter = Counter(labels)
         most_common = counter.most_common()
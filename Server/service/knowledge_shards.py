@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+from model.dto.guess_model import Question
+from service.knowledge_snapshot import KnowledgeSnapshot
+from service.mr.query_finder_jobs import MISSING_VALUE_ID, ABSENT_VALUE_ID, NULL_VALUE_ID
+
+logger = logging.getLogger(__name__)
+
+
+class KnowledgeShards:
+    """
+    Knowledge base version exported once as the input of the MapReduce jobs, in n stable shard files.
+    Every line is an item in the rows input format of the jobs: the class id followed by the value id of every
+    attribute, where the ids are the snapshot codes shifted by one (MISSING_VALUE_ID marks a missing attribute)
+    and NULL_VALUE_ID marks an attribute held with a null value.
+    The manifest holds the dictionaries to encode the answers and decode the job result.
+    Layout: <directory>/<version>/manifest.json and <directory>/<version>/part-00000.rows ...
+    """
+
+    MANIFEST_FILE_NAME = "manifest.json"
+
+    def __init__(self, directory: str, version: str, attributes: list[str], values: list[list[str]],
+                 classes: list[str], target_field: str, n_rows: int, shard_files: list[str]):
+        self.directory = directory
+        self.version = version
+        self.attributes = attributes
+        self.values = values
+        self.classes = classes
+        self.target_field = target_field
+        self.n_rows = n_rows
+        self.shard_files = shard_files
+
+        self.attribute_indices = {attribute: index for index, attribute in enumerate(attributes)}
+        self.value_ids = [{value: value_id for value_id, value in enumerate(attribute_values)}
+                          for attribute_values in values]
+
+    @property
+    def n_shards(self) -> int:
+        return len(self.shard_files)
+
+    @property
+    def paths(self) -> list[str]:
+        return [os.path.join(self.directory, self.version, shard_file) for shard_file in self.shard_files]
+
+    @classmethod
+    def export(cls, snapshot: KnowledgeSnapshot, directory: str, n_shards: int) -> KnowledgeShards:
+        """
+        Writes the shards of the snapshot version, unless they were already exported.
+        The files are written to a temporary directory renamed at the end, so a reader never sees a partial version;
+        the previous versions are then removed.
+        """
+
+        # Resolved once, the working directory of the process changes while an mrjob runner job runs.
+        directory = os.path.abspath(directory)
+        shards = cls.load(directory, snapshot.version)
+        if shards is not None:
+            cls.__remove_old_versions(directory, snapshot.version)
+            return shards
+
+        os.makedirs(directory, exist_ok=True)
+        tmp_directory = os.path.join(directory, f".{snapshot.version}-{uuid.uuid4().hex}")
+        os.makedirs(tmp_directory)
+        try:
+            rows = np.column_stack([snapshot.target, snapshot.codes.astype(np.int32) - 1])
+            for index, null_rows in snapshot.null_rows.items():
+                rows[null_rows, index + 1] = NULL_VALUE_ID
+            shard_files = []
+            # Contiguous ranges of items, the same items always land in the same shard of a version.
+            for index, shard_rows in enumerate(np.array_split(rows, max(1, min(n_shards, len(rows))))):
+                shard_file = f"part-{index:05d}.rows"
+                np.savetxt(os.path.join(tmp_directory, shard_file), shard_rows, fmt="%d", delimiter=",")
+                shard_files.append(shard_file)
+
+            with open(os.path.join(tmp_directory, cls.MANIFEST_FILE_NAME), "w") as manifest_file:
+                json.dump({"version": snapshot.version, "target_field": snapshot.target_field,
+                           "attributes": snapshot.attributes, "values": snapshot.values,
+                           "classes": snapshot.classes, "n_rows": snapshot.n_rows, "shards": shard_files},
+                          manifest_file)
+            os.rename(tmp_directory, os.path.join(directory, snapshot.version))
+        except OSError:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            # Another process exported the same version first.
+            shards = cls.load(directory, snapshot.version)
+            if shards is None:
+                raise
+            return shards
+
+        logger.info(f"[Shards]: exported version {snapshot.version}, {snapshot.n_rows} items in {len(shard_files)} "
+                    f"shards to {directory}")
+        cls.__remove_old_versions(directory, snapshot.version)
+        return cls.load(directory, snapshot.version)
+
+    @classmethod
+    def __remove_old_versions(cls, directory: str, version: str):
+        """
+        Deletes the versions exported before the current one. The temporary directories of the exports in progress
+        start with a dot and are left to their writer.
+        """
+
+        for entry in os.listdir(directory):
+            path = os.path.join(directory, entry)
+            if entry == version or entry.startswith(".") or not os.path.isdir(path):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"[Shards]: removed version {entry} from {directory}")
+
+    @classmethod
+    def load(cls, directory: str, version: str) -> KnowledgeShards | None:
+        manifest_path = os.path.join(directory, version, cls.MANIFEST_FILE_NAME)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r") as manifest_file:
+            manifest = json.load(manifest_file)
+        return cls(directory, manifest["version"], manifest["attributes"], manifest["values"], manifest["classes"],
+                   manifest["target_field"], manifest["n_rows"], manifest["shards"])
+
+    def encode_answers(self, questions: list[Question]) -> list[list[int | None]]:
+        """
+        Encodes the answered questions as the --answers filter of the jobs: [attribute id, value id].
+        The value id is None for an unknown answer, which does not filter but still removes the attribute,
+        and ABSENT_VALUE_ID for an answer no item holds. Attributes no item has are left out, they keep every item.
+        """
+
+        answers = []
+        for question in questions:
+            index = self.attribute_indices.get(question.name)
+            if index is None:
+                continue
+            value_id = None
+            if question.answer:
+                value_id = self.value_ids[index].get(question.answer, ABSENT_VALUE_ID)
+            answers.append([index, value_id])
+        return answers
+
+    def decode_values(self, attribute: str, value_ids: list[int]) -> list[str]:
+        values = self.values[self.attribute_indices[attribute]]
+        return [values[value_id] for value_id in value_ids if value_id != MISSING_VALUE_ID]
+
+    def decode_classes(self, class_counts: list[list[int]]) -> dict[str, int]:
+        return {self.classes[class_id]: count for class_id, count in class_counts}
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from typing import Iterable
+
+import numpy as np
+
+from model.dto.guess_model import Question
+from service.bitmap_index import BitmapIndex
+from service.strategy.kernels import EncodedSection, MISSING_CODE, check_not_null_nan
+
+logger = logging.getLogger(__name__)
+
+
+class KnowledgeSnapshot:
+    """
+    Read-optimized, dictionary encoded copy of the knowledge collection.
+    Every attribute is stored as a small int code column, where MISSING_CODE marks an item without a value for the
+    attribute and code k > 0 stands for values[attribute][k - 1].
+    Items holding the attribute with a null value are scored as missing it, but as for the knowledge base query,
+    an answer to the attribute does not keep them: their rows are listed in null_rows, per attribute index.
+    """
+
+    def __init__(self, attributes: list[str], values: list[list[str]], codes: np.ndarray, target: np.ndarray,
+                 classes: list[str], target_field: str, null_rows: dict[int, np.ndarray] | None = None):
+        self.attributes = attributes
+        self.values = values
+        self.codes = codes
+        self.target = target
+        self.classes = classes
+        self.target_field = target_field
+        self.null_rows = null_rows or {}
+
+        self.attribute_indices = {attribute: index for index, attribute in enumerate(attributes)}
+        self.value_codes = [{value: code + 1 for code, value in enumerate(attribute_values)}
+                            for attribute_values in values]
+        self.version = self.__fingerprint()
+        self.index = BitmapIndex(codes, self.attribute_indices, self.value_codes, self.null_rows)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[dict], attribute_values: dict[str, list],
+                       target_field: str) -> KnowledgeSnapshot:
+        """
+        Encodes the knowledge items using the value dictionary of each attribute.
+        Values that are not part of the dictionary are appended to it.
+        """
+
+        documents = list(documents)
+        attributes = [attribute for attribute in attribute_values if attribute not in (target_field, '_id')]
+        values = [[value for value in attribute_values[attribute] if check_not_null_nan(value)]
+                  for attribute in attributes]
+
+        # Attributes present only on the items.
+        known_attributes = set(attributes)
+        for document in documents:
+            for attribute in document:
+                if attribute not in known_attributes and attribute not in (target_field, '_id'):
+                    known_attributes.add(attribute)
+                    attributes.append(attribute)
+                    values.append([])
+
+        value_codes = [{value: code + 1 for code, value in enumerate(attribute_values)} for attribute_values in values]
+        attribute_indices = {attribute: index for index, attribute in enumerate(attributes)}
+        raw_codes = np.full((len(documents), len(attributes)), MISSING_CODE, dtype=np.int32)
+        null_rows = {}
+        labels = []
+
+        for row, document in enumerate(documents):
+            labels.append(document.get(target_field))
+            for attribute, value in document.items():
+                index = attribute_indices.get(attribute)
+                if index is None:
+                    continue
+                if not check_not_null_nan(value):
+                    null_rows.setdefault(index, []).append(row)
+                    continue
+                code = value_codes[index].get(value)
+                if code is None:
+                    values[index].append(value)
+                    code = value_codes[index][value] = len(values[index])
+                raw_codes[row, index] = code
+
+        # A few bytes per cell are enough for the code columns, stored column-major for filtering.
+        largest_dictionary = max((len(attribute_values) for attribute_values in values), default=0)
+        codes = np.asfortranarray(raw_codes, dtype=np.uint8 if largest_dictionary < np.iinfo(np.uint8).max
+                                  else np.uint16)
+
+        classes = list(dict.fromkeys(labels))
+        class_indices = {label: index for index, label in enumerate(classes)}
+        target = np.array([class_indices[label] for label in labels], dtype=np.int32)
+
+        return cls(attributes, values, codes, target, classes, target_field,
+                   {index: np.array(rows, dtype=np.int64) for index, rows in null_rows.items()})
+
+    @classmethod
+    def load(cls, storage_service, target_field: str) -> KnowledgeSnapshot:
+        snapshot = cls.from_documents(storage_service.get_all_knowledge(),
+                                      storage_service.get_all_attribute_values(),
+                                      target_field)
+        logger.info(f"[Snapshot]: {snapshot.n_rows} items, {len(snapshot.attributes)} attributes, "
+                    f"{snapshot.codes.nbytes} bytes, version {snapshot.version}")
+        return snapshot
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.target)
+
+    def encode_answer(self, attribute: str, answer: str) -> int | None:
+        """
+        Returns the code of an answer, or None if no item holds that value for the attribute.
+        """
+
+        index = self.attribute_indices.get(attribute)
+        if index is None:
+            return None
+        return self.value_codes[index].get(answer)
+
+    def filter(self, questions: list[Question]) -> int:
+        """
+        Bitmap of the items where every answered attribute either equals the answer or is missing (not null).
+        Questions answered as unknown (None) do not filter.
+        """
+
+        return self.index.filter(questions)
+
+    def section(self, questions: list[Question]) -> EncodedSection:
+        return self.section_from_bitmap(self.filter(questions), {question.name for question in questions})
+
+    def section_from_bitmap(self, bitmap: int, excluded_attributes: set[str]) -> EncodedSection:
+        return self.section_from_rows(self.index.to_rows(bitmap), excluded_attributes)
+
+    def section_from_rows(self, rows: np.ndarray, excluded_attributes: set[str]) -> EncodedSection:
+        """
+        Projects the selected items on the attributes that were not asked yet.
+        Attributes missing on all the selected items are left out, the same as a query result would do.
+        """
+
+        codes = self.codes[rows]
+        defined = (codes != MISSING_CODE).any(axis=0)
+        columns = [index for index, attribute in enumerate(self.attributes)
+                   if defined[index] and attribute not in excluded_attributes]
+
+        # Classes are re-indexed to the ones left in the section.
+        present_classes, target = np.unique(self.target[rows], return_inverse=True)
+
+        return EncodedSection(codes[:, columns],
+                              target.astype(np.int32),
+                              [self.attributes[index] for index in columns],
+                              [self.values[index] for index in columns],
+                              [self.classes[index] for index in present_classes],
+                              self.target_field)
+
+    def __fingerprint(self) -> str:
+        digest = hashlib.sha1()
+        digest.update(self.codes.tobytes())
+        digest.update(self.target.tobytes())
+        digest.update(repr((self.attributes, self.values, self.classes)).encode("utf-8"))
+        for index in sorted(self.null_rows):
+            digest.update(repr(index).encode("utf-8"))
+            digest.update(self.null_rows[index].tobytes())
+        return digest.hexdigest()[:12]
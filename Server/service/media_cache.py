@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCache:
+    """
+    Size-bounded, content-addressed on-disk cache of media files.
+    Contents are stored once per SHA-256 digest under blobs/, and the index (index.json) maps a media key
+    to its digest and content type, so the digest is also the strong ETag of the media.
+    Blobs are evicted in least recently used order above max_bytes; the order survives restarts
+    through the blob modification times, touched when a blob is served.
+    """
+
+    INDEX_FILE_NAME = "index.json"
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        # Resolved once, the working directory of the process changes while an mrjob runner job runs.
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        # key -> {"digest", "content_type"}, digest -> size in LRU order.
+        self.keys = {}
+        self.blobs = OrderedDict()
+        self.used_bytes = 0
+        # key -> Future of the download in progress.
+        self.downloads = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.__load()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return "/".join(str(part) for part in parts)
+
+    def get(self, key: str) -> (bytes, str, str) | None:
+        """
+        :return: tuple of (content, content type, digest), None if the key is not cached.
+        """
+
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+        digest, content_type = entry
+        content = self.read(digest)
+        return (content, content_type, digest) if content is not None else None
+
+    def lookup(self, key: str) -> (str, str) | None:
+        """
+        Digest and content type of a cached key, enough to answer a conditional request without reading the content.
+        :return: tuple of (digest, content type), None if the key is not cached.
+        """
+
+        with self.lock:
+            entry = self.keys.get(key)
+            if entry is None or entry["digest"] not in self.blobs:
+                self.misses += 1
+                return None
+            self.blobs.move_to_end(entry["digest"])
+            self.hits += 1
+            return entry["digest"], entry["content_type"]
+
+    def read(self, digest: str) -> bytes | None:
+        """
+        Content of a blob, None if it was evicted meanwhile.
+        """
+
+        path = self.__blob_path(digest)
+        try:
+            with open(path, "rb") as blob_file:
+                content = blob_file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return content
+
+    def fetch(self, key: str, download: Callable[[], tuple[bytes, str]]) -> (bytes, str, str):
+        """
+        Miss path: downloads the content of a key with download() and stores it. Concurrent misses on the same key
+        share one download, the first caller runs it and the others wait for its result (or its exception).
+        :return: tuple of (content, content type, digest)
+        """
+
+        with self.lock:
+            entry = self.keys.get(key)
+            # Stored by a download that finished after the lookup of the caller.
+            stored = entry if entry is not None and entry["digest"] in self.blobs else None
+            future = self.downloads.get(key)
+            owner = stored is None and future is None
+            if owner:
+                future = self.downloads[key] = Future()
+            elif stored is None:
+                self.coalesced += 1
+
+        if stored is not None:
+            content = self.read(stored["digest"])
+            if content is not None:
+                return content, stored["content_type"], stored["digest"]
+            return self.fetch(key, download)
+        if not owner:
+            return future.result()
+
+        try:
+            content, content_type = download()
+            digest = self.put(key, content, content_type)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result((content, content_type, digest))
+            return content, content_type, digest
+        finally:
+            with self.lock:
+                del self.downloads[key]
+
+    def put(self, key: str, content: bytes, content_type: str) -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.__blob_path(digest)
+
+        with self.lock:
+            if digest not in self.blobs:
+                # Written to a temporary file and renamed, a reader never sees a partial blob.
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, "wb") as blob_file:
+                    blob_file.write(content)
+                os.replace(tmp_path, path)
+                self.blobs[digest] = len(content)
+                self.used_bytes += len(content)
+            self.blobs.move_to_end(digest)
+            self.keys[key] = {"digest": digest, "content_type": content_type}
+            self.__evict()
+            self.__save_index()
+        return digest
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "keys": len(self.keys),
+                "blobs": len(self.blobs),
+                "used_bytes": self.used_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+            }
+
+    def __evict(self):
+        # The blob just stored is the most recent one, it is kept even if alone above the limit.
+        while self.used_bytes > self.max_bytes and len(self.blobs) > 1:
+            digest, size = self.blobs.popitem(last=False)
+            self.used_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.__blob_path(digest))
+            except FileNotFoundError:
+                pass
+        live_digests = self.blobs.keys()
+        self.keys = {key: entry for key, entry in self.keys.items() if entry["digest"] in live_digests}
+
+    def __load(self):
+        blobs_directory = os.path.join(self.directory, "blobs")
+        blobs = []
+        for root, __, file_names in os.walk(blobs_directory):
+            for file_name in file_names:
+                path = os.path.join(root, file_name)
+                if file_name.endswith(".tmp"):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                blobs.append((stat.st_mtime, file_name, stat.st_size))
+        for __, digest, size in sorted(blobs):
+            self.blobs[digest] = size
+            self.used_bytes += size
+
+        index_path = os.path.join(self.directory, MediaCache.INDEX_FILE_NAME)
+        if os.path.exists(index_path):
+            with open(index_path, "r") as index_file:
+                self.keys = json.load(index_file)
+        self.__evict()
+        logger.info(f"[MediaCache]: {len(self.keys)} keys, {len(self.blobs)} blobs, {self.used_bytes} bytes")
+
+    def __save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        index_path = os.path.join(self.directory, MediaCache.INDEX_FILE_NAME)
+        tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as index_file:
+            json.dump(self.keys, index_file)
+        os.replace(tmp_path, index_path)
+
+    def __blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import Executor
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets: durations in seconds, and section sizes in rows.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+class RequestTrace:
+    """
+    What is recorded while serving a request: the duration of its stages (see stage()), and descriptive fields
+    (knowledge base, strategy, section size...) set by the services with annotate().
+    """
+
+    MAX_REQUEST_ID_LENGTH = 64
+
+    def __init__(self, request_id: str | None = None):
+        # The id sent by the client is kept if it is reasonably short, to follow the request across services.
+        if not request_id or len(request_id) > RequestTrace.MAX_REQUEST_ID_LENGTH:
+            request_id = uuid.uuid4().hex
+        self.request_id = request_id
+        self.timings = []
+        self.fields = {}
+
+    def stage_durations(self) -> dict[str, float]:
+        """
+        :return: stage -> seconds, with the durations of a repeated stage summed.
+        """
+
+        durations = {}
+        for name, seconds in self.timings:
+            durations[name] = durations.get(name, 0.0) + seconds
+        return durations
+
+
+# Trace of the request being served.
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """
+    Records the duration of a stage (retrieve, dataframe, score...) in the trace of the current request, if any.
+    """
+
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.timings.append((name, time.perf_counter() - start_time))
+
+
+def annotate(**fields):
+    """
+    Sets fields of the trace of the current request, if any.
+    """
+
+    trace = _trace.get()
+    if trace is not None:
+        trace.fields.update(fields)
+
+
+class TimingScope:
+    """
+    Collects the stages recorded from its creation, in the trace of the request, or in its own one when
+    there is no request (benchmarks, workers). Must be closed in the context it was created in.
+    """
+
+    def __init__(self):
+        self.trace = _trace.get()
+        self.token = None
+        if self.trace is None:
+            self.trace = RequestTrace()
+            self.token = _trace.set(self.trace)
+        self.start = len(self.trace.timings)
+        self.start_time = time.perf_counter()
+
+    def close(self) -> (list[tuple[str, float]], float):
+        """
+        :return: tuple of (stages recorded in the scope, duration of the scope in seconds)
+        """
+
+        if self.token is not None:
+            _trace.reset(self.token)
+            self.token = None
+        return self.trace.timings[self.start:], time.perf_counter() - self.start_time
+
+
+def start_request(request_id: str | None = None) -> (contextvars.Token, RequestTrace):
+    trace = RequestTrace(request_id)
+    return _trace.set(trace), trace
+
+
+def end_request(token: contextvars.Token):
+    _trace.reset(token)
+
+
+async def run_in_executor(executor: Executor | None, function: Callable, *args):
+    """
+    loop.run_in_executor, with the context of the caller, so that the stages of the function are recorded
+    in the trace of the request.
+    """
+
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, context.run, function, *args)
+
+
+def format_server_timing(trace: RequestTrace, total_seconds: float) -> str:
+    """
+    Server-Timing header value, in milliseconds.
+    """
+
+    durations = dict(trace.stage_durations(), total=total_seconds)
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in durations.items())
+
+
+class Histogram:
+    """
+    Cumulative histogram of each label set, in the Prometheus layout.
+    """
+
+    def __init__(self, name: str, description: str, buckets: tuple):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # labels (sorted (name, value) pairs) -> [bucket counts, sum, count]
+        self.series = {}
+
+    def observe(self, value: float, labels: tuple):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][position] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Histograms observed by the services, and gauges read from the stats() of the caches and queues at scrape time.
+    Rendered in the Prometheus text format (version 0.0.4).
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix: str = "akinator"):
+        self.prefix = prefix
+        self.histograms = {}
+        self.stats_sources = []
+        self.lock = threading.Lock()
+
+    def add_histogram(self, name: str, description: str, buckets: tuple = DURATION_BUCKETS):
+        with self.lock:
+            self.histograms[name] = Histogram(f"{self.prefix}_{name}", description, buckets)
+
+    def observe(self, name: str, value: float, **labels):
+        with self.lock:
+            self.histograms[name].observe(value, tuple(sorted((key, str(label)) for key, label in labels.items())))
+
+    def add_stats(self, name: str, get_stats: Callable[[], dict], counters: tuple[str, ...] = ()):
+        """
+        Exposes the numeric values of a stats() dictionary, nested ones included, as gauges named after their keys.
+        :param counters: keys of the values only increasing, exposed as counters.
+        """
+
+        self.stats_sources.append((f"{self.prefix}_{name}", get_stats, set(counters)))
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+
+        for name, get_stats, counters in self.stats_sources:
+            try:
+                stats = get_stats()
+            except Exception:
+                logger.exception(f"[Metrics]: stats of {name} failed")
+                continue
+            for key, value in _flatten(stats):
+                metric_name = f"{name}_{key}_total" if key in counters else f"{name}_{key}"
+                lines.append(f"# TYPE {metric_name} {'counter' if key in counters else 'gauge'}")
+                lines.append(f"{metric_name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(stats: dict, prefix: str = "") -> list[tuple[str, float]]:
+    values = []
+    for key, value in stats.items():
+        key = f"{prefix}{str(key).lower()}"
+        if isinstance(value, dict):
+            values.extend(_flatten(value, f"{key}_"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values.append((key, value))
+    return values
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
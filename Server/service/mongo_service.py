@@ -2,6 +2,7 @@ import pymongo
 import logging
 
 from model.dto.guess_model import Question
+from service.strategy.kernels import SectionCounts
 
 logger = logging.getLogger(__name__)
 
@@ -11,15 +12,113 @@ class MongoService:
     __METADATA_COLLECTION_NAME = 'metadata'
     __ATTRIBUTE_COLLECTION_NAME = 'attributes'
 
+    # Token schema (migrate_knowledge_tokens.py): every knowledge item also carries the multikey indexed arrays
+    # of its "attribute=value" tokens and of the attributes it does not have, so each answer is an index lookup.
+    TOKEN_SCHEMA = 'attribute_tokens'
+    TOKENS_FIELD = 'attribute_tokens'
+    MISSING_FIELD = 'missing_attributes'
+    # Items written after the migration, without the arrays: the token queries would silently leave them out.
+    UNTOKENIZED_QUERY = {TOKENS_FIELD: {'$exists': False}}
+
     def __init__(self, connection_str: str, database_name: str):
         self.mongo_client = pymongo.MongoClient(connection_str)
         self.db = self.mongo_client[database_name]
+        # Attributes covered by the missing arrays if the knowledge base was migrated, read once from the metadata.
+        self.token_attributes = None
+        # Order of the attributes and of their values in the section counts, read once.
+        self.attribute_values = None
 
     def get_knowledge_section(self, questions: list[Question]):
-        def create_attrib_condition(attr_name, attr_answer):
-            return [{attr_name: attr_answer}, {attr_name: {'$exists': False}}]
+        knowledge_collection = self.db[MongoService.__KNOWLEDGE_COLLECTION_NAME]
+        query, projection = MongoService.build_section_query(questions, self.__get_token_attributes())
+        return knowledge_collection.find(query, projection)
+
+    def get_section_counts(self, questions: list[Question], target_field: str) -> SectionCounts:
+        """
+        Same section as get_knowledge_section, reduced by the database to its (attribute, value, class) counts.
+        """
 
         knowledge_collection = self.db[MongoService.__KNOWLEDGE_COLLECTION_NAME]
+        token_attributes = self.__get_token_attributes()
+        if self.attribute_values is None:
+            self.attribute_values = self.get_all_attribute_values()
+        pipeline = MongoService.build_section_counts_pipeline(questions, target_field, token_attributes)
+        cells = knowledge_collection.aggregate(pipeline, allowDiskUse=True)
+        return MongoService.to_section_counts(cells, target_field, self.attribute_values)
+
+    def reset_section_schema(self):
+        # Read again with the next section, the knowledge base may have been migrated.
+        self.token_attributes = None
+        self.attribute_values = None
+
+    def get_metadata(self) -> dict:
+        metadata_collection = self.db[MongoService.__METADATA_COLLECTION_NAME]
+        return metadata_collection.find_one() or {}
+
+    def __get_token_attributes(self) -> frozenset:
+        if self.token_attributes is None:
+            token_attributes = MongoService.read_token_attributes(self.get_metadata())
+            if token_attributes:
+                knowledge_collection = self.db[MongoService.__KNOWLEDGE_COLLECTION_NAME]
+                MongoService.check_untokenized_items(knowledge_collection.count_documents(
+                    MongoService.UNTOKENIZED_QUERY))
+            self.token_attributes = token_attributes
+        return self.token_attributes
+
+    @staticmethod
+    def check_untokenized_items(count: int):
+        """
+        Fails the section queries of a migrated knowledge base where some items have no token arrays, until it is
+        migrated again, instead of leaving these items out of every section.
+        """
+
+        if count:
+            logger.error(f"[TokenSchema]: {count} knowledge items have no tokens.")
+            raise RuntimeError(f"{count} knowledge items were written after the token schema migration, "
+                               f"run migrate_knowledge_tokens.py again.")
+
+    @staticmethod
+    def read_token_attributes(metadata: dict) -> frozenset:
+        """
+        :return: the attributes of the token schema, empty if the knowledge base uses the plain schema.
+        """
+
+        if metadata.get('section_schema') != MongoService.TOKEN_SCHEMA:
+            return frozenset()
+        return frozenset(metadata.get('token_attributes', []))
+
+    @staticmethod
+    def to_token(attribute_name: str, value: str) -> str:
+        # Attribute names do not contain "=", so the token is unique for each pair.
+        return f"{attribute_name}={value}"
+
+    @staticmethod
+    def build_item_tokens(item: dict, attributes: list[str]) -> (list[str], list[str]):
+        """
+        Builds the token schema arrays of a knowledge item, matching the same answers as the plain schema query:
+        only string values can equal an answer, and an attribute stored as null is not missing.
+        :param attributes: question attributes of the knowledge base.
+        :return: tuple of (tokens, missing attributes)
+        """
+
+        tokens = [MongoService.to_token(attribute, item[attribute]) for attribute in attributes
+                  if isinstance(item.get(attribute), str)]
+        missing = [attribute for attribute in attributes if attribute not in item]
+        return tokens, missing
+
+    @staticmethod
+    def build_section_query(questions: list[Question], token_attributes: frozenset = frozenset()) -> (dict, dict):
+        """
+        Builds the query and the projection of the knowledge section left by the answered questions.
+        :param token_attributes: attributes of the token schema, empty for the plain schema.
+        :return: tuple of (query, projection)
+        """
+
+        if token_attributes:
+            return MongoService.__build_token_section_query(questions, token_attributes)
+
+        def create_attrib_condition(attr_name, attr_answer):
+            return [{attr_name: attr_answer}, {attr_name: {'$exists': False}}]
 
         # Create query based on questions.
         # There might be items that do not contain the attribute. We do not want to exclude those.
@@ -38,11 +137,115 @@ class MongoService:
         logger.info(f"Query the knowledge base: {query}")
         logger.info(f"Projecting by: {projection}")
 
-        return knowledge_collection.find(query, projection)
+        return query, projection
+
+    @staticmethod
+    def build_section_counts_pipeline(questions: list[Question], target_field: str,
+                                      token_attributes: frozenset = frozenset()) -> list[dict]:
+        """
+        Builds the aggregation of the section counts: the items matched by the section query are unwound into their
+        attribute/value pairs, then grouped by attribute, value and class. The pairs of the target field count the
+        classes. Only the counts are sent back, one document per (attribute, value, class) triple.
+        """
+
+        query, projection = MongoService.build_section_query(questions, token_attributes)
+        # Same attributes as the projected section, unknown (null) values do not take part in the split.
+        excluded = ['_id'] + list(projection)
+        return [
+            {'$match': query},
+            {'$project': {'_id': 0, 'c': f'${target_field}', 'p': {'$objectToArray': '$$ROOT'}}},
+            {'$unwind': '$p'},
+            {'$match': {'p.k': {'$nin': excluded}, 'p.v': {'$ne': None}}},
+            {'$group': {'_id': {'a': '$p.k', 'v': '$p.v', 'c': '$c'}, 'n': {'$sum': 1}}},
+        ]
+
+    @staticmethod
+    def to_section_counts(cells, target_field: str, attribute_values: dict[str, list]) -> SectionCounts:
+        return SectionCounts.from_cells(((cell['_id']['a'], cell['_id'].get('v'), cell['_id'].get('c'), cell['n'])
+                                         for cell in cells), target_field, attribute_values)
+
+    @staticmethod
+    def __build_token_section_query(questions: list[Question], token_attributes: frozenset) -> (dict, dict):
+        # Same section as the plain query: the item has the answered value, or does not have the attribute.
+        # Both sides of each condition are scans of a multikey index, instead of $exists conditions that are not.
+        # As with the plain query, answers of attributes that no item has do not filter anything.
+        attribute_condition_list = [
+            {'$or': [{MongoService.TOKENS_FIELD: MongoService.to_token(question.name, question.answer)},
+                     {MongoService.MISSING_FIELD: question.name}]}
+            for question in questions if question.answer and question.name in token_attributes]
+
+        query = {}
+        if len(attribute_condition_list) == 1:
+            query = attribute_condition_list[0]
+        elif attribute_condition_list:
+            query = {'$and': attribute_condition_list}
+
+        projection = {question.name: 0 for question in questions}
+        projection.update({MongoService.TOKENS_FIELD: 0, MongoService.MISSING_FIELD: 0})
+
+        logger.info(f"Query the knowledge base: {query}")
+        logger.info(f"Projecting by: {projection}")
+
+        return query, projection
+
+    def migrate_to_token_schema(self, batch_size: int = 1000) -> int:
+        """
+        Writes the token schema arrays of every knowledge item, builds their indexes, then marks the knowledge base
+        as migrated, so that sections are never queried by tokens that are not written yet.
+        Runs again after the knowledge items or the attributes change.
+        :return: number of migrated items.
+        """
+
+        knowledge_collection = self.db[MongoService.__KNOWLEDGE_COLLECTION_NAME]
+        target_field = self.get_target_field()
+
+        # Attributes present only on the items are questions as well.
+        attributes = [attribute for attribute in self.get_all_attribute_values()
+                      if attribute not in (target_field, '_id')]
+        known_attributes = set(attributes)
+        items = list(self.get_all_knowledge())
+        for item in items:
+            for attribute in item:
+                if attribute not in known_attributes and attribute not in (target_field, '_id'):
+                    known_attributes.add(attribute)
+                    attributes.append(attribute)
+
+        for start in range(0, len(items), batch_size):
+            updates = []
+            for item in items[start:start + batch_size]:
+                tokens, missing = MongoService.build_item_tokens(item, attributes)
+                update = {'$set': {MongoService.TOKENS_FIELD: tokens, MongoService.MISSING_FIELD: missing}}
+                updates.append(pymongo.UpdateOne({'_id': item['_id']}, update))
+            knowledge_collection.bulk_write(updates, ordered=False)
+            logger.info(f"Migrated {start + len(updates)}/{len(items)} knowledge items.")
+
+        knowledge_collection.create_index(MongoService.TOKENS_FIELD)
+        knowledge_collection.create_index(MongoService.MISSING_FIELD)
 
-    def get_target_field(self) -> str:
         metadata_collection = self.db[MongoService.__METADATA_COLLECTION_NAME]
-        return metadata_collection.find_one().get('target_column')
+        metadata_collection.update_one({}, {'$set': {'section_schema': MongoService.TOKEN_SCHEMA,
+                                                     'token_attributes': attributes}})
+        self.reset_section_schema()
+        return len(items)
+
+    def revert_token_schema(self):
+        """
+        Back to the plain schema: unmarks the knowledge base first, then removes the arrays and their indexes.
+        """
+
+        metadata_collection = self.db[MongoService.__METADATA_COLLECTION_NAME]
+        metadata_collection.update_one({}, {'$unset': {'section_schema': '', 'token_attributes': ''}})
+        self.reset_section_schema()
+
+        knowledge_collection = self.db[MongoService.__KNOWLEDGE_COLLECTION_NAME]
+        knowledge_collection.update_many({}, {'$unset': {MongoService.TOKENS_FIELD: '',
+                                                         MongoService.MISSING_FIELD: ''}})
+        for index_name in (f"{MongoService.TOKENS_FIELD}_1", f"{MongoService.MISSING_FIELD}_1"):
+            if index_name in knowledge_collection.index_information():
+                knowledge_collection.drop_index(index_name)
+
+    def get_target_field(self) -> str:
+        return self.get_metadata().get('target_column')
 
     def get_attribute_values(self, attribute_name: str) -> list[str]:
         attribute_collection = self.db[MongoService.__ATTRIBUTE_COLLECTION_NAME]
@@ -50,6 +253,19 @@ class MongoService:
         projection = {'_id': 0}
         return attribute_collection.find_one(query, projection)['values']
 
+    def get_all_knowledge(self):
+        knowledge_collection = self.db[MongoService.__KNOWLEDGE_COLLECTION_NAME]
+        # The token schema arrays are not attributes.
+        return knowledge_collection.find({}, {MongoService.TOKENS_FIELD: 0, MongoService.MISSING_FIELD: 0})
+
+    def get_all_attribute_values(self) -> dict[str, list[str]]:
+        attribute_collection = self.db[MongoService.__ATTRIBUTE_COLLECTION_NAME]
+        return {attribute['_id']: attribute.get('values', []) for attribute in attribute_collection.find({})}
+
+    def get_all_questions(self) -> list[dict]:
+        attribute_collection = self.db[MongoService.__ATTRIBUTE_COLLECTION_NAME]
+        return list(attribute_collection.find({}))
+
     def get_question(self, question):
         attribute_collection = self.db[MongoService.__ATTRIBUTE_COLLECTION_NAME]
         query = {'_id': question}
@@ -1,21 +1,281 @@
 import abc
+import itertools
+import json
 import math
+from collections import Counter
 
 import pandas as pd
 from mrjob.job import MRJob
 from mrjob.step import MRStep
+from pandas import DataFrame
+
+
+# Value id of a missing value, as given by pd.factorize.
+MISSING_VALUE_ID = -1
+
+# Value id of an answer that no item holds, in the --answers filter: only the items missing the attribute match it.
+ABSENT_VALUE_ID = -2
+
+# Value id of an attribute held with a null value (shard rows): counted as missing, but no answer matches it,
+# as in the knowledge base query.
+NULL_VALUE_ID = -3
+
+# Value ids that are not counted.
+NO_VALUE_IDS = (MISSING_VALUE_ID, NULL_VALUE_ID)
+
+# Gain ratios closer than this are considered equal.
+RATIO_TOLERANCE = 1e-9
+
+
+def select_best_ratio(attribute_ratios: list[tuple[int, float]]) -> tuple[int | None, float]:
+    """
+    Best (attribute id, gain ratio), with the rule of GainRatioQuestionStrategy.select_best: ratios are often equal
+    up to rounding, so the first attribute within RATIO_TOLERANCE of the best positive ratio wins.
+    Without a positive ratio, the last attribute is kept, (None, 0.0) if there is none.
+    """
+
+    if not attribute_ratios:
+        return None, 0.0
+    best_ratio = max(ratio for __, ratio in attribute_ratios)
+    if best_ratio <= 0.0:
+        return attribute_ratios[-1]
+    return min((attribute_id, ratio) for attribute_id, ratio in attribute_ratios
+               if ratio >= best_ratio - RATIO_TOLERANCE)
 
 
 class IQuestionMapReducer(MRJob, metaclass=abc.ABCMeta):
+    """
+    Base of the question finder jobs. Keys carry integer ids instead of names: the attribute id is the position of
+    the attribute in the --attributes list (or among the non target columns), value and target ids are given
+    by pd.factorize per column. Only the final reducer decodes the id of the best attribute into its name.
+
+    Two input modes are supported:
+    - columns (default): the input is a csv file, read at once, and a mapper record holds a whole attribute,
+      so the counting mappers combine their counts before emitting them.
+    - rows: the input is the encoded section (see encode_dataframe), one row per line, without header.
+      Mappers read it line by line and emit the records of each chunk of --chunk-rows rows, so the input can be
+      split between mappers and a mapper never holds more than a chunk. Combiners merge the chunk counts.
+      With --answers, the mappers keep only the rows where every answered attribute equals the answer or is missing,
+      and leave the answered attributes out, the same section as the knowledge base query would return.
+    """
+
+    COLUMNS_INPUT = "columns"
+    ROWS_INPUT = "rows"
+
     def configure_args(self):
         super(IQuestionMapReducer, self).configure_args()
         self.add_passthru_arg("-t", "--target", help="Define the target column for the question extraction.")
+        self.add_passthru_arg("--attributes", help="JSON list of the attribute names, used to decode the result.")
+        self.add_passthru_arg("--input-mode", default=IQuestionMapReducer.COLUMNS_INPUT,
+                              choices=[IQuestionMapReducer.COLUMNS_INPUT, IQuestionMapReducer.ROWS_INPUT],
+                              help="Read the input as a csv file, or as encoded rows streamed in chunks.")
+        self.add_passthru_arg("--chunk-rows", type=int, default=1000,
+                              help="Number of rows counted together in the rows input mode.")
+        self.add_passthru_arg("--answers", default=None,
+                              help="JSON list of [attribute id, value id] answers filtering the rows input, "
+                                   "value id null for an unknown answer.")
+
+    @staticmethod
+    def encode_dataframe(data: DataFrame, target: str, attributes: list[str]) -> DataFrame:
+        """
+        Input of the rows mode: the target id followed by the value id of every attribute, MISSING_VALUE_ID if missing.
+        """
+
+        columns = {target: pd.factorize(data[target], use_na_sentinel=False)[0]}
+        for attribute in attributes:
+            columns[attribute] = pd.factorize(data[attribute], use_na_sentinel=True)[0]
+        return DataFrame(columns)
+
+    def read_step(self, **kwargs) -> MRStep:
+        """
+        First step of the job, reading the input in the selected mode.
+        """
+
+        if self.is_rows_input():
+            return MRStep(mapper_init=self.mapper_init_rows, mapper=self.mapper_rows,
+                          mapper_final=self.mapper_final_rows, **kwargs)
+        return MRStep(mapper_raw=self.read_csv_data_mapper_raw, **kwargs)
 
     def read_csv_data_mapper_raw(self, input_path, input_uri):
         data = pd.read_csv(input_path)
-        for column in data.columns:
-            if column != self.options.target:
-                yield column, list(zip(list(data[column].values), list(data[self.options.target].values)))
+        yield from self.prepare_records(self.encode_columns(data))
+
+    def read_dataframe_mapper(self, data: DataFrame):
+        """
+        Same records as the read step, read from a dataframe already in memory.
+        """
+
+        if self.is_rows_input():
+            rows = self.encode_dataframe(data, self.options.target, self.get_attributes(data)).values.tolist()
+            for start in range(0, len(rows), self.options.chunk_rows):
+                yield from self.prepare_records(self.encode_chunk(rows[start:start + self.options.chunk_rows]))
+        else:
+            yield from self.prepare_records(self.encode_columns(data))
+
+    def mapper_init_rows(self):
+        self.chunk = []
+        # Row positions of the answered attributes, the row starting with the target id.
+        self.row_filters = [(attribute_id + 1, value_id) for attribute_id, value_id in self.get_answers()
+                            if value_id is not None]
+
+    def mapper_rows(self, __, line):
+        fields = line.split(",")
+        # Equal to the answer or missing (not null), as in the knowledge base query. Only the rows kept are parsed.
+        for position, value_id in self.row_filters:
+            field_value_id = int(fields[position])
+            if field_value_id != value_id and field_value_id != MISSING_VALUE_ID:
+                return
+        self.chunk.append(list(map(int, fields)))
+        if len(self.chunk) >= self.options.chunk_rows:
+            yield from self.prepare_records(self.encode_chunk(self.chunk))
+            self.chunk = []
+
+    def mapper_final_rows(self):
+        if self.chunk:
+            yield from self.prepare_records(self.encode_chunk(self.chunk))
+            self.chunk = []
+
+    def prepare_records(self, records):
+        """
+        Hook applied to the records of the read step, (attribute id, [(value id, target id)]).
+        """
+
+        return records
+
+    def encode_columns(self, data: DataFrame):
+        """
+        Yields one record per attribute: (attribute id, [(value id, target id)]).
+        """
+
+        target_ids, __ = pd.factorize(data[self.options.target], use_na_sentinel=False)
+        target_ids = target_ids.tolist()
+        for attribute_id, column in enumerate(self.get_attributes(data)):
+            value_ids, __ = pd.factorize(data[column], use_na_sentinel=True)
+            yield attribute_id, list(zip(value_ids.tolist(), target_ids))
+
+    def encode_chunk(self, rows: list[list[int]]):
+        """
+        Yields one record per attribute of a chunk of encoded rows: (attribute id, [(value id, target id)]).
+        The answered attributes are left out.
+        """
+
+        answered_attributes = {attribute_id for attribute_id, __ in self.get_answers()}
+        target_ids = [row[0] for row in rows]
+        for attribute_id in range(len(rows[0]) - 1):
+            if attribute_id in answered_attributes:
+                continue
+            yield attribute_id, list(zip([row[attribute_id + 1] for row in rows], target_ids))
+
+    def is_rows_input(self) -> bool:
+        return self.options.input_mode == IQuestionMapReducer.ROWS_INPUT
+
+    def is_filtered(self) -> bool:
+        return self.options.answers is not None
+
+    def get_answers(self) -> list[list[int | None]]:
+        return json.loads(self.options.answers) if self.options.answers else []
+
+    def combiner_count(self, key, count):
+        # Chunks of the same map task repeat the keys, their counts are merged before the shuffle.
+        yield key, sum(count)
+
+    def get_attributes(self, data: DataFrame | None = None) -> list[str] | None:
+        if self.options.attributes:
+            return json.loads(self.options.attributes)
+        if data is not None:
+            return [column for column in data.columns if column != self.options.target]
+        return None
+
+    def decode_attribute(self, attribute_id: int | None) -> str | int | None:
+        attributes = self.get_attributes()
+        if attribute_id is None or attributes is None:
+            return attribute_id
+        return attributes[attribute_id]
+
+    def run_in_memory(self, data: DataFrame, stats: dict | None = None) -> list[tuple]:
+        """
+        Runs the steps of the job on a dataframe, without the input file and the runner.
+        The first step (reading the csv) is replaced by read_dataframe_mapper. As in the local runner,
+        the reducer input is sorted by the JSON encoded key, keeping the mapper order for equal keys,
+        so the result is the same as the one of runner.cat_output().
+        :param stats: if provided, receives the number of records and JSON bytes shuffled to the reducers.
+        :return: list of (key, value) pairs written by the last step.
+        """
+
+        if stats is not None:
+            stats.update(shuffle_records=0, shuffle_bytes=0)
+
+        first_step, *next_steps = self.steps()
+        records = self.__run_step_in_memory(first_step, list(self.read_dataframe_mapper(data)), stats,
+                                            read_step=True)
+        for step in next_steps:
+            records = self.__run_step_in_memory(step, records, stats)
+        return list(records)
+
+    def run_rows_files_in_memory(self, paths: list[str], stats: dict | None = None) -> list[tuple]:
+        """
+        Same as run_in_memory for a job of the rows input mode, on encoded rows files instead of a dataframe.
+        As in the runner, every file is read by its own map task, whose records go through the combiner.
+        :return: list of (key, value) pairs written by the last step.
+        """
+
+        if stats is not None:
+            stats.update(shuffle_records=0, shuffle_bytes=0)
+
+        first_step, *next_steps = self.steps()
+        records = []
+        for path in paths:
+            with open(path, "r") as rows_file:
+                records += self.__map_in_memory(first_step, [(None, line.rstrip("\n")) for line in rows_file])
+        records = self.__reduce_in_memory(first_step, records, stats)
+        for step in next_steps:
+            records = self.__run_step_in_memory(step, records, stats)
+        return list(records)
+
+    def __run_step_in_memory(self, step: MRStep, records, stats: dict | None, read_step: bool = False):
+        # The mapper of the read step is replaced by read_dataframe_mapper.
+        records = self.__map_in_memory(step, records, read_step)
+        return self.__reduce_in_memory(step, records, stats)
+
+    def __map_in_memory(self, step: MRStep, records, read_step: bool = False):
+        if not read_step:
+            records = self.__run_tasks_in_memory(step['mapper_init'], step['mapper'], step['mapper_final'],
+                                                 records)
+        if step['combiner']:
+            records = self.__run_tasks_in_memory(step['combiner_init'], step['combiner'],
+                                                 step['combiner_final'], self.__group_by_key(records))
+        return records
+
+    def __reduce_in_memory(self, step: MRStep, records, stats: dict | None):
+        if step['reducer'] and stats is not None:
+            # One "key<TAB>value<NEWLINE>" line per record, as written by the runner.
+            stats["shuffle_records"] += len(records)
+            stats["shuffle_bytes"] += sum(len(json.dumps(key)) + len(json.dumps(value)) + 2 for key, value in records)
+        if step['reducer']:
+            records = self.__run_tasks_in_memory(step['reducer_init'], step['reducer'],
+                                                 step['reducer_final'], self.__group_by_key(records))
+        return records
+
+    @staticmethod
+    def __run_tasks_in_memory(task_init, task, task_final, records):
+        def run():
+            if task_init:
+                yield from task_init() or ()
+            for key, value in records:
+                yield from task(key, value) or ()
+            if task_final:
+                yield from task_final() or ()
+
+        # The records are materialized between the tasks, the same as the files between the runner tasks.
+        return list(run())
+
+    @staticmethod
+    def __group_by_key(records):
+        encoded_keys = [json.dumps(key) for key, __ in records]
+        order = sorted(range(len(records)), key=encoded_keys.__getitem__)
+        for __, group in itertools.groupby(order, key=encoded_keys.__getitem__):
+            group = list(group)
+            yield records[group[0]][0], (records[index][1] for index in group)
 
 
 class InfoGainMapReducer(IQuestionMapReducer):
@@ -23,10 +283,13 @@ class InfoGainMapReducer(IQuestionMapReducer):
         super(InfoGainMapReducer, self).configure_args()
 
     def mapper_split_count(self, attribute_name, list_of_tuple_value_target):
+        # Counted in the mapper, one record per distinct key.
+        counts = Counter()
         for value, target_value in list_of_tuple_value_target:
-            if value == value:
-                yield (attribute_name, value, target_value), 1
-                yield (attribute_name, target_value), 1
+            if value not in NO_VALUE_IDS:
+                counts[(attribute_name, value, target_value)] += 1
+                counts[(attribute_name, target_value)] += 1
+        yield from counts.items()
 
     def reducer_count(self, tuple_attr_type_val, count):
         yield tuple_attr_type_val, sum(count)
@@ -54,7 +317,7 @@ class InfoGainMapReducer(IQuestionMapReducer):
 
     def mapper_gain_per_attribute(self, tuple_name_val, prop):
         # Branch for per value entropy.
-        if len(tuple_name_val) == 2:
+        if isinstance(tuple_name_val, (list, tuple)):
             attribute_name, attribute_value = tuple_name_val
             prop["is_total"] = False
             yield attribute_name, prop
@@ -97,16 +360,17 @@ class InfoGainMapReducer(IQuestionMapReducer):
                 best_gain = info_gain
                 best_attrib = attribute_name
 
-        yield best_attrib, best_gain
+        yield self.decode_attribute(best_attrib), best_gain
 
     def steps(self):
         return [
-            # Step 1: Read the data as a csv, returns:
-            # {key: column_name, value: ([str] as attr_values, [str] as target_values)
-            MRStep(mapper_raw=self.read_csv_data_mapper_raw),
+            # Step 1: Read the data, one record per attribute (per chunk of rows in the rows mode):
+            # {key: attribute id, value: [(value id, target id)]}
+            self.read_step(),
 
             # Step 2: Count all, count per attribute, count per attribute and value.
             MRStep(mapper=self.mapper_split_count,
+                   combiner=self.combiner_count if self.is_rows_input() else None,
                    reducer=self.reducer_count),
 
             # Step 3: Calculate entropy per attribute per attribute value.
@@ -128,9 +392,12 @@ class GiniMapReducer(IQuestionMapReducer):
         super(GiniMapReducer, self).configure_args()
 
     def mapper_split_count(self, attribute_name, list_of_tuple_value_target):
+        # Counted in the mapper, one record per distinct key.
+        counts = Counter()
         for value, target_value in list_of_tuple_value_target:
-            if value == value:
-                yield (attribute_name, value, target_value), 1
+            if value not in NO_VALUE_IDS:
+                counts[(attribute_name, value, target_value)] += 1
+        yield from counts.items()
 
     def reducer_count(self, tuple_attr_type_val, count):
         yield tuple_attr_type_val, sum(count)
@@ -183,16 +450,17 @@ class GiniMapReducer(IQuestionMapReducer):
                 best_gini = gini
                 best_attrib = attribute_name
 
-        yield best_attrib, best_gini
+        yield self.decode_attribute(best_attrib), best_gini
 
     def steps(self):
         return [
-            # Step 1: Read the data as a csv, returns:
-            # {key: column_name, value: ([str] as attr_values, [str] as target_values)
-            MRStep(mapper_raw=self.read_csv_data_mapper_raw),
+            # Step 1: Read the data, one record per attribute (per chunk of rows in the rows mode):
+            # {key: attribute id, value: [(value id, target id)]}
+            self.read_step(),
 
             # Step 2: Count all, count per attribute, count per attribute and value.
             MRStep(mapper=self.mapper_split_count,
+                   combiner=self.combiner_count if self.is_rows_input() else None,
                    reducer=self.reducer_count),
 
             # # Step 3: Calculate gini impurity per attribute per attribute value.
@@ -215,10 +483,13 @@ class GainRatioMapReducer(IQuestionMapReducer):
         super(GainRatioMapReducer, self).configure_args()
 
     def mapper_split_count(self, attribute_name, list_of_tuple_value_target):
+        # Counted in the mapper, one record per distinct key.
+        counts = Counter()
         for value, target_value in list_of_tuple_value_target:
-            if value == value:
-                yield (attribute_name, value, target_value), 1
-                yield (attribute_name, target_value), 1
+            if value not in NO_VALUE_IDS:
+                counts[(attribute_name, value, target_value)] += 1
+                counts[(attribute_name, target_value)] += 1
+        yield from counts.items()
 
     def reducer_count(self, tuple_attr_type_val, count):
         yield tuple_attr_type_val, sum(count)
@@ -246,7 +517,7 @@ class GainRatioMapReducer(IQuestionMapReducer):
 
     def mapper_gain_ratio_per_attribute(self, tuple_name_val, prop):
         # Branch for per value entropy.
-        if len(tuple_name_val) == 2:
+        if isinstance(tuple_name_val, (list, tuple)):
             attribute_name, attribute_value = tuple_name_val
             prop["is_total"] = False
             yield attribute_name, prop
@@ -287,23 +558,18 @@ class GainRatioMapReducer(IQuestionMapReducer):
         yield None, (attribute_name, info_gain)
 
     def reducer_result(self, __, tuple_attr_gain):
-        best_gain = 0.0
-        best_attrib = None
-        for attribute_name, info_gain in tuple_attr_gain:
-            if info_gain >= best_gain:
-                best_gain = info_gain
-                best_attrib = attribute_name
-
-        yield best_attrib, best_gain
+        best_attrib, best_gain = select_best_ratio([tuple(attr_gain) for attr_gain in tuple_attr_gain])
+        yield self.decode_attribute(best_attrib), best_gain
 
     def steps(self):
         return [
-            # Step 1: Read the data as a csv, returns:
-            # {key: column_name, value: ([str] as attr_values, [str] as target_values)
-            MRStep(mapper_raw=self.read_csv_data_mapper_raw),
+            # Step 1: Read the data, one record per attribute (per chunk of rows in the rows mode):
+            # {key: attribute id, value: [(value id, target id)]}
+            self.read_step(),
 
             # Step 2: Count all, count per attribute, count per attribute and value.
             MRStep(mapper=self.mapper_split_count,
+                   combiner=self.combiner_count if self.is_rows_input() else None,
                    reducer=self.reducer_count),
 
             # Step 3: Calculate entropy per attribute per attribute value.
@@ -317,4 +583,130 @@ class GainRatioMapReducer(IQuestionMapReducer):
             # Step 5: Get the best attribute.
             MRStep(mapper=self.mapper_all,
                    reducer=self.reducer_result),
-        ]
\ No newline at end of file
+        ]
+
+class CriteriaMapReducer(IQuestionMapReducer):
+    """
+    Scores every attribute with the three criteria in one run.
+    Step 1 builds the (value, class) counts of each attribute and evaluates information gain, gain ratio and
+    weighted gini impurity from them; step 2 selects the best attribute per criterion, with the same rules as
+    InfoGainMapReducer, GainRatioMapReducer and GiniMapReducer.
+    With --answers, the section is only known to the job, so the result also holds its class counts (ROWS key)
+    and the value ids of the selected attributes (VALUES key).
+    """
+
+    INFORMATION_GAIN = "information_gain"
+    GAIN_RATIO = "gain_ratio"
+    GINI_IMPURITY = "gini_impurity"
+    ROWS = "rows"
+    VALUES = "values"
+
+    def configure_args(self):
+        super(CriteriaMapReducer, self).configure_args()
+
+    def prepare_records(self, records):
+        # (attribute id, [(value id, target id)]) -> (attribute id, [(value id, target id, count)])
+        for attribute_id, list_of_tuple_value_target in records:
+            counts = Counter(pair for pair in list_of_tuple_value_target if pair[0] not in NO_VALUE_IDS)
+            if counts:
+                yield attribute_id, [(value, target_value, count) for (value, target_value), count in counts.items()]
+
+    def encode_chunk(self, rows: list[list[int]]):
+        yield from super(CriteriaMapReducer, self).encode_chunk(rows)
+        if self.is_filtered():
+            # Counted as an attribute with a single value, so the classes of the rows left go through the same steps.
+            yield CriteriaMapReducer.ROWS, [(0, row[0]) for row in rows]
+
+    @staticmethod
+    def merge_counts(list_of_counts) -> Counter:
+        value_target_counts = Counter()
+        for counts in list_of_counts:
+            for value, target_value, count in counts:
+                value_target_counts[(value, target_value)] += count
+        return value_target_counts
+
+    def combiner_merge_counts(self, attribute_id, list_of_counts):
+        value_target_counts = self.merge_counts(list_of_counts)
+        yield attribute_id, [(value, target_value, count) for (value, target_value), count in
+                             value_target_counts.items()]
+
+    def reducer_criteria_per_attribute(self, attribute_id, list_of_counts):
+        # Merge the counts of the attribute, the input may be split in several records.
+        value_target_counts = self.merge_counts(list_of_counts)
+
+        value_counts = {}
+        target_counts = Counter()
+        for (value, target_value), count in value_target_counts.items():
+            value_counts.setdefault(value, []).append(count)
+            target_counts[target_value] += count
+        total_count = sum(target_counts.values())
+
+        if attribute_id == CriteriaMapReducer.ROWS:
+            yield attribute_id, {"count": total_count, "classes": sorted(target_counts.items())}
+            return
+
+        def entropy(counts: list[int], total: int) -> float:
+            return -sum(count / total * math.log2(count / total) for count in counts)
+
+        weighted_entropy = 0.0
+        split_info = 0.0
+        weighted_gini = 0.0
+        for counts in value_counts.values():
+            value_total = sum(counts)
+            weight = value_total / total_count
+            weighted_entropy += weight * entropy(counts, value_total)
+            split_info -= weight * math.log2(weight)
+            weighted_gini += weight * (1 - sum((count / value_total) ** 2 for count in counts))
+
+        information_gain = entropy(list(target_counts.values()), total_count) - weighted_entropy
+        gain_ratio = information_gain / split_info if split_info != 0.0 else 0.0
+
+        scores = {CriteriaMapReducer.INFORMATION_GAIN: information_gain,
+                  CriteriaMapReducer.GAIN_RATIO: gain_ratio,
+                  CriteriaMapReducer.GINI_IMPURITY: weighted_gini}
+        if self.is_filtered():
+            scores[CriteriaMapReducer.VALUES] = sorted(value_counts)
+        yield attribute_id, scores
+
+    def mapper_all(self, attribute_id, scores):
+        yield None, (attribute_id, scores)
+
+    def reducer_result(self, __, tuple_attr_scores):
+        # Highest gain, lowest gini; the last attribute wins the ties, as in the single jobs.
+        # The gain ratio is selected with select_best_ratio, as in GainRatioMapReducer.
+        best = {CriteriaMapReducer.INFORMATION_GAIN: (None, 0.0),
+                CriteriaMapReducer.GINI_IMPURITY: (None, 1.0)}
+        ratios = []
+        values = {}
+        summary = None
+        for attribute_id, scores in tuple_attr_scores:
+            if attribute_id == CriteriaMapReducer.ROWS:
+                summary = scores
+                continue
+            values[attribute_id] = scores.get(CriteriaMapReducer.VALUES)
+            if scores[CriteriaMapReducer.INFORMATION_GAIN] >= best[CriteriaMapReducer.INFORMATION_GAIN][1]:
+                best[CriteriaMapReducer.INFORMATION_GAIN] = (attribute_id, scores[CriteriaMapReducer.INFORMATION_GAIN])
+            ratios.append((attribute_id, scores[CriteriaMapReducer.GAIN_RATIO]))
+            if scores[CriteriaMapReducer.GINI_IMPURITY] <= best[CriteriaMapReducer.GINI_IMPURITY][1]:
+                best[CriteriaMapReducer.GINI_IMPURITY] = (attribute_id, scores[CriteriaMapReducer.GINI_IMPURITY])
+        best[CriteriaMapReducer.GAIN_RATIO] = select_best_ratio(ratios)
+
+        for criterion, (attribute_id, score) in best.items():
+            yield criterion, (self.decode_attribute(attribute_id), score)
+
+        if self.is_filtered():
+            yield CriteriaMapReducer.VALUES, {self.decode_attribute(attribute_id): values[attribute_id]
+                                              for attribute_id, __ in best.values() if attribute_id is not None}
+            yield CriteriaMapReducer.ROWS, summary
+
+    def steps(self):
+        return [
+            # Step 1: Read the data and count it, then score each attribute:
+            # {key: attribute id, value: [(value id, target id, count)]} -> {key: attribute id, value: scores}
+            self.read_step(combiner=self.combiner_merge_counts if self.is_rows_input() else None,
+                           reducer=self.reducer_criteria_per_attribute),
+
+            # Step 2: Get the best attribute per criterion.
+            MRStep(mapper=self.mapper_all,
+                   reducer=self.reducer_result),
+        ]
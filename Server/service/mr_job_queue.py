@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable
+
+import fastapi
+
+from model.dto.guess_model import GuessJob, GuessOutput, Question
+from service.find_question_service import FindQuestionService
+from service.knowledge_shards import KnowledgeShards
+from service.strategy.kernels import EncodedSection
+from service.strategy.parallel_scoring import DEFAULT_START_METHOD
+from service.strategy.strategies import FindStrategy
+
+logger = logging.getLogger(__name__)
+
+NO_ITEM_DETAIL = "No character was found based on the provided answers!"
+
+
+class QueuedJob:
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, job_id: str, key: tuple, future: Future):
+        self.job_id = job_id
+        self.key = key
+        self.future = future
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.result = None
+        self.detail = None
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return QueuedJob.FAILED if self.result is None else QueuedJob.DONE
+        # A done future is still running until its result is recorded.
+        return QueuedJob.RUNNING if self.future.running() or self.future.done() else QueuedJob.QUEUED
+
+    def to_output(self) -> GuessJob:
+        return GuessJob(job_id=self.job_id, status=self.status, result=self.result, detail=self.detail)
+
+
+class MRJobQueue:
+    """
+    Bounded queue of MR strategy requests, run on a pool of persistent worker processes.
+    Each worker keeps its own FindQuestionService, built once when the process starts, so a job only pays for
+    its mrjob run. A request submitted again while the first one is still queued or running gets the same job.
+    Finished jobs are kept result_ttl_seconds for polling.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 64, result_ttl_seconds: float = 300.0,
+                 mr_in_memory: bool = False, mr_fused: bool = False, mr_chunk_rows: int | None = None,
+                 start_method: str = DEFAULT_START_METHOD):
+        """
+        :param start_method: multiprocessing start method of the workers, forkserver or spawn by default,
+        the server process already runs threads when the queue is created.
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl_seconds = result_ttl_seconds
+        self.jobs = {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        # Seconds between the submission and the start of the most recent jobs.
+        self.wait_times = deque(maxlen=1024)
+
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method),
+                                            initializer=_init_worker,
+                                            initargs=(mr_in_memory, mr_fused, mr_chunk_rows))
+        # One task per worker starts all the processes now, instead of on the first requests.
+        for __ in range(workers):
+            self.executor.submit(_warm_up)
+
+    def get_in_flight(self, key: tuple) -> QueuedJob | None:
+        """
+        The unfinished job of the key, if any. Lets the caller skip building the section of a duplicate request.
+        """
+
+        with self.lock:
+            job_id = self.in_flight.get(key)
+            if job_id is None:
+                return None
+            self.deduplicated += 1
+            return self.jobs[job_id]
+
+    def submit(self, key: tuple, section: list[dict] | EncodedSection | None, target_field: str,
+               strategy: FindStrategy, shards: KnowledgeShards | None = None, questions: list[Question] = None,
+               on_result: Callable[[GuessOutput], None] | None = None) -> QueuedJob:
+        """
+        Queues find_best_question on the section, or find_best_question_in_shards on the shards and questions.
+        :param key: identifies the section, a request with the key of an unfinished job gets that job.
+        :param on_result: called with the result of a successful job, in the thread of the pool.
+        """
+
+        with self.lock:
+            self.__remove_expired()
+            job_id = self.in_flight.get(key)
+            if job_id is not None:
+                self.deduplicated += 1
+                return self.jobs[job_id]
+
+            if len(self.in_flight) >= self.max_pending:
+                self.rejected += 1
+                raise fastapi.HTTPException(status_code=503, detail="Too many pending jobs, try again later!")
+
+            future = self.executor.submit(_find_best_question, section, target_field, strategy, shards, questions)
+            job = QueuedJob(uuid.uuid4().hex, key, future)
+            self.jobs[job.job_id] = job
+            self.in_flight[key] = job.job_id
+            self.submitted += 1
+
+        future.add_done_callback(lambda done: self.__finish(job, done, on_result))
+        return job
+
+    def get(self, job_id: str) -> QueuedJob | None:
+        with self.lock:
+            self.__remove_expired()
+            return self.jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> QueuedJob | None:
+        """
+        Long poll: returns the job once finished, or after timeout seconds.
+        """
+
+        job = self.get(job_id)
+        if job is None or job.finished_at is not None or timeout <= 0:
+            return job
+
+        finished = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        job.future.add_done_callback(lambda __: loop.call_soon_threadsafe(finished.set))
+        try:
+            await asyncio.wait_for(finished.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    def stats(self) -> dict:
+        with self.lock:
+            self.__remove_expired()
+            in_flight = len(self.in_flight)
+            wait_times = sorted(self.wait_times)
+            return {
+                "workers": self.workers,
+                "queue_depth": max(0, in_flight - self.workers),
+                "in_flight": in_flight,
+                "max_pending": self.max_pending,
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "wait_seconds_avg": sum(wait_times) / len(wait_times) if wait_times else 0.0,
+                "wait_seconds_p95": wait_times[int(0.95 * (len(wait_times) - 1))] if wait_times else 0.0,
+                "wait_seconds_max": wait_times[-1] if wait_times else 0.0,
+            }
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def __finish(self, job: QueuedJob, future: Future, on_result: Callable[[GuessOutput], None] | None):
+        started_at = None
+        try:
+            started_at, job.result = future.result()
+            if job.result is None:
+                job.detail = NO_ITEM_DETAIL
+        except Exception as exception:
+            logger.exception(f"[MRJobQueue][Failed]: {job.key}")
+            job.detail = getattr(exception, "detail", None) or str(exception)
+
+        with self.lock:
+            job.finished_at = time.time()
+            self.in_flight.pop(job.key, None)
+            if job.result is None:
+                self.failed += 1
+            else:
+                self.completed += 1
+            if started_at is not None:
+                self.wait_times.append(max(0.0, started_at - job.submitted_at))
+
+        if job.result is not None and on_result is not None:
+            on_result(job.result)
+
+    def __remove_expired(self):
+        expired_before = time.time() - self.result_ttl_seconds
+        expired_ids = [job_id for job_id, job in self.jobs.items()
+                       if job.finished_at is not None and job.finished_at < expired_before]
+        for job_id in expired_ids:
+            del self.jobs[job_id]
+
+
+# Worker process state, built by the pool initializer.
+_worker_service = None
+
+
+def _init_worker(mr_in_memory: bool, mr_fused: bool, mr_chunk_rows: int | None):
+    global _worker_service
+    _worker_service = FindQuestionService(mr_in_memory=mr_in_memory, mr_fused=mr_fused, mr_chunk_rows=mr_chunk_rows)
+
+
+def _warm_up():
+    time.sleep(0.1)
+
+
+def _find_best_question(section: list[dict] | EncodedSection | None, target_field: str, strategy: FindStrategy,
+                        shards: KnowledgeShards | None, questions: list[Question] | None) -> (float, GuessOutput):
+    started_at = time.time()
+    if shards is not None:
+        return started_at, _worker_service.find_best_question_in_shards(shards, questions, strategy)
+    return started_at, _worker_service.find_best_question(section, target_field, strategy)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+from model.dto.guess_model import GuessOutput, Question
+from service.find_question_service import FindQuestionService
+from service.knowledge_snapshot import KnowledgeSnapshot
+from service.strategy.strategies import FindStrategy
+
+logger = logging.getLogger(__name__)
+
+# Child key of the branch taken when a question is answered as unknown.
+UNKNOWN_ANSWER = "?"
+
+
+class OpeningBook:
+    """
+    Precompiled question tree of a knowledge base version and strategy.
+    A node is either {"guess": str} or {"question": str, "values": [str], "children": {answer: node}}.
+    Nodes at the compiled depth, or on branches left out at compile time, have no children for the answer.
+    """
+
+    def __init__(self, knowledge_base: str, version: str, strategy: FindStrategy, max_depth: int, root: dict):
+        self.knowledge_base = knowledge_base
+        self.version = version
+        self.strategy = strategy
+        self.max_depth = max_depth
+        self.root = root
+
+    @staticmethod
+    def file_name(knowledge_base: str, strategy: FindStrategy, version: str) -> str:
+        return f"{knowledge_base}_{strategy.name.lower()}_{version}.json"
+
+    def lookup(self, questions: list[Question]) -> GuessOutput | None:
+        """
+        Follows the answered questions down the tree. Returns None when the path leaves the compiled tree.
+        """
+
+        node = self.root
+        for question in questions:
+            if node.get("question") != question.name:
+                return None
+            node = node.get("children", {}).get(question.answer or UNKNOWN_ANSWER)
+            if node is None:
+                return None
+
+        result = GuessOutput()
+        if "guess" in node:
+            result.guess = node["guess"]
+        else:
+            result.question = node["question"]
+            result.values = list(node["values"])
+        return result
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.file_name(self.knowledge_base, self.strategy, self.version))
+        with open(path, "w") as book_file:
+            json.dump({"knowledge_base": self.knowledge_base, "version": self.version,
+                       "strategy": self.strategy.name, "max_depth": self.max_depth, "root": self.root}, book_file)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> OpeningBook:
+        with open(path, "r") as book_file:
+            content = json.load(book_file)
+        return cls(content["knowledge_base"], content["version"], FindStrategy[content["strategy"]],
+                   content["max_depth"], content["root"])
+
+    @classmethod
+    def load_all(cls, directory: str, knowledge_base: str, version: str) -> dict[FindStrategy, OpeningBook]:
+        """
+        Loads the books compiled for this version of the knowledge base, one per strategy.
+        """
+
+        books = {}
+        if not os.path.isdir(directory):
+            return books
+
+        for strategy in FindStrategy:
+            path = os.path.join(directory, cls.file_name(knowledge_base, strategy, version))
+            if os.path.exists(path):
+                books[strategy] = cls.load(path)
+                logger.info(f"[OpeningBook]: loaded {path}")
+        return books
+
+
+class OpeningBookCompiler:
+    """
+    Builds an opening book by running the online engine (snapshot filtering and FindQuestionService)
+    on every answer path, down to max_depth questions.
+    """
+
+    def __init__(self, snapshot: KnowledgeSnapshot, knowledge_base: str,
+                 create_find_question_service: Callable[[], FindQuestionService] = FindQuestionService,
+                 include_unknown: bool = True):
+        """
+        :param create_find_question_service: builds the FindQuestionService of the compiler and of each of its
+        worker processes, with the settings of the server. Sent to the workers, so it must be picklable.
+        """
+        self.snapshot = snapshot
+        self.knowledge_base = knowledge_base
+        self.create_find_question_service = create_find_question_service
+        self.find_question_service = create_find_question_service()
+        self.include_unknown = include_unknown
+
+    def compile(self, strategy: FindStrategy, max_depth: int, workers: int = 1, split_depth: int = 2) -> OpeningBook:
+        """
+        Compiles the tree. With more than one worker, the subtrees below split_depth are compiled in parallel.
+        """
+
+        if workers <= 1 or max_depth <= split_depth:
+            root = self.compile_node([], strategy, max_depth)
+        else:
+            root = self.compile_node([], strategy, split_depth)
+            frontier = list(self.__frontier(root, []))
+            initargs = (self.snapshot, self.knowledge_base, self.create_find_question_service, self.include_unknown)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+                subtrees = executor.map(_compile_subtree,
+                                        [path for path, __ in frontier],
+                                        [strategy] * len(frontier),
+                                        [max_depth] * len(frontier))
+                for (__, node), subtree in zip(frontier, subtrees):
+                    node.clear()
+                    node.update(subtree)
+
+        return OpeningBook(self.knowledge_base, self.snapshot.version, strategy, max_depth, root)
+
+    def compile_node(self, questions: list[Question], strategy: FindStrategy, max_depth: int) -> dict | None:
+        section = self.snapshot.section(questions)
+        # No item is left: the online engine answers these paths with an error.
+        if not section.n_rows:
+            return None
+
+        result = self.find_question_service.find_best_question(section, self.snapshot.target_field, strategy)
+        if result.guess is not None:
+            return {"guess": result.guess}
+
+        node = {"question": result.question, "values": result.values, "children": {}}
+        if len(questions) + 1 >= max_depth:
+            return node
+
+        answers = list(result.values) + ([None] if self.include_unknown else [])
+        for answer in answers:
+            child = self.compile_node(questions + [Question(name=result.question, answer=answer)], strategy,
+                                      max_depth)
+            if child is not None:
+                node["children"][answer or UNKNOWN_ANSWER] = child
+        return node
+
+    def __frontier(self, node: dict | None, questions: list[Question]):
+        """
+        Yields the question nodes without children, with the path leading to them.
+        """
+
+        if node is None or "guess" in node:
+            return
+        if not node["children"]:
+            yield questions, node
+            return
+        for answer, child in node["children"].items():
+            question = Question(name=node["question"], answer=None if answer == UNKNOWN_ANSWER else answer)
+            yield from self.__frontier(child, questions + [question])
+
+
+# Compiler of a worker process, created once from the pickled snapshot.
+_worker_compiler: OpeningBookCompiler | None = None
+
+
+def _init_worker(snapshot: KnowledgeSnapshot, knowledge_base: str,
+                 create_find_question_service: Callable[[], FindQuestionService], include_unknown: bool):
+    global _worker_compiler
+    _worker_compiler = OpeningBookCompiler(snapshot, knowledge_base, create_find_question_service, include_unknown)
+
+
+def _compile_subtree(questions: list[Question], strategy: FindStrategy, max_depth: int) -> dict:
+    return _worker_compiler.compile_node(questions, strategy, max_depth)
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Callable
+
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+
+class CachedQuestion:
+    """
+    Serialized question document, with the validators of its content.
+    """
+
+    def __init__(self, body: bytes, etag: str, last_modified: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.loaded_at = time.monotonic()
+
+
+class QuestionDocumentCache:
+    """
+    Question documents of the knowledge bases (the attributes collection), with their image urls resolved,
+    keyed by (knowledge base, question, knowledge base version). The image urls are temporary links, so entries older
+    than max_age_seconds are not served; the registered knowledge bases are warmed in the background (start_refresh)
+    every refresh_seconds, before their entries expire.
+    The ETag is the digest of the serialized document. Last-Modified is the time this content was first cached,
+    kept by the refreshes that produce the same document.
+    """
+
+    def __init__(self, resolve_images: Callable[[list[dict]], None], max_age_seconds: float = 1800.0,
+                 refresh_seconds: float = 1500.0):
+        """
+        :param resolve_images: sets the image urls of a list of question documents, in place.
+        """
+
+        self.resolve_images = resolve_images
+        self.max_age_seconds = max_age_seconds
+        self.refresh_seconds = refresh_seconds
+        self.entries = {}
+        self.sources = {}
+        self.lock = threading.Lock()
+
+        self.stop_event = threading.Event()
+        self.refresh_thread = None
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def register(self, knowledge_base: str, storage_service, get_version: Callable[[], str]):
+        """
+        :param storage_service: MongoService of the knowledge base, its questions are loaded by the warm-ups.
+        :param get_version: current version of the knowledge base.
+        """
+
+        self.sources[knowledge_base] = (storage_service, get_version)
+
+    def get_version(self, knowledge_base: str) -> str:
+        return self.sources[knowledge_base][1]()
+
+    def get(self, knowledge_base: str, question: str, version: str) -> CachedQuestion | None:
+        with self.lock:
+            entry = self.entries.get((knowledge_base, question, version))
+            if entry is None or time.monotonic() - entry.loaded_at >= self.max_age_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def put(self, knowledge_base: str, question: str, version: str, document: dict) -> CachedQuestion:
+        """
+        Caches a document whose images are already resolved.
+        """
+
+        # Same encoding as the JSON responses of FastAPI.
+        body = json.dumps(jsonable_encoder(document), ensure_ascii=False, allow_nan=False, indent=None,
+                          separators=(",", ":")).encode("utf-8")
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+        key = (knowledge_base, question, version)
+        with self.lock:
+            previous = self.entries.get(key)
+            last_modified = previous.last_modified if previous is not None and previous.etag == etag else time.time()
+            entry = self.entries[key] = CachedQuestion(body, etag, last_modified)
+        return entry
+
+    def record_not_modified(self):
+        with self.lock:
+            self.not_modified += 1
+
+    def warm(self, knowledge_base: str) -> int:
+        """
+        Loads, resolves and caches every question of a knowledge base, and drops its entries of other versions.
+        :return: the number of questions cached.
+        """
+
+        start_time = time.time()
+        storage_service, get_version = self.sources[knowledge_base]
+        version = get_version()
+        documents = storage_service.get_all_questions()
+        self.resolve_images(documents)
+        for document in documents:
+            self.put(knowledge_base, document["_id"], version, document)
+
+        with self.lock:
+            self.entries = {key: entry for key, entry in self.entries.items()
+                            if key[0] != knowledge_base or key[2] == version}
+        end_time = time.time()
+        logger.info(f"[QuestionCache][{knowledge_base}]: {len(documents)} questions of version {version} "
+                    f"in {end_time - start_time} seconds")
+        return len(documents)
+
+    def invalidate(self, knowledge_base: str):
+        with self.lock:
+            self.entries = {key: entry for key, entry in self.entries.items() if key[0] != knowledge_base}
+
+    def start_refresh(self, ready: threading.Event | None = None, ready_timeout_seconds: float = 60.0):
+        """
+        Warms the registered knowledge bases in a background thread, then again every refresh_seconds.
+        :param ready: waited for (at most ready_timeout_seconds) before the first warm-up, e.g. the drive index.
+        """
+
+        if self.refresh_thread is not None:
+            return
+        self.stop_event.clear()
+        self.refresh_thread = threading.Thread(target=self.__refresh_loop, args=(ready, ready_timeout_seconds),
+                                               name="question-cache", daemon=True)
+        self.refresh_thread.start()
+
+    def stop_refresh(self):
+        self.stop_event.set()
+        if self.refresh_thread is not None:
+            self.refresh_thread.join()
+            self.refresh_thread = None
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
+
+    def __refresh_loop(self, ready: threading.Event | None, ready_timeout_seconds: float):
+        if ready is not None:
+            ready.wait(ready_timeout_seconds)
+        while not self.stop_event.is_set():
+            for knowledge_base in list(self.sources):
+                try:
+                    self.warm(knowledge_base)
+                except Exception:
+                    # Requests still load the missing questions one by one.
+                    logger.exception(f"[QuestionCache][{knowledge_base}]: warm-up failed")
+            self.stop_event.wait(self.refresh_seconds)
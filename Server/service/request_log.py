@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+from service.metrics import RequestTrace
+
+logger = logging.getLogger(__name__)
+
+
+class RequestLog:
+    """
+    One JSON line per served request: request id, route, status, total and per-stage durations in milliseconds,
+    and the fields annotated by the services (knowledge base, strategy, section rows, features, source).
+    Lines are written to size-rotated files by a background thread, the request only enqueues its record.
+    Analyzed with InitialExperiments/analyze_request_log.py.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, backup_count: int = 8):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                       encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+
+        # Own logger, the records do not go to app.log.
+        self.records = queue.SimpleQueue()
+        self.request_logger = logging.getLogger(f"{__name__}.{path}")
+        self.request_logger.propagate = False
+        self.request_logger.setLevel(logging.INFO)
+        self.request_logger.addHandler(logging.handlers.QueueHandler(self.records))
+        self.listener = logging.handlers.QueueListener(self.records, handler)
+        self.listener.start()
+
+    def write(self, trace: RequestTrace, method: str, route: str, status_code: int, total_seconds: float):
+        record = {
+            "ts": round(time.time(), 3),
+            "request_id": trace.request_id,
+            "method": method,
+            "route": route,
+            "status": status_code,
+            "total_ms": round(total_seconds * 1000, 3),
+            "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in trace.stage_durations().items()},
+        }
+        record.update(trace.fields)
+        self.request_logger.info(json.dumps(record, separators=(",", ":"), default=str))
+
+    def close(self):
+        self.listener.stop()
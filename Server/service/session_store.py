@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from model.dto.guess_model import Question
+
+
+class GameSession:
+    """
+    State kept between the turns of a game: the answered questions and the bitmap of the surviving items.
+    turn counts the recorded turns, a turn is recorded only over the state it started from (see SessionStore.put).
+    """
+
+    def __init__(self, session_id: str, version: str, questions: list[Question], bitmap: int, turn: int = 0):
+        self.session_id = session_id
+        self.version = version
+        self.questions = questions
+        self.bitmap = bitmap
+        self.turn = turn
+        self.expires_at = 0.0
+        self.size = 0
+
+    def size_bytes(self) -> int:
+        # Rough estimate: the bitmap plus the question objects.
+        return sys.getsizeof(self.bitmap) + sum(sys.getsizeof(question.name) + 64 for question in self.questions) + 256
+
+
+class SessionStore:
+    """
+    In-memory store of game sessions, bounded by an estimated memory size.
+    Sessions expire after ttl_seconds without a turn; the least recently used ones are evicted above max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 900.0):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sessions = OrderedDict()
+        self.used_bytes = 0
+        self.lock = threading.Lock()
+
+        self.expired = 0
+        self.evicted = 0
+
+    @staticmethod
+    def new_session(version: str, bitmap: int) -> GameSession:
+        return GameSession(str(uuid.uuid4()), version, [], bitmap)
+
+    def get(self, session_id: str) -> GameSession | None:
+        with self.lock:
+            self.__remove_expired()
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            now = time.monotonic()
+            if session.expires_at < now:
+                del self.sessions[session_id]
+                self.used_bytes -= session.size
+                self.expired += 1
+                return None
+            # Refreshed as it moves to the end, so the sessions stay ordered by expiry for __remove_expired.
+            session.expires_at = now + self.ttl_seconds
+            self.sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session: GameSession, expected_turn: int | None = None) -> bool:
+        """
+        Stores the session. With expected_turn, compare-and-set: the session replaces the stored one only if
+        that one is still at expected_turn, so of two concurrent turns of a session the second one is refused.
+        :return: False if the stored session changed meanwhile.
+        """
+
+        with self.lock:
+            previous = self.sessions.get(session.session_id)
+            if previous is not None and expected_turn is not None and previous.turn != expected_turn:
+                return False
+            if previous is not None:
+                del self.sessions[session.session_id]
+                self.used_bytes -= previous.size
+            session.size = session.size_bytes()
+            session.expires_at = time.monotonic() + self.ttl_seconds
+            self.sessions[session.session_id] = session
+            self.used_bytes += session.size
+
+            self.__remove_expired()
+            while self.used_bytes > self.max_bytes and len(self.sessions) > 1:
+                __, evicted = self.sessions.popitem(last=False)
+                self.used_bytes -= evicted.size
+                self.evicted += 1
+            return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "used_bytes": self.used_bytes,
+                "max_bytes": self.max_bytes,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+    def __remove_expired(self):
+        # Sessions are ordered by last use, so the expired ones are at the front.
+        now = time.monotonic()
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.expires_at >= now:
+                break
+            del self.sessions[session_id]
+            self.used_bytes -= session.size
+            self.expired += 1
@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+# Code reserved for an attribute that is not defined for an item.
+MISSING_CODE = 0
+
+
+def check_not_null_nan(value):
+    """
+    Method responsible for checking if a value is not null or none.
+    For the nan check, it is enough to verify if value == value.
+    :param value: str or int of float
+    :return: boolean value
+    """
+
+    return value and value == value
+
+
+def nlogn_table(size: int) -> np.ndarray:
+    """
+    Precomputes n * log2(n) for every integer count in [0, size].
+    The value for n = 0 is 0, following the convention used for entropy.
+    """
+
+    n = np.arange(size + 1, dtype=np.float64)
+    table = np.zeros(size + 1, dtype=np.float64)
+    table[1:] = n[1:] * np.log2(n[1:])
+    return table
+
+
+def xlogx(values: np.ndarray) -> np.ndarray:
+    """
+    Evaluates x * log2(x) for real valued (weighted) counts, with 0 for x = 0.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    result = np.zeros_like(values)
+    positive = values > 0
+    result[positive] = values[positive] * np.log2(values[positive])
+    return result
+
+
+class EncodedSection:
+    """
+    Integer encoded section of the knowledge base.
+    Each feature column holds small int codes, where MISSING_CODE marks an undefined value and
+    code k > 0 stands for values[feature][k - 1]. The target column holds class indices.
+    """
+
+    def __init__(self, codes: np.ndarray, target: np.ndarray, features: list[str], values: list[list],
+                 classes: list, target_feature: str):
+        self.codes = codes
+        self.target = target
+        self.features = features
+        self.values = values
+        self.classes = classes
+        self.target_feature = target_feature
+
+    @classmethod
+    def from_dataframe(cls, data: DataFrame, target_feature: str) -> EncodedSection:
+        features = [feature for feature in data.columns if feature != target_feature]
+        codes = np.empty((len(data), len(features)), dtype=np.int32)
+        values = []
+
+        # Factorize keeps the order of appearance, the same as Series.unique().
+        for index, feature in enumerate(features):
+            feature_codes, feature_values = pd.factorize(data[feature], use_na_sentinel=True)
+            codes[:, index] = feature_codes + 1
+            values.append(list(feature_values))
+
+        target, classes = pd.factorize(data[target_feature], use_na_sentinel=False)
+        return cls(codes, target.astype(np.int32), features, values, list(classes), target_feature)
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.target)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.features)
+
+    def feature_index(self, feature: str) -> int:
+        return self.features.index(feature)
+
+    def feature_values(self, feature_index: int) -> list:
+        """
+        Lists the defined values of a feature in the order they first appear in the section.
+        """
+
+        column = self.codes[:, feature_index]
+        present, first_rows = np.unique(column, return_index=True)
+        ordered = present[np.argsort(first_rows, kind="stable")]
+        values = self.values[feature_index]
+        return [values[code - 1] for code in ordered if code != MISSING_CODE and check_not_null_nan(values[code - 1])]
+
+    def class_counts(self) -> np.ndarray:
+        return np.bincount(self.target, minlength=len(self.classes))
+
+    def majority_class(self):
+        """
+        Returns the most common class. Ties are broken by the smallest label, the same as Series.mode().
+        """
+
+        counts = self.class_counts()
+        candidates = [self.classes[index] for index in np.flatnonzero(counts == counts.max())]
+        return min(candidates)
+
+    def n_classes(self) -> int:
+        return int(np.count_nonzero(self.class_counts()))
+
+    def has_constant_features(self) -> bool:
+        """
+        Checks if every feature holds the same defined value on all the rows.
+        An undefined value is never equal to another, so a feature with missing values is not constant.
+        """
+
+        if not self.n_features or not self.n_rows:
+            return True
+        first = self.codes[0]
+        return bool(np.all((self.codes == first).all(axis=0) & (first != MISSING_CODE)))
+
+    def to_dataframe(self) -> DataFrame:
+        columns = {}
+        for index, feature in enumerate(self.features):
+            lookup = np.array([np.nan] + list(self.values[index]), dtype=object)
+            columns[feature] = lookup[self.codes[:, index]]
+        columns[self.target_feature] = np.array(self.classes, dtype=object)[self.target]
+        return DataFrame(columns)
+
+
+class ContingencyTable:
+    """
+    (feature, value, class) count tensor of a section.
+    Rows of the counts matrix are grouped per feature, one row for each code of the feature
+    (MISSING_CODE included, kept at zero), columns are the classes.
+    """
+
+    def __init__(self, counts: np.ndarray, offsets: np.ndarray, total_weight: float):
+        self.counts = counts
+        self.offsets = offsets
+        self.total_weight = total_weight
+
+    @classmethod
+    def from_section(cls, section: EncodedSection, weights: np.ndarray | None = None) -> ContingencyTable:
+        n_classes = max(len(section.classes), 1)
+        sizes = np.array([len(values) + 1 for values in section.values], dtype=np.intp)
+        offsets = np.zeros(len(sizes) + 1, dtype=np.intp)
+        np.cumsum(sizes, out=offsets[1:])
+
+        # One scatter-add over every cell: index = (offset[feature] + code) * classes + class.
+        cells = (offsets[:-1] + section.codes.astype(np.intp)) * n_classes + section.target.astype(np.intp)[:, None]
+        cell_weights = None
+        if weights is not None:
+            cell_weights = np.broadcast_to(np.asarray(weights, dtype=np.float64)[:, None], cells.shape).ravel()
+        counts = np.bincount(cells.ravel(), weights=cell_weights, minlength=offsets[-1] * n_classes)
+        counts = counts.reshape(offsets[-1], n_classes)
+
+        # Unknown values do not take part in the split.
+        counts[offsets[:-1]] = 0
+
+        total_weight = float(section.n_rows if weights is None else np.sum(weights))
+        return cls(counts, offsets, total_weight)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.offsets) - 1
+
+    def __feature_sums(self, values: np.ndarray) -> np.ndarray:
+        # Every feature owns at least its missing row, so no segment is empty.
+        if not self.n_features:
+            return np.zeros((0,) + values.shape[1:])
+        return np.add.reduceat(values, self.offsets[:-1], axis=0)
+
+    def information_gain(self) -> np.ndarray:
+        """
+        Information gain per feature, evaluated only on the rows with a known value for the feature.
+        """
+
+        counts = self.counts
+        value_totals = counts.sum(axis=1)
+        class_totals = self.__feature_sums(counts)
+        known = class_totals.sum(axis=1)
+
+        # Integer counts read n * log2(n) from a table, weighted counts evaluate it.
+        if np.issubdtype(counts.dtype, np.integer):
+            table = nlogn_table(int(known.max(initial=0)))
+            entropy_term = lambda values: table[values]
+        else:
+            entropy_term = xlogx
+
+        # n * H = n * log2(n) - sum(n_c * log2(n_c)), for the feature and for each of its values.
+        feature_entropy = entropy_term(known) - entropy_term(class_totals).sum(axis=1)
+        value_entropy = entropy_term(value_totals) - entropy_term(counts).sum(axis=1)
+        weighted_entropy = self.__feature_sums(value_entropy)
+
+        gain = np.zeros(self.n_features)
+        defined = known > 0
+        gain[defined] = (feature_entropy[defined] - weighted_entropy[defined]) / known[defined]
+        return gain
+
+    def weighted_gini(self) -> np.ndarray:
+        """
+        Gini impurity of the split per feature, weighted by the size of each value subset.
+        """
+
+        counts = self.counts.astype(np.float64)
+        value_totals = counts.sum(axis=1)
+        squares = (counts * counts).sum(axis=1)
+        purity = np.zeros_like(value_totals)
+        np.divide(squares, value_totals, out=purity, where=value_totals > 0)
+
+        known = self.__feature_sums(value_totals)
+        weighted = np.zeros(self.n_features)
+        defined = known > 0
+        weighted[defined] = (known[defined] - self.__feature_sums(purity)[defined]) / known[defined]
+        return weighted
+
+    def gain_ratio(self) -> np.ndarray:
+        """
+        C4.5 gain ratio per feature, with the C4.5 treatment of unknown values:
+        the gain evaluated on the rows with a known value is scaled by their weight fraction,
+        and the unknown rows take part in the split info as one more branch.
+        As in C4.5, only the features with at least the average gain are candidates, the rest score 0,
+        otherwise a tiny split info makes the most unbalanced splits win.
+        """
+
+        gain, split_info = self.gain_and_split_info()
+        return self.ratio_of(gain, split_info)
+
+    def gain_and_split_info(self) -> (np.ndarray, np.ndarray):
+        """
+        The two terms of the gain ratio per feature, before the average gain rule is applied.
+        """
+
+        counts = self.counts
+        value_totals = counts.sum(axis=1)
+        class_totals = self.__feature_sums(counts)
+        known = class_totals.sum(axis=1)
+        total = self.total_weight
+
+        gain = np.zeros(self.n_features)
+        split_info = np.zeros(self.n_features)
+        defined = known > 0
+        if total <= 0:
+            return gain, split_info
+
+        # W * H = W * log2(W) - sum(w_c * log2(w_c)), before the split and for each value subset.
+        known_entropy = xlogx(known) - xlogx(class_totals).sum(axis=1)
+        feature_entropy = self.__feature_sums(xlogx(value_totals) - xlogx(counts).sum(axis=1))
+        gain[defined] = (known_entropy[defined] - feature_entropy[defined]) / total
+
+        # Split info: -sum(p * log2(p)) over the value subsets and the unknown subset, p = w / total.
+        branches = self.__feature_sums(xlogx(value_totals)) + xlogx(total - known)
+        split_info = np.log2(total) - branches / total
+        return gain, split_info
+
+    @staticmethod
+    def ratio_of(gain: np.ndarray, split_info: np.ndarray) -> np.ndarray:
+        """
+        Gain ratio of the candidate features, the ones with a split info and at least the average gain.
+        """
+
+        gain_ratio = np.zeros(len(gain))
+        if not len(gain):
+            return gain_ratio
+        candidates = (split_info > 1e-12) & (gain >= gain.mean() - 1e-12)
+        gain_ratio[candidates] = gain[candidates] / split_info[candidates]
+        return gain_ratio
+
+
+class SectionCounts:
+    """
+    (feature, value, class) counts of a section, aggregated by the storage instead of shipping its items.
+    Rows of the counts matrix follow the ContingencyTable layout, where code k > 0 stands for values[feature][k - 1].
+    Features and values are in the order of the knowledge base attributes, the ones unknown to it come after, sorted.
+    """
+
+    def __init__(self, counts: np.ndarray, offsets: np.ndarray, features: list[str], values: list[list],
+                 classes: list, class_totals: np.ndarray, target_feature: str):
+        self.counts = counts
+        self.offsets = offsets
+        self.features = features
+        self.values = values
+        self.classes = classes
+        self.class_totals = class_totals
+        self.target_feature = target_feature
+
+    @classmethod
+    def from_cells(cls, cells: Iterable[tuple], target_feature: str,
+                   attribute_values: dict[str, list]) -> SectionCounts:
+        """
+        :param cells: (attribute, value, class, count) tuples, the ones of the target feature count the classes.
+        :param attribute_values: values of each attribute of the knowledge base, in their order.
+        """
+
+        class_totals = {}
+        feature_cells = {}
+        for attribute, value, label, count in cells:
+            if attribute == target_feature:
+                class_totals[label] = class_totals.get(label, 0) + count
+            elif value is not None:
+                feature_cells.setdefault(attribute, []).append((value, label, count))
+
+        features = [attribute for attribute in attribute_values if attribute in feature_cells]
+        features += sorted(attribute for attribute in feature_cells if attribute not in attribute_values)
+        values = []
+        for feature in features:
+            present = {value for value, __, __ in feature_cells[feature]}
+            known_values = [value for value in attribute_values.get(feature, []) if value in present]
+            values.append(known_values + sorted(present - set(known_values), key=str))
+
+        classes = list(class_totals)
+        class_indices = {label: index for index, label in enumerate(classes)}
+        sizes = np.array([len(feature_values) + 1 for feature_values in values], dtype=np.intp)
+        offsets = np.zeros(len(sizes) + 1, dtype=np.intp)
+        np.cumsum(sizes, out=offsets[1:])
+
+        counts = np.zeros((offsets[-1], max(len(classes), 1)), dtype=np.int64)
+        for index, feature in enumerate(features):
+            codes = {value: code + 1 for code, value in enumerate(values[index])}
+            for value, label, count in feature_cells[feature]:
+                counts[offsets[index] + codes[value], class_indices[label]] += count
+
+        return cls(counts, offsets, features, values, classes,
+                   np.array([class_totals[label] for label in classes], dtype=np.int64), target_feature)
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.class_totals.sum())
+
+    @property
+    def n_features(self) -> int:
+        return len(self.features)
+
+    def feature_values(self, feature_index: int) -> list:
+        return [value for value in self.values[feature_index] if check_not_null_nan(value)]
+
+    def class_counts(self) -> np.ndarray:
+        return self.class_totals
+
+    def majority_class(self):
+        # Ties are broken by the smallest label, the same as EncodedSection.
+        counts = self.class_counts()
+        return min(self.classes[index] for index in np.flatnonzero(counts == counts.max()))
+
+    def n_classes(self) -> int:
+        return int(np.count_nonzero(self.class_counts()))
+
+    def has_constant_features(self) -> bool:
+        """
+        Checks if every feature holds the same defined value on all the rows, i.e. one of its values counts them all.
+        """
+
+        if not self.n_features or not self.n_rows:
+            return True
+        value_totals = self.counts.sum(axis=1)
+        return all(value_totals[self.offsets[index] + 1:self.offsets[index + 1]].max(initial=0) == self.n_rows
+                   for index in range(self.n_features))
+
+    def to_contingency_table(self) -> ContingencyTable:
+        return ContingencyTable(self.counts.copy(), self.offsets, float(self.n_rows))
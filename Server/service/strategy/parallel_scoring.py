@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from service.strategy.kernels import EncodedSection, ContingencyTable
+
+logger = logging.getLogger(__name__)
+
+# Sections with fewer cells (rows x features) are scored in process, the dispatch would cost more than it saves.
+PARALLEL_THRESHOLD_CELLS = 200_000
+
+# The server runs threads (executors, refresh loops) when the pool starts: its workers must not be forked from it.
+DEFAULT_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class ParallelScorer:
+    """
+    Scores the features of wide sections on a persistent pool of worker processes.
+    The section arrays are copied once in a shared memory block, each worker attaches to it and scores
+    a contiguous slice of the feature columns. The partial scores are concatenated in feature order,
+    so the best feature is the same as the one found in process.
+    """
+
+    def __init__(self, workers: int, threshold_cells: int = PARALLEL_THRESHOLD_CELLS,
+                 start_method: str = DEFAULT_START_METHOD):
+        """
+        :param start_method: multiprocessing start method of the workers, forkserver or spawn by default.
+        """
+        self.workers = workers
+        self.threshold_cells = threshold_cells
+        self.start_method = start_method
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def accepts(self, section: EncodedSection) -> bool:
+        return (self.workers > 1 and section.n_features > 1
+                and section.n_rows * section.n_features >= self.threshold_cells)
+
+    def score(self, strategy, section: EncodedSection) -> np.ndarray:
+        """
+        Feature scores of the strategy (an IContingencyQuestionStrategy), the same as strategy.score_features().
+        """
+
+        target = np.ascontiguousarray(section.target, dtype=np.int32)
+        codes = section.codes
+        # Target first, so the codes that follow stay aligned; column-major codes make each slice contiguous.
+        block = SharedMemory(create=True, size=max(target.nbytes + codes.nbytes, 1))
+        try:
+            np.ndarray(target.shape, target.dtype, buffer=block.buf)[:] = target
+            shared_codes = np.ndarray(codes.shape, codes.dtype, buffer=block.buf, offset=target.nbytes, order="F")
+            shared_codes[:] = codes
+            del shared_codes
+
+            layout = (block.name, section.n_rows, section.n_features, codes.dtype.str)
+            futures = [self.__get_executor().submit(_score_columns, layout, start, stop,
+                                                    section.values[start:stop], len(section.classes), strategy)
+                       for start, stop in self.__split(section.n_features)]
+            partial_scores = [future.result() for future in futures]
+        finally:
+            block.close()
+            block.unlink()
+
+        return strategy.finish_scores(np.concatenate(partial_scores, axis=-1))
+
+    def start(self):
+        """
+        Starts the pool and its worker processes now, instead of on the first wide section.
+        """
+
+        executor = self.__get_executor()
+        for future in [executor.submit(_warm_up) for __ in range(self.workers)]:
+            future.result()
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def __get_executor(self) -> ProcessPoolExecutor:
+        # The pool is started by start, or else on first use, and kept for the next requests.
+        with self.lock:
+            if self.executor is None:
+                logger.info(f"[ParallelScorer]: starting {self.workers} workers ({self.start_method})")
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context(self.start_method))
+            return self.executor
+
+    def __split(self, n_features: int) -> list[tuple[int, int]]:
+        bounds = np.linspace(0, n_features, min(self.workers, n_features) + 1).astype(int)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _warm_up():
+    pass
+
+
+def _score_columns(layout: tuple, start: int, stop: int, values: list[list], n_classes: int, strategy) -> np.ndarray:
+    name, n_rows, n_features, dtype = layout
+    # The parent owns the block, workers only attach to it.
+    block = SharedMemory(name=name)
+    try:
+        return _score_shared(block, n_rows, n_features, np.dtype(dtype), start, stop, values, n_classes, strategy)
+    finally:
+        block.close()
+
+
+def _score_shared(block: SharedMemory, n_rows: int, n_features: int, dtype: np.dtype, start: int, stop: int,
+                  values: list[list], n_classes: int, strategy) -> np.ndarray:
+    # The views on the block must be released before it is closed, so they live only in this frame.
+    target = np.ndarray((n_rows,), np.int32, buffer=block.buf)
+    codes = np.ndarray((n_rows, n_features), dtype, buffer=block.buf, offset=target.nbytes, order="F")
+    features = [str(index) for index in range(start, stop)]
+    section = EncodedSection(codes[:, start:stop], target, features, values, [None] * n_classes, "")
+    table = ContingencyTable.from_section(section, strategy.get_weights(section))
+    return strategy.score_partial(table)
@@ -1,17 +1,25 @@
 import abc
 import enum
+import hashlib
+import json
 import logging
-import math
 import os
+import threading
 import time
 import uuid
+from collections import OrderedDict
 
+import numpy as np
+import pandas as pd
 from mrjob.job import MRJob
 from pandas import DataFrame
-from sklearn import preprocessing
-from sklearn.tree import DecisionTreeClassifier
 
-from service.mr.query_finder_jobs import InfoGainMapReducer, GiniMapReducer, GainRatioMapReducer
+from model.dto.guess_model import Question
+from service.knowledge_shards import KnowledgeShards
+from service.mr.query_finder_jobs import IQuestionMapReducer, InfoGainMapReducer, GiniMapReducer, GainRatioMapReducer, \
+    CriteriaMapReducer, RATIO_TOLERANCE
+from service.strategy.kernels import EncodedSection, ContingencyTable, SectionCounts, check_not_null_nan
+from service.strategy.parallel_scoring import ParallelScorer
 
 logger = logging.getLogger(__name__)
 
@@ -25,15 +33,15 @@ class FindStrategy(enum.Enum):
     GINI_IMPURITY_MR = 5
 
 
-def check_not_null_nan(value):
-    """
-    Method responsible for checking if a value is not null or none.
-    For the nan check, it is enough to verify if value == value.
-    :param value: str or int of float
-    :return: boolean value
-    """
-
-    return value and value == value
+# Strategy names of the endpoints and of the offline tools.
+STRATEGY_NAMES = {
+    "information_gain": FindStrategy.INFORMATION_GAIN,
+    "gini_impurity": FindStrategy.GINI_IMPURITY,
+    "gain_ratio": FindStrategy.GAIN_RATIO,
+    "mr_information_gain": FindStrategy.INFORMATION_GAIN_MR,
+    "mr_gini_impurity": FindStrategy.GINI_IMPURITY_MR,
+    "mr_gain_ratio": FindStrategy.GAIN_RATIO_MR
+}
 
 
 class IFindBestQuestionStrategy(metaclass=abc.ABCMeta):
@@ -59,258 +67,179 @@ class IFindBestQuestionStrategy(metaclass=abc.ABCMeta):
         pass
 
 
-class InformationGainQuestionStrategy(IFindBestQuestionStrategy):
+class IContingencyQuestionStrategy(IFindBestQuestionStrategy, metaclass=abc.ABCMeta):
+    """
+    Strategy scoring all the features at once from the (feature, value, class) count tensor of an encoded section.
+    """
 
-    def get_strategy_type(self) -> FindStrategy:
-        return FindStrategy.INFORMATION_GAIN
+    @abc.abstractmethod
+    def score_features(self, table: ContingencyTable) -> np.ndarray:
+        pass
 
-    def find_best_feature(self, data: DataFrame, target_feature: str) -> (str, list[str]):
-        # Get the list of column names resembling the features.
-        features_list = list(filter(lambda feature: feature != target_feature, data.columns))
+    @abc.abstractmethod
+    def select_best(self, scores: np.ndarray) -> int | None:
+        pass
 
-        # Get best feature.
+    def get_weights(self, section: EncodedSection) -> np.ndarray | None:
+        """
+        Weight of each row of the section, None when every row counts once.
+        """
+        return None
 
-        best_feature = max(features_list,
-                           key=lambda feature: self.__get_information_gain(data, feature, target_feature))
+    def score_partial(self, table: ContingencyTable) -> np.ndarray:
+        """
+        Scores a subset of the features. The partial scores of all the subsets are concatenated on the last axis
+        and turned into the feature scores by finish_scores.
+        """
+        return self.score_features(table)
 
-        # Enlist the next values that best feature can take.
-        feature_values = list(filter(check_not_null_nan, data[best_feature].unique()))
+    def finish_scores(self, partial_scores: np.ndarray) -> np.ndarray:
+        return partial_scores
 
-        return best_feature, feature_values
+    def find_best_feature(self, data: DataFrame, target_feature: str) -> (str, list[str]):
+        return self.find_best_feature_encoded(EncodedSection.from_dataframe(data, target_feature))
+
+    def find_best_feature_encoded(self, section: EncodedSection,
+                                  parallel_scorer: ParallelScorer | None = None) -> (str, list[str]):
+        if not section.n_features:
+            return None, None
+
+        # Wide sections are scored by the worker pool, a slice of the features each.
+        if parallel_scorer is not None and parallel_scorer.accepts(section):
+            scores = parallel_scorer.score(self, section)
+        else:
+            scores = self.score_features(ContingencyTable.from_section(section, self.get_weights(section)))
+        best_index = self.select_best(scores)
+        if best_index is None:
+            return None, None
 
-    def __get_information_gain(self, data: DataFrame, feature: str, target_feature: str) -> float:
-        # Filter data for only known attribute values.
-        filtered_data = data[(data[feature] == data[feature])]
+        # Enlist the next values that best feature can take.
+        return section.features[best_index], section.feature_values(best_index)
 
-        # Calculate weighted average entropy for the feature.
-        unique_values = filtered_data[feature].unique()
-        weighted_entropy = 0
+    def find_best_feature_counts(self, section_counts: SectionCounts) -> (str, list[str]):
+        """
+        Same as find_best_feature_encoded, for the counts of a section aggregated by the storage.
+        Unit row weights give the same table as the integer counts.
+        """
 
-        for value in unique_values:
-            subset = filtered_data[filtered_data[feature] == value]
-            proportion = len(subset) / len(filtered_data)
-            weighted_entropy += proportion * self.__get_entropy(subset, target_feature)
+        if not section_counts.n_features:
+            return None, None
 
-        # Calculate information gain
-        entropy_outcome = self.__get_entropy(filtered_data, target_feature)
-        information_gain = entropy_outcome - weighted_entropy
+        best_index = self.select_best(self.score_features(section_counts.to_contingency_table()))
+        if best_index is None:
+            return None, None
+        return section_counts.features[best_index], section_counts.feature_values(best_index)
 
-        return information_gain
 
-    def __get_entropy(self, data: DataFrame, target_feature: str) -> float:
-        total_rows = len(data)
-        target_values = data[target_feature].unique()
+class InformationGainQuestionStrategy(IContingencyQuestionStrategy):
 
-        entropy = 0
-        for value in target_values:
-            # Calculate the proportion of instances with the current value
-            value_count = len(data[data[target_feature] == value])
-            proportion = value_count / total_rows
+    def get_strategy_type(self) -> FindStrategy:
+        return FindStrategy.INFORMATION_GAIN
 
-            # Take into consideration the case when there are
-            if proportion:
-                entropy -= proportion * math.log2(proportion)
+    def score_features(self, table: ContingencyTable) -> np.ndarray:
+        return table.information_gain()
 
-        return entropy
+    def select_best(self, scores: np.ndarray) -> int | None:
+        # First feature with the maximum gain.
+        return int(np.argmax(scores))
 
 
-class GainRatioQuestionStrategy(IFindBestQuestionStrategy):
+class GainRatioQuestionStrategy(IContingencyQuestionStrategy):
 
     def get_strategy_type(self) -> FindStrategy:
         return FindStrategy.GAIN_RATIO
 
-    def find_best_feature(self, data: DataFrame, target_feature: str) -> (str, list[str]):
-        # Algorithm takes the last column as target feature.
-        column_to_move = data.pop(target_feature)
-        data.insert(loc=len(data.columns), column=target_feature, value=column_to_move.values)
-
-        # Get the list of column names resembling the features.
-        features_list = list(data.columns[:-1])
-
+    def get_weights(self, section: EncodedSection) -> np.ndarray | None:
         # For entry in data, a weight is assigned.
-        weights = [1] * len(data)
-
-        # Algorithm runs on a list of elements associated to their weights list.
-        # Returns: [[attr_1.value, attr_2.value, ..., attr_n.value], [ ... ], ... ]
-        entries = data.values.tolist()
-
-        # Build first layer of c45 tree.
-        best_feature = self.__calculate(entries, features_list, weights)
-        # Select only not null attributes to show.
-        feature_values = None
-        if best_feature:
-            feature_values = list(filter(check_not_null_nan, data[best_feature].unique()))
-
-        return best_feature, feature_values
-
-    def __calculate(self, entries: list[list], feature_list: list[str], weights: list[float]) -> str:
-        # Initialize important indices.
-        best_attribute = None
-        best_gain_ratio = 0.0
-        split_info = 0.0
-
-        # Loop through each feature.
-        # It assumes that it does not contain the target column.
-        for feature_index in range(len(feature_list)):
-            # Filter the elements that have a defined value for the attributes.
-            filtered_entries_weights = list(
-                filter(lambda entry_weight: check_not_null_nan(entry_weight[0][feature_index]), zip(entries, weights)))
-            filtered_entries = list(map(lambda item: item[0], filtered_entries_weights))
-            filtered_weights = list(map(lambda item: item[1], filtered_entries_weights))
-
-            # Gets the unique values of the feature.
-            feature_values = set([record[feature_index] for record in filtered_entries])
-            feature_entropy = 0.0
-
-            # For each distinct value of the feature.
-            for value in feature_values:
-                # 1) Get the subset of the entries which have the current value.
-                subset, subset_weights = self.__split_data(filtered_entries, feature_index, value, filtered_weights)
-
-                # 2) Find out the entropy of the subset.
-                subset_entropy = self.__get_entropy(subset, subset_weights)
-
-                # 3) Add findings to the feature entropy.
-                subset_probability = sum(subset_weights) / sum(weights)
-                feature_entropy += subset_probability * subset_entropy
-
-                # 4) Update the split info value based on the probability.
-                # Treat also the case when probability is 0 for a subset.
-                if subset_probability != 0:
-                    split_info -= subset_probability * math.log2(subset_probability)
-
-            # Find out the total entropy of the set excluding unknown values.
-            total_entropy = self.__get_entropy(filtered_entries, filtered_weights)
-
-            # Calculate the information gain based on the attribute.
-            gain = total_entropy - feature_entropy
-
-            # Normalize the gain if split_info is not 0.
-            gain_ratio = 0.0
-            if split_info != 0.0:
-                gain_ratio = gain / split_info
-
-            if gain_ratio > best_gain_ratio:
-                best_gain_ratio = gain_ratio
-                best_attribute = feature_list[feature_index]
-
-        return best_attribute
-
-    def __get_entropy(self, entries: list[list], weights: list[float]) -> float:
-        class_counts = {}
-        total_weight = 0.0
-
-        # Counts how many records are per class totally using weight.
-        # Also evaluates the total weight.
-        for i, record in enumerate(entries):
-            # We assume that target field is the last.
-            label = record[-1]
-            # Extract the weight of the current attribute.
-            weight = weights[i]
-
-            if label not in class_counts:
-                class_counts[label] = 0.0
-            class_counts[label] += weight
-            total_weight += weight
-
-        # Evaluates entropy.
-        entropy = 0.0
-        # For each result class, use the weight to find out entropy.
-        for count in class_counts.values():
-            probability = count / total_weight
-            entropy -= probability * math.log2(probability)
-
-        return entropy
-
-    def __split_data(self, entries: list[list], feature_index: int, feature_value: str, weights: list[float]) -> (
-            list[list], list[float]):
-        split_data = []
-        split_weights = []
-
-        for i, record in enumerate(entries):
-            # Take only the entries with the attribute equal to feature_value.
-            if record[feature_index] == feature_value:
-                # Remove the feature_index from data.
-                split_data.append(record[:feature_index] + record[feature_index + 1:])
-                # Add the weight of the entry.
-                split_weights.append(weights[i])
-
-        return split_data, split_weights
-
-
-class GiniQuestionStrategy(IFindBestQuestionStrategy):
+        return np.ones(section.n_rows)
 
-    def get_strategy_type(self) -> FindStrategy:
-        return FindStrategy.GINI_IMPURITY
-
-    def __init__(self):
-        self.label_encoder = self.label_encoder = preprocessing.LabelEncoder()
-
-    def find_best_feature(self, data: DataFrame, target_feature: str) -> (str, list[str]):
-        # Get the list of column names resembling the features.
-        features_list = list(filter(lambda feature: feature != target_feature, data.columns))
+    def score_features(self, table: ContingencyTable) -> np.ndarray:
+        return table.gain_ratio()
 
-        # Get best feature.
-        best_feature = min(features_list, key=lambda feature: self.__weighted_gini(data, feature, target_feature))
+    def score_partial(self, table: ContingencyTable) -> np.ndarray:
+        # The average gain rule needs the gain of every feature, so the ratio is taken after the reduce.
+        return np.vstack(table.gain_and_split_info())
 
-        # Enlist the next values that best feature can take.
-        feature_values = list(filter(check_not_null_nan, data[best_feature].unique()))
+    def finish_scores(self, partial_scores: np.ndarray) -> np.ndarray:
+        gain, split_info = partial_scores
+        return ContingencyTable.ratio_of(gain, split_info)
 
-        return best_feature, feature_values
+    def select_best(self, scores: np.ndarray) -> int | None:
+        # Only a feature with a positive gain ratio is worth asking.
+        # Ratios are often equal up to rounding (e.g. one item per class), so the first of them wins.
+        best_score = scores.max()
+        if best_score > 0.0:
+            return int(np.argmax(scores >= best_score - RATIO_TOLERANCE))
+        return None
 
-    def __gini_impurity(self, data: DataFrame, target_feature: str) -> float:
-        total_rows = len(data)
-        target_values = data[target_feature].unique()
 
-        gini_impurity = 0
-        for value in target_values:
-            # Calculate the proportion of instances with the current value
-            value_count = len(data[data[target_feature] == value])
-            proportion = value_count / total_rows
+class GiniQuestionStrategy(IContingencyQuestionStrategy):
 
-            gini_impurity += proportion * proportion
+    def get_strategy_type(self) -> FindStrategy:
+        return FindStrategy.GINI_IMPURITY
 
-        return 1 - gini_impurity
+    def score_features(self, table: ContingencyTable) -> np.ndarray:
+        return table.weighted_gini()
 
-    def __weighted_gini(self, data: DataFrame, feature: str, target_feature: str) -> float:
-        # Filter data for only known attribute values.
-        filtered_data = data[(data[feature] == data[feature])]
+    def select_best(self, scores: np.ndarray) -> int | None:
+        # First feature with the minimum weighted impurity.
+        return int(np.argmin(scores))
 
-        # Calculate weighted average gini impurity indicator for the feature.
-        unique_values = filtered_data[feature].unique()
-        weighted_gini = 0.0
 
-        for value in unique_values:
-            subset = filtered_data[filtered_data[feature] == value]
-            proportion = len(subset) / len(filtered_data)
-            weighted_gini += proportion * self.__gini_impurity(subset, target_feature)
+class IMRJobQuestionStrategy(IFindBestQuestionStrategy, metaclass=abc.ABCMeta):
 
-        return weighted_gini
+    # Results of the fused job, shared by the MR strategies: section digest -> {criterion: (feature, score)}.
+    # Results on the knowledge base shards are keyed by the digest of the answers.
+    __FUSED_RESULTS_SIZE = 32
+    __fused_results = OrderedDict()
+    __fused_results_lock = threading.Lock()
 
-    def __evaluate_using_tree(self, data: DataFrame, target_feature: str) -> (str, list[str]):
-        # Using the decision tree classifier requires translating all the values to int.
-        df_encoded = data.copy(deep=True)
-        data_features = df_encoded.drop(target_feature, axis=1)
-        for column_name in data_features.columns:
-            if data_features[column_name].dtype == object:
-                data_features[column_name] = self.label_encoder.fit_transform(data_features[column_name])
+    # The mrjob inline runner changes the working directory, the environment and the standard streams of the process
+    # while a job runs: the runner jobs (and their input files, written with relative paths) run one at a time.
+    __runner_lock = threading.Lock()
 
-        data_target = data[target_feature]
+    def __init__(self, in_memory: bool = False, fused: bool = False, chunk_rows: int | None = None):
+        """
+        :param in_memory: run the job steps on the section (or on the shard files) in memory, instead of through
+        the mrjob runner.
+        :param fused: pick the best feature from the CriteriaMapReducer result, shared with the other MR strategies.
+        :param chunk_rows: if provided, the section is exported as encoded rows, streamed by the mappers in chunks
+        of this size, instead of a csv file read at once.
+        """
+        self.in_memory = in_memory
+        self.fused = fused
+        self.chunk_rows = chunk_rows
 
-        d_tree = DecisionTreeClassifier(criterion='gini', max_depth=1)
-        d_tree.fit(data_features, data_target)
+    @abc.abstractmethod
+    def get_job_class(self) -> type[IQuestionMapReducer]:
+        pass
 
-        best_feature = data_features.columns[d_tree.tree_.feature[0]]
-        feature_values = data[best_feature].unique()
+    @abc.abstractmethod
+    def get_criterion(self) -> str:
+        """
+        Key of the strategy criterion in the CriteriaMapReducer output.
+        """
+        pass
 
-        return best_feature, feature_values
+    def init_runner(self, input_file_path, target_feature, attributes: list[str],
+                    job_class: type[IQuestionMapReducer] | None = None) -> MRJob:
+        job_class = job_class or self.get_job_class()
+        return job_class(args=[input_file_path] + self.get_job_args(target_feature, attributes))
 
+    def init_in_memory_job(self, target_feature, attributes: list[str],
+                           job_class: type[IQuestionMapReducer] | None = None) -> IQuestionMapReducer:
+        job_class = job_class or self.get_job_class()
+        return job_class(args=self.get_job_args(target_feature, attributes))
 
-class IMRJobQuestionStrategy(IFindBestQuestionStrategy, metaclass=abc.ABCMeta):
+    def get_job_args(self, target_feature: str, attributes: list[str]) -> list[str]:
+        # The job keys hold attribute ids, the names are needed to decode the result.
+        args = ["--target", target_feature, "--attributes", json.dumps(attributes)]
+        if self.chunk_rows:
+            args += ["--input-mode", IQuestionMapReducer.ROWS_INPUT, "--chunk-rows", str(self.chunk_rows)]
+        return args
 
-    @abc.abstractmethod
-    def init_runner(self, input_file_path, target) -> MRJob:
-        pass
+    def get_attributes(self, data: DataFrame, target_feature: str) -> list[str]:
+        return [column for column in data.columns if column != target_feature]
 
     def generate_tmp_input_path(self) -> str:
         return "tmp/" + str(uuid.uuid4()) + ".csv"
@@ -320,16 +249,23 @@ class IMRJobQuestionStrategy(IFindBestQuestionStrategy, metaclass=abc.ABCMeta):
             return data.drop("_id", axis=1)
         return data
 
-    def save_input_to_file(self, input_file_path: str, data: DataFrame):
+    def save_input_to_file(self, input_file_path: str, data: DataFrame, target_feature: str):
         start_time = time.time()
-        data.to_csv(input_file_path, index=False)
+        if self.chunk_rows:
+            attributes = self.get_attributes(data, target_feature)
+            encoded = IQuestionMapReducer.encode_dataframe(data, target_feature, attributes)
+            encoded.to_csv(input_file_path, index=False, header=False)
+        else:
+            data.to_csv(input_file_path, index=False)
         end_time = time.time()
         logging.info(f"[{self.get_strategy_type()}][SaveFileTime]: {end_time - start_time} seconds.")
 
-    def run_job(self, input_file_path: str, data: DataFrame, target_feature: str) -> (str, list[str]):
+    def run_job(self, input_file_path: str, data: DataFrame, target_feature: str,
+                job_class: type[IQuestionMapReducer] | None = None) -> list[tuple]:
         try:
             # Initialize job.
-            mr_job = self.init_runner(input_file_path, target_feature)
+            mr_job = self.init_runner(input_file_path, target_feature, self.get_attributes(data, target_feature),
+                                      job_class)
             with mr_job.make_runner() as runner:
                 start_time = time.time()
                 runner.run()
@@ -337,28 +273,122 @@ class IMRJobQuestionStrategy(IFindBestQuestionStrategy, metaclass=abc.ABCMeta):
 
                 logging.info(f"[{self.get_strategy_type()}][MapReduceTime]: {end_time - start_time} seconds.")
 
-                # Get the result as a single element.
-                outputs = list(mr_job.parse_output(runner.cat_output()))
-
-                best_feature, __ = outputs[0]
-                best_feature_values = list(filter(check_not_null_nan, data[best_feature].unique()))
-                return best_feature, best_feature_values
+                return list(mr_job.parse_output(runner.cat_output()))
         finally:
             # Delete the created file on disk.
             os.remove(input_file_path)
 
+    def run_job_in_memory(self, data: DataFrame, target_feature: str,
+                          job_class: type[IQuestionMapReducer] | None = None) -> list[tuple]:
+        mr_job = self.init_in_memory_job(target_feature, self.get_attributes(data, target_feature), job_class)
+        start_time = time.time()
+        outputs = mr_job.run_in_memory(data)
+        end_time = time.time()
+        logging.info(f"[{self.get_strategy_type()}][InMemoryMapReduceTime]: {end_time - start_time} seconds.")
+        return outputs
+
+    def get_job_outputs(self, data: DataFrame, target_feature: str,
+                        job_class: type[IQuestionMapReducer] | None = None) -> list[tuple]:
+        if self.in_memory:
+            return self.run_job_in_memory(data, target_feature, job_class)
+
+        with IMRJobQuestionStrategy.__runner_lock:
+            # Get tmp file path.
+            input_tmp_file_path = self.generate_tmp_input_path()
+
+            # Save on disk.
+            self.save_input_to_file(input_tmp_file_path, data, target_feature)
+
+            # Perform prediction. Also deletes the input file when ready.
+            return self.run_job(input_tmp_file_path, data, target_feature, job_class)
+
+    def find_best_feature_per_criterion(self, data: DataFrame, target_feature: str) -> dict[str, tuple]:
+        """
+        Runs the fused job once for a section, the MR strategies asking for the same section share the result.
+        :return: dict of criterion -> (best feature, score)
+        """
+
+        data = self.clean_data(data)
+        digest = hashlib.sha1(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+        digest.update(repr((list(data.columns), target_feature)).encode("utf-8"))
+        return self.__get_fused_result(digest.hexdigest(),
+                                       lambda: self.get_job_outputs(data, target_feature, CriteriaMapReducer))
+
+    def find_best_feature_in_shards(self, shards: KnowledgeShards,
+                                    questions: list[Question]) -> (str | None, list[str], dict[str, int]):
+        """
+        Runs the fused job on the shards of the knowledge base, the answers being applied by the mappers,
+        so the section is never built by the caller. Shared by the MR strategies, as find_best_feature_per_criterion.
+        :return: tuple of:
+            - str: the best feature, None if no feature is left
+            - list[str]: the values of the best feature in the section
+            - dict[str, int]: the number of items per class in the section, empty if no item is left
+        """
+
+        # Same answers, in any order, filter the same section.
+        answers = sorted(shards.encode_answers(questions), key=lambda answer: answer[0])
+        key = hashlib.sha1(json.dumps([shards.directory, shards.version, answers]).encode("utf-8")).hexdigest()
+        result = self.__get_fused_result(key, lambda: self.run_shards_job(shards, answers))
+
+        # No output at all when no item is left.
+        if CriteriaMapReducer.ROWS not in result:
+            return None, [], {}
+
+        best_feature, __ = result[self.get_criterion()]
+        best_feature_values = []
+        if best_feature is not None:
+            best_feature_values = shards.decode_values(best_feature, result[CriteriaMapReducer.VALUES][best_feature])
+        return best_feature, best_feature_values, shards.decode_classes(result[CriteriaMapReducer.ROWS]["classes"])
+
+    def run_shards_job(self, shards: KnowledgeShards, answers: list[list[int | None]]) -> list[tuple]:
+        args = self.get_job_args(shards.target_field, shards.attributes) + ["--answers", json.dumps(answers)]
+        if not self.chunk_rows:
+            args += ["--input-mode", IQuestionMapReducer.ROWS_INPUT]
+
+        if self.in_memory:
+            mr_job = CriteriaMapReducer(args=args)
+            start_time = time.time()
+            outputs = mr_job.run_rows_files_in_memory(shards.paths)
+            end_time = time.time()
+            logging.info(f"[{self.get_strategy_type()}][InMemoryShardsMapReduceTime]: {end_time - start_time} seconds.")
+            return outputs
+
+        # One map task per shard file, the shards are not removed after the run.
+        mr_job = CriteriaMapReducer(args=shards.paths + args)
+        with IMRJobQuestionStrategy.__runner_lock, mr_job.make_runner() as runner:
+            start_time = time.time()
+            runner.run()
+            end_time = time.time()
+
+            logging.info(f"[{self.get_strategy_type()}][ShardsMapReduceTime]: {end_time - start_time} seconds.")
+
+            return list(mr_job.parse_output(runner.cat_output()))
+
+    def __get_fused_result(self, key: str, run) -> dict:
+        with IMRJobQuestionStrategy.__fused_results_lock:
+            result = IMRJobQuestionStrategy.__fused_results.get(key)
+        if result is not None:
+            return result
+
+        result = dict(run())
+        with IMRJobQuestionStrategy.__fused_results_lock:
+            IMRJobQuestionStrategy.__fused_results[key] = result
+            while len(IMRJobQuestionStrategy.__fused_results) > IMRJobQuestionStrategy.__FUSED_RESULTS_SIZE:
+                IMRJobQuestionStrategy.__fused_results.popitem(last=False)
+        return result
+
     def find_best_feature(self, data: DataFrame, target_feature: str) -> (str, list[str]):
         # Clean data.
         data = self.clean_data(data)
 
-        # Get tmp file path.
-        input_tmp_file_path = self.generate_tmp_input_path()
+        if self.fused:
+            best_feature, __ = self.find_best_feature_per_criterion(data, target_feature)[self.get_criterion()]
+        else:
+            # Get the result as a single element.
+            best_feature, __ = self.get_job_outputs(data, target_feature)[0]
 
-        # Save on disk.
-        self.save_input_to_file(input_tmp_file_path, data)
-
-        # Perform prediction. Also deletes the input file when ready.
-        return self.run_job(input_tmp_file_path, data, target_feature)
+        best_feature_values = list(filter(check_not_null_nan, data[best_feature].unique()))
+        return best_feature, best_feature_values
 
 
 class InformationGainMRQuestionStrategy(IMRJobQuestionStrategy):
@@ -366,8 +396,11 @@ class InformationGainMRQuestionStrategy(IMRJobQuestionStrategy):
     def get_strategy_type(self) -> FindStrategy:
         return FindStrategy.INFORMATION_GAIN_MR
 
-    def init_runner(self, input_file_path, target_feature) -> MRJob:
-        return InfoGainMapReducer(args=[input_file_path, "--target", target_feature])
+    def get_job_class(self) -> type[IQuestionMapReducer]:
+        return InfoGainMapReducer
+
+    def get_criterion(self) -> str:
+        return CriteriaMapReducer.INFORMATION_GAIN
 
 
 class GiniMRQuestionStrategy(IMRJobQuestionStrategy):
@@ -375,8 +408,11 @@ class GiniMRQuestionStrategy(IMRJobQuestionStrategy):
     def get_strategy_type(self) -> FindStrategy:
         return FindStrategy.GINI_IMPURITY_MR
 
-    def init_runner(self, input_file_path, target_feature) -> MRJob:
-        return GiniMapReducer(args=[input_file_path, "--target", target_feature])
+    def get_job_class(self) -> type[IQuestionMapReducer]:
+        return GiniMapReducer
+
+    def get_criterion(self) -> str:
+        return CriteriaMapReducer.GINI_IMPURITY
 
 
 class GainRatioMRQuestionStrategy(IMRJobQuestionStrategy):
@@ -384,5 +420,8 @@ class GainRatioMRQuestionStrategy(IMRJobQuestionStrategy):
     def get_strategy_type(self) -> FindStrategy:
         return FindStrategy.GAIN_RATIO_MR
 
-    def init_runner(self, input_file_path, target_feature) -> MRJob:
-        return GainRatioMapReducer(args=[input_file_path, "--target", target_feature])
+    def get_job_class(self) -> type[IQuestionMapReducer]:
+        return GainRatioMapReducer
+
+    def get_criterion(self) -> str:
+        return CriteriaMapReducer.GAIN_RATIO
@@ -0,0 +1,50 @@
+import os
+import time
+
+import pytest
+
+from benchmark.datasets import load_snapshot
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Temporary working directory of the server, with the tmp/ directory of the mrjob runner inputs.
+    """
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("tmp")
+    return tmp_path
+
+
+@pytest.fixture(scope="session")
+def anime_snapshot():
+    return load_snapshot("anime_25")
+
+
+@pytest.fixture(scope="session")
+def tennis_snapshot():
+    return load_snapshot("play_tennis")
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Replaces time.monotonic, advanced by the test.
+    """
+
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
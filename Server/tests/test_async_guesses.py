@@ -0,0 +1,94 @@
+import asyncio
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pytest
+
+import service.async_mongo_service
+from benchmark.bitmap_filter import random_game
+from benchmark.concurrency import run
+from benchmark.load_games import AsyncClientStandIn, MongoStandIn
+from benchmark.section_queries import create_storage, SCRATCH_DATABASE
+from model.dto.guess_model import GuessInput
+from service.async_mongo_service import AsyncMongoService
+from service.best_question_cache import BestQuestionCache
+from service.find_question_service import FindQuestionService
+from service.guess_service import GuessService, GuessOptions
+from service.strategy.strategies import FindStrategy
+
+STRATEGIES = [FindStrategy.INFORMATION_GAIN, FindStrategy.GAIN_RATIO, FindStrategy.GINI_IMPURITY]
+
+# Cheap requests may wait on the heavy ones for the GIL, not for whole evaluations: the inline evaluations of
+# benchmark.concurrency put the p99 of the cheap requests above 300 ms.
+CHEAP_P99_BOUND_SECONDS = 0.2
+
+
+@pytest.fixture(scope="module")
+def anime_storage():
+    storage_service, snapshot = create_storage(None, "anime_25")
+    with mock.patch.dict(MongoStandIn.clients, {"mongodb://localhost:27017/": storage_service.mongo_client}), \
+            mock.patch.object(service.async_mongo_service, "AsyncIOMotorClient", AsyncClientStandIn):
+        async_storage_service = AsyncMongoService("mongodb://localhost:27017/", SCRATCH_DATABASE)
+    return storage_service, async_storage_service, snapshot
+
+
+@pytest.mark.parametrize("section_counts", [False, True])
+def test_async_storage_path_matches_the_sync_one(anime_storage, section_counts):
+    storage_service, async_storage_service, snapshot = anime_storage
+    target_field = snapshot.target_field
+    find_question_service = FindQuestionService()
+    sync_service = GuessService(storage_service, find_question_service, target_field,
+                                options=GuessOptions(section_counts=section_counts))
+
+    executor_threads = set()
+
+    def find_best_question(*args, **kwargs):
+        executor_threads.add(threading.current_thread().name)
+        return FindQuestionService.find_best_question(find_question_service, *args, **kwargs)
+
+    with ThreadPoolExecutor(2, thread_name_prefix="guess-cpu") as executor:
+        async_service = GuessService(storage_service, mock.Mock(find_best_question=find_best_question), target_field,
+                                     options=GuessOptions(async_storage_service=async_storage_service,
+                                                          executor=executor, section_counts=section_counts))
+        random.seed(11)
+        games = [(random_game(snapshot, depth), strategy) for depth in (1, 4) for strategy in STRATEGIES]
+
+        async def play_all():
+            return await asyncio.gather(*(async_service.predict_next_question_async(GuessInput(questions=questions),
+                                                                                    strategy)
+                                          for questions, strategy in games))
+
+        results = asyncio.run(play_all())
+
+    for (questions, strategy), result in zip(games, results):
+        assert result == sync_service.predict_next_question(GuessInput(questions=questions), strategy)
+    # The strategies ran on the executor, not on the event loop thread.
+    assert executor_threads and all(name.startswith("guess-cpu") for name in executor_threads)
+
+
+def test_cheap_requests_are_not_blocked_by_heavy_mr_requests(anime_snapshot):
+    random.seed(5)
+    find_question_service = FindQuestionService(mr_in_memory=True)
+    target_field = anime_snapshot.target_field
+    with ThreadPoolExecutor(2, thread_name_prefix="guess-cpu") as executor:
+        cheap_service = GuessService(None, find_question_service, target_field, anime_snapshot, "anime",
+                                     GuessOptions(cache=BestQuestionCache(), executor=executor))
+        cheap_input = GuessInput(questions=[])
+        cheap_service.predict_next_question(cheap_input)
+        heavy_service = GuessService(None, find_question_service, target_field, anime_snapshot, "anime",
+                                     GuessOptions(executor=executor))
+        games = [random_game(anime_snapshot, 20) for __ in range(20)]
+
+        def cheap_p99(heavy_clients: int) -> (float, int):
+            latencies, heavy_requests = asyncio.run(run(cheap_service, cheap_input, heavy_service, games,
+                                                        heavy_clients, True, FindStrategy.GINI_IMPURITY_MR, 1.5))
+            return np.percentile(latencies, 99), heavy_requests
+
+        baseline, __ = cheap_p99(0)
+        loaded, heavy_requests = cheap_p99(2)
+
+    assert heavy_requests > 0
+    assert loaded <= baseline + CHEAP_P99_BOUND_SECONDS
@@ -0,0 +1,87 @@
+import random
+
+from benchmark.bitmap_filter import random_game
+from model.dto.guess_model import GuessInput, GuessOutput, Question
+from service.best_question_cache import BestQuestionCache
+from service.find_question_service import FindQuestionService
+from service.guess_service import GuessService, GuessOptions
+from service.strategy.strategies import FindStrategy
+
+QUESTIONS = [Question(name="Outlook", answer="Sunny"), Question(name="Wind", answer=None),
+             Question(name="Humidity", answer="High")]
+
+
+def make_key(questions: list[Question], version: str = "v1", strategy=FindStrategy.INFORMATION_GAIN) -> tuple:
+    return BestQuestionCache.make_key("tennis", version, strategy, questions)
+
+
+def test_key_does_not_depend_on_the_answer_order():
+    assert make_key(QUESTIONS) == make_key(list(reversed(QUESTIONS)))
+    # An unknown answer still removes the attribute from the section.
+    assert make_key(QUESTIONS) != make_key(QUESTIONS[:1] + QUESTIONS[2:])
+    assert make_key(QUESTIONS) != make_key(QUESTIONS, version="v2")
+    assert make_key(QUESTIONS) != make_key(QUESTIONS, strategy=FindStrategy.GINI_IMPURITY)
+
+
+def test_entries_expire(clock):
+    cache = BestQuestionCache(ttl_seconds=10.0)
+    cache.put(make_key(QUESTIONS), GuessOutput(question="Temperature", values=["Hot", "Mild"]))
+
+    clock.advance(9.0)
+    assert cache.get(make_key(QUESTIONS)).question == "Temperature"
+    clock.advance(2.0)
+    assert cache.get(make_key(QUESTIONS)) is None
+    assert cache.stats() == {"size": 0, "max_size": 4096, "hits": 1, "misses": 1, "evictions": 1}
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = BestQuestionCache(max_size=2)
+    keys = [make_key(QUESTIONS[:size]) for size in range(3)]
+    cache.put(keys[0], GuessOutput(guess="Yes"))
+    cache.put(keys[1], GuessOutput(guess="No"))
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], GuessOutput(question="Wind"))
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]).guess == "Yes"
+    assert cache.get(keys[2]).question == "Wind"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_results_are_copied(clock):
+    cache = BestQuestionCache()
+    result = GuessOutput(question="Wind", values=["Weak", "Strong"])
+    cache.put(make_key(QUESTIONS), result)
+    result.values.append("Calm")
+    cache.get(make_key(QUESTIONS)).values.append("Calm")
+
+    assert cache.get(make_key(QUESTIONS)).values == ["Weak", "Strong"]
+
+
+def test_invalidate_drops_one_knowledge_base(clock):
+    cache = BestQuestionCache()
+    cache.put(make_key(QUESTIONS), GuessOutput(guess="Yes"))
+    cache.put(BestQuestionCache.make_key("anime", "v1", FindStrategy.INFORMATION_GAIN, QUESTIONS), GuessOutput())
+
+    cache.invalidate("tennis")
+    assert cache.get(make_key(QUESTIONS)) is None
+    assert cache.stats()["size"] == 1
+
+
+def test_cached_results_match_the_computed_ones(clock, anime_snapshot):
+    find_question_service = FindQuestionService()
+    target_field = anime_snapshot.target_field
+    cache = BestQuestionCache()
+    cached_service = GuessService(None, find_question_service, target_field, anime_snapshot, "anime",
+                                  GuessOptions(cache=cache))
+    guess_service = GuessService(None, find_question_service, target_field, anime_snapshot)
+
+    random.seed(9)
+    for __ in range(10):
+        questions = random_game(anime_snapshot, 4)
+        for strategy in (FindStrategy.INFORMATION_GAIN, FindStrategy.GAIN_RATIO, FindStrategy.GINI_IMPURITY):
+            expected = guess_service.predict_next_question(GuessInput(questions=questions), strategy)
+            for answers in (questions, list(reversed(questions))):
+                assert cached_service.predict_next_question(GuessInput(questions=answers), strategy) == expected
+
+    assert cache.stats()["hits"] >= 30
@@ -0,0 +1,78 @@
+import random
+
+import numpy as np
+import pytest
+
+from benchmark.bitmap_filter import random_game
+from benchmark.datasets import load_dataset, to_attribute_values
+from model.dto.guess_model import Question
+from service.knowledge_snapshot import KnowledgeSnapshot
+
+DOCUMENTS = [
+    {"name": "a", "color": "red", "size": "big"},
+    {"name": "b", "color": "blue"},
+    {"name": "c", "color": None, "size": "small"},
+    {"name": "d", "size": "big"},
+]
+ATTRIBUTE_VALUES = {"color": ["red", "blue"], "size": ["big", "small"]}
+
+
+def matching_rows(documents: list[dict], questions: list[Question]) -> list[int]:
+    """
+    Items kept by the knowledge base query: the attribute equals the answer or is left out of the item.
+    """
+
+    return [row for row, document in enumerate(documents)
+            if all(not question.answer or question.name not in document or document[question.name] == question.answer
+                   for question in questions)]
+
+
+@pytest.fixture
+def snapshot() -> KnowledgeSnapshot:
+    return KnowledgeSnapshot.from_documents(DOCUMENTS, ATTRIBUTE_VALUES, "name")
+
+
+@pytest.mark.parametrize("questions, rows", [
+    ([], [0, 1, 2, 3]),
+    ([Question(name="color", answer="red")], [0, 3]),
+    ([Question(name="color", answer=None)], [0, 1, 2, 3]),
+    ([Question(name="color", answer="green")], [3]),
+    ([Question(name="weight", answer="light")], [0, 1, 2, 3]),
+    ([Question(name="color", answer="blue"), Question(name="size", answer="big")], [1, 3]),
+    ([Question(name="size", answer="small"), Question(name="color", answer="red")], []),
+])
+def test_filter_keeps_matching_and_missing_items(snapshot, questions, rows):
+    bitmap = snapshot.filter(questions)
+
+    assert snapshot.index.to_rows(bitmap).tolist() == rows == matching_rows(DOCUMENTS, questions)
+    assert snapshot.index.count(bitmap) == len(rows)
+
+
+def test_filter_matches_the_query_on_random_games():
+    random.seed(7)
+    data, target_field = load_dataset("criminal")
+    # Half of the missing cells are stored as null values, which no answer matches.
+    documents = [{attribute: value if value == value else None for attribute, value in row.items()
+                  if value == value or random.random() < 0.5} for row in data.to_dict("records")]
+    snapshot = KnowledgeSnapshot.from_documents(documents, to_attribute_values(data), target_field)
+
+    for depth in (0, 1, 2, 4, 8, 16):
+        for __ in range(10):
+            questions = random_game(snapshot, depth)
+            # An answer the item does not hold, as a player mistaking it.
+            questions.append(Question(name=random.choice(snapshot.attributes), answer="unknown value"))
+            rows = snapshot.index.to_rows(snapshot.filter(questions))
+            assert rows.tolist() == matching_rows(documents, questions)
+
+
+def test_filter_narrows_a_previous_bitmap(anime_snapshot):
+    random.seed(8)
+    for __ in range(20):
+        questions = random_game(anime_snapshot, 6)
+        bitmap = anime_snapshot.index.filter(questions[3:], anime_snapshot.filter(questions[:3]))
+        assert bitmap == anime_snapshot.filter(questions)
+
+
+def test_to_rows_round_trips(snapshot):
+    mask = np.array([True, False, True, True])
+    assert snapshot.index.to_rows(snapshot.index.to_bitmap(mask)).tolist() == [0, 2, 3]
@@ -0,0 +1,52 @@
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmark.bitmap_filter import random_game
+from model.dto.guess_model import GuessInput
+from service.find_question_service import FindQuestionService
+from service.guess_service import GuessService, GuessOptions
+from service.knowledge_shards import KnowledgeShards
+from service.strategy.strategies import FindStrategy, IMRJobQuestionStrategy
+
+MR_STRATEGIES = [FindStrategy.INFORMATION_GAIN_MR, FindStrategy.GAIN_RATIO_MR, FindStrategy.GINI_IMPURITY_MR]
+
+
+def clear_fused_results():
+    # Shared by every MR strategy instance, a result computed by one run would be reused by the other.
+    IMRJobQuestionStrategy._IMRJobQuestionStrategy__fused_results.clear()
+
+
+def to_comparable(result) -> tuple:
+    return result.question, sorted(result.values or []), result.guess
+
+
+def run_concurrently(guess_service: GuessService, requests: list) -> list:
+    async def run():
+        return await asyncio.gather(*(guess_service.predict_next_question_async(GuessInput(questions=questions),
+                                                                                strategy)
+                                      for questions, strategy in requests))
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("fused, use_shards", [(False, False), (True, False), (True, True)])
+def test_concurrent_runner_jobs_match_sequential(workdir, anime_snapshot, fused, use_shards):
+    random.seed(0)
+    requests = [(random_game(anime_snapshot, depth), strategy)
+                for depth in (1, 2, 3) for strategy in MR_STRATEGIES]
+    shards = KnowledgeShards.export(anime_snapshot, "shards", 4) if use_shards else None
+
+    with ThreadPoolExecutor(4, "guess-cpu") as executor:
+        guess_service = GuessService(None, FindQuestionService(mr_fused=fused), anime_snapshot.target_field,
+                                     anime_snapshot, options=GuessOptions(executor=executor, shards=shards))
+        clear_fused_results()
+        expected = [to_comparable(guess_service.predict_next_question(GuessInput(questions=questions), strategy))
+                    for questions, strategy in requests]
+        clear_fused_results()
+        results = run_concurrently(guess_service, requests)
+
+    assert [to_comparable(result) for result in results] == expected
+    assert list((workdir / "tmp").iterdir()) == []
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from benchmark.drive_index import FakeDriveService, make_folders
+from benchmark.media_proxy import FakeMediaDriveService
+from service.google_drive_service import GoogleDriveService, MediaCategory
+
+
+@pytest.fixture
+def folders() -> dict[str, list[dict]]:
+    return make_folders()
+
+
+def make_service(folders: dict[str, list[dict]], **kwargs) -> (GoogleDriveService, FakeDriveService):
+    drive = FakeDriveService(folders, 0.0)
+    return GoogleDriveService(None, lambda: drive, **kwargs), drive
+
+
+@pytest.mark.parametrize("file_name", ["000042.jpg", "00123", "missing.jpg"])
+def test_index_lookups_match_the_queries(clock, folders, file_name):
+    query_service, __ = make_service(folders)
+    index_service, drive = make_service(folders)
+    for category in MediaCategory:
+        index_service.refresh_index(category)
+    # The folders are listed page by page.
+    assert drive.calls > len(MediaCategory)
+
+    calls = drive.calls
+    for category in MediaCategory:
+        assert index_service.get_image_url(file_name, category) == query_service.get_image_url(file_name, category)
+    assert index_service.stats()["index_hits"] == (0 if file_name == "missing.jpg" else len(MediaCategory))
+    assert drive.calls - calls == index_service.stats()["api_queries"]
+
+
+def test_thumbnail_links_are_trimmed(clock, folders):
+    service, __ = make_service(folders)
+    service.refresh_index(MediaCategory.METADATA)
+
+    [file] = service.get_image_url("000007.jpg", MediaCategory.METADATA)["files"]
+    assert file["thumbnailLink"] == "https://lh3.example/2/7"
+
+
+def test_images_are_downloaded_from_the_sized_thumbnail(clock, folders):
+    drive = FakeMediaDriveService(folders, 0.0)
+    service = GoogleDriveService(None, lambda: drive, http_factory=lambda: drive, image_size=400)
+    service.refresh_index(MediaCategory.METADATA)
+
+    content, content_type = service.download_image("000007.jpg", MediaCategory.METADATA)
+    assert drive.uris == ["https://lh3.example/2/7=s400"]
+    assert content_type == "image/jpeg" and len(content) > 0
+
+    # A file without thumbnail is the only one downloaded in full.
+    folder_id = service.indices[MediaCategory.METADATA].folder_id
+    folders[folder_id].append({"id": "raw", "name": "raw.bin", "mimeType": "application/octet-stream"})
+    assert service.download_image("raw.bin", MediaCategory.METADATA)[1] == "application/octet-stream"
+    assert drive.downloads == 2 and len(drive.uris) == 1
+
+
+def test_names_missing_from_the_index_are_queried(clock, folders):
+    service, drive = make_service(folders)
+    service.refresh_index(MediaCategory.METADATA)
+    folder_id = service.indices[MediaCategory.METADATA].folder_id
+    folders[folder_id].append({"id": "new", "name": "new.jpg", "mimeType": "image/jpeg"})
+
+    assert service.get_image_url("new.jpg", MediaCategory.METADATA)["files"][0]["id"] == "new"
+    assert service.stats()["api_queries"] == 1
+
+
+def test_old_index_is_not_used(clock, folders):
+    service, drive = make_service(folders, max_age_seconds=60.0)
+    service.refresh_index(MediaCategory.METADATA)
+    assert service.get_image_url("000042.jpg", MediaCategory.METADATA)["files"]
+
+    clock.advance(61.0)
+    calls = drive.calls
+    assert service.get_image_url("000042.jpg", MediaCategory.METADATA)["files"][0]["id"] == "2-42"
+    assert drive.calls == calls + 1
+    assert service.stats()["index_hits"] == 1
+
+
+class FailingDriveService(FakeDriveService):
+
+    def list(self, pageSize: int = 100, pageToken: str = None, fields: str = None, q: str = ""):
+        if "broken" in q:
+            raise TimeoutError("timed out")
+        return super().list(pageSize, pageToken, fields, q)
+
+
+def test_batched_lookups_run_concurrently(folders):
+    clients = []
+
+    def client_factory():
+        clients.append(FailingDriveService(folders, 0.05))
+        return clients[-1]
+
+    service = GoogleDriveService(None, client_factory, lookup_workers=8)
+    names = [f"{index:06d}.jpg" for index in range(7)] + ["broken.jpg"]
+    start_time = time.perf_counter()
+    results = service.get_image_urls(names, MediaCategory.METADATA)
+    elapsed = time.perf_counter() - start_time
+
+    assert [result["files"][0]["name"] for result in results[:-1]] == names[:-1]
+    # A failed query leaves its image unresolved, the other ones are still returned.
+    assert results[-1] is None
+    # Every thread built its own client, the queries overlapped.
+    assert len(clients) > 1
+    assert elapsed < 0.05 * len(names) / 2
@@ -0,0 +1,72 @@
+import random
+from collections import Counter
+from unittest import mock
+
+import mongomock
+import pymongo
+import pytest
+
+from benchmark.bitmap_filter import random_game
+from benchmark.datasets import load_dataset, to_attribute_values
+from service.knowledge_shards import KnowledgeShards
+from service.knowledge_snapshot import KnowledgeSnapshot
+from service.mongo_service import MongoService
+from service.strategy.strategies import InformationGainMRQuestionStrategy
+
+
+@pytest.fixture(scope="module")
+def criminal_knowledge():
+    """
+    Storage on mongomock and snapshot of the criminal set, where half of the missing cells are stored as null values
+    (as the csv import does) and the others are left out.
+    """
+
+    random.seed(3)
+    data, target_field = load_dataset("criminal")
+    documents = []
+    for row in data.to_dict("records"):
+        documents.append({attribute: value if value == value else None for attribute, value in row.items()
+                          if value == value or random.random() < 0.5})
+
+    with mock.patch.object(pymongo, "MongoClient", mongomock.MongoClient):
+        storage_service = MongoService("mongodb://localhost:27017/", "knowledge_sections")
+    storage_service.db["metadata"].insert_one({"target_column": target_field})
+    storage_service.db["knowledge"].insert_many([dict(document) for document in documents])
+    storage_service.db["attributes"].insert_many([{"_id": attribute, "values": values}
+                                                  for attribute, values in to_attribute_values(data).items()])
+    snapshot = KnowledgeSnapshot.from_documents(documents, to_attribute_values(data), target_field)
+    return storage_service, snapshot
+
+
+def snapshot_classes(snapshot: KnowledgeSnapshot, questions) -> Counter:
+    rows = snapshot.index.to_rows(snapshot.filter(questions))
+    return Counter(snapshot.classes[code] for code in snapshot.target[rows])
+
+
+def storage_classes(storage_service: MongoService, questions, target_field: str) -> Counter:
+    return Counter(item[target_field] for item in storage_service.get_knowledge_section(questions))
+
+
+def test_null_values_are_not_missing(criminal_knowledge):
+    __, snapshot = criminal_knowledge
+    assert snapshot.null_rows
+
+
+def test_snapshot_sections_match_the_storage(workdir, criminal_knowledge):
+    storage_service, snapshot = criminal_knowledge
+    shards = KnowledgeShards.export(snapshot, "shards", 3)
+    strategy = InformationGainMRQuestionStrategy(in_memory=True, fused=True)
+    random.seed(4)
+    games = [random_game(snapshot, depth) for depth in (1, 2, 3, 5, 8) for __ in range(6)]
+
+    storage_service.revert_token_schema()
+    plain_sections = [storage_classes(storage_service, questions, snapshot.target_field) for questions in games]
+    storage_service.migrate_to_token_schema()
+    try:
+        for questions, plain_section in zip(games, plain_sections):
+            expected = snapshot_classes(snapshot, questions)
+            assert plain_section == expected
+            assert storage_classes(storage_service, questions, snapshot.target_field) == expected
+            assert strategy.find_best_feature_in_shards(shards, questions)[2] == expected
+    finally:
+        storage_service.revert_token_schema()
@@ -0,0 +1,53 @@
+import json
+import random
+
+import pytest
+
+from benchmark.bitmap_filter import random_game
+from business.config import ServerConfig
+from service.knowledge_shards import KnowledgeShards
+from service.mr.query_finder_jobs import CriteriaMapReducer
+from service.strategy.strategies import InformationGainMRQuestionStrategy
+
+
+@pytest.mark.parametrize("chunk_rows", [None, 7])
+def test_in_memory_shards_job_matches_runner(workdir, anime_snapshot, chunk_rows):
+    random.seed(1)
+    shards = KnowledgeShards.export(anime_snapshot, "shards", 3)
+    runner_strategy = InformationGainMRQuestionStrategy(in_memory=False, chunk_rows=chunk_rows)
+    in_memory_strategy = InformationGainMRQuestionStrategy(in_memory=True, chunk_rows=chunk_rows)
+
+    for depth in (0, 1, 3, 6):
+        answers = shards.encode_answers(random_game(anime_snapshot, depth))
+        expected = dict(runner_strategy.run_shards_job(shards, answers))
+        # The runner output went through JSON: tuples come back as lists.
+        result = json.loads(json.dumps(dict(in_memory_strategy.run_shards_job(shards, answers))))
+        assert result == expected
+        assert CriteriaMapReducer.ROWS in result
+
+
+def test_export_removes_old_versions(workdir, tennis_snapshot, monkeypatch):
+    old_shards = KnowledgeShards.export(tennis_snapshot, "shards", 2)
+    (workdir / "shards" / ".in-progress").mkdir()
+
+    monkeypatch.setattr(tennis_snapshot, "version", "next-version")
+    shards = KnowledgeShards.export(tennis_snapshot, "shards", 2)
+
+    assert sorted(entry.name for entry in (workdir / "shards").iterdir()) == [".in-progress", "next-version"]
+    assert KnowledgeShards.load(shards.directory, old_shards.version) is None
+    assert KnowledgeShards.load(shards.directory, "next-version").n_rows == tennis_snapshot.n_rows
+
+
+def test_shards_are_opt_in(monkeypatch):
+    for name in ("USE_MR_SHARDS", "MR_IN_MEMORY"):
+        monkeypatch.delenv(name, raising=False)
+    assert not ServerConfig.from_environment().use_mr_shards
+
+    monkeypatch.setenv("USE_MR_SHARDS", "true")
+    monkeypatch.setenv("MR_IN_MEMORY", "0")
+    config = ServerConfig.from_environment()
+    assert config.use_mr_shards and not config.mr_in_memory
+
+    monkeypatch.setenv("USE_MR_SHARDS", "maybe")
+    with pytest.raises(ValueError):
+        ServerConfig.from_environment()
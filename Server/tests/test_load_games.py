@@ -0,0 +1,69 @@
+import asyncio
+import os
+import random
+import threading
+from unittest import mock
+
+import httpx
+import pytest
+
+from benchmark.datasets import load_dataset
+from benchmark.load_games import load_app, run_strategy, MongoStandIn
+
+
+@pytest.fixture(scope="module")
+def app():
+    working_directory = os.getcwd()
+    app = load_app()
+    yield app
+
+    from business import business
+    business.stop()
+    mock.patch.stopall()
+    MongoStandIn.clients.clear()
+    os.chdir(working_directory)
+
+
+@pytest.fixture(scope="module")
+def characters() -> (list[dict], str):
+    data, target_field = load_dataset("criminal")
+    return data.to_dict("records"), target_field
+
+
+def play(app, characters, strategy: str, sessions: bool) -> dict:
+    random.seed(13)
+    characters, target_field = characters
+    return asyncio.run(run_strategy(app, "criminal", strategy, characters, target_field, players=1, games=6,
+                                    unknown_rate=0.0, sessions=sessions))
+
+
+@pytest.mark.parametrize("strategy", ["information_gain", "gini_impurity"])
+def test_session_games_match_stateless_games(app, characters, strategy):
+    stateless = play(app, characters, strategy, sessions=False)
+    session = play(app, characters, strategy, sessions=True)
+
+    assert stateless["errors"] == session["errors"] == {}
+    assert stateless["games"] == session["games"] == 6
+    # Same characters and answers: the games take the same turns and end with the same guesses.
+    for key in ("turns", "game_length_max", "right_guesses"):
+        assert stateless[key] == session[key]
+    assert stateless["right_guesses"] > 0
+
+
+def test_media_lookups_run_off_the_event_loop(app):
+    from business import business
+    threads = []
+
+    def get_image_url(file_name, category):
+        threads.append(threading.current_thread())
+        return {"files": []}
+
+    async def get_media():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get("/media/a.jpg", params={"category": 2})
+
+    with mock.patch.object(business.services.google_drive_service, "get_image_url", get_image_url):
+        response = asyncio.run(get_media())
+
+    assert response.status_code == 200
+    assert threads and threads[0] is not threading.main_thread()
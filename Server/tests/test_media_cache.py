@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from business import business
+from service.google_drive_service import MediaCategory
+from service.media_cache import MediaCache
+
+
+def test_same_content_is_stored_once(workdir):
+    cache = MediaCache("media_cache")
+    digest = cache.put("METADATA/a.jpg", b"image", "image/jpeg")
+    assert cache.put("METADATA/b.jpg", b"image", "image/png") == digest == hashlib.sha256(b"image").hexdigest()
+
+    assert cache.get("METADATA/a.jpg") == (b"image", "image/jpeg", digest)
+    assert cache.get("METADATA/b.jpg") == (b"image", "image/png", digest)
+    assert cache.get("METADATA/c.jpg") is None
+    assert cache.stats()["blobs"] == 1
+    assert cache.stats()["used_bytes"] == len(b"image")
+
+
+def test_least_recently_used_blobs_are_evicted(workdir):
+    cache = MediaCache("media_cache", max_bytes=20)
+    cache.put("a", b"a" * 8, "image/jpeg")
+    cache.put("b", b"b" * 8, "image/jpeg")
+    assert cache.get("a") is not None
+    cache.put("c", b"c" * 8, "image/jpeg")
+
+    assert cache.get("b") is None
+    assert cache.get("a")[0] == b"a" * 8
+    assert cache.get("c")[0] == b"c" * 8
+    assert cache.stats()["evictions"] == 1
+    assert sum(len(file_names) for __, __, file_names in os.walk(os.path.join("media_cache", "blobs"))) == 2
+
+
+def test_cache_is_reloaded_from_disk(workdir):
+    cache = MediaCache("media_cache")
+    digest = cache.put("METADATA/a.jpg", b"image", "image/jpeg")
+    # Left by a write interrupted by a restart.
+    with open(os.path.join("media_cache", "blobs", digest[:2], f"{digest}.partial.tmp"), "wb") as tmp_file:
+        tmp_file.write(b"ima")
+
+    reloaded = MediaCache("media_cache")
+    assert reloaded.get("METADATA/a.jpg") == (b"image", "image/jpeg", digest)
+    assert os.listdir(os.path.join("media_cache", "blobs", digest[:2])) == [digest]
+
+
+class DriveStandIn:
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.downloads = 0
+
+    def download_image(self, file_name: str, category: MediaCategory) -> (bytes, str):
+        self.downloads += 1
+        time.sleep(self.latency_seconds)
+        return f"{category.name}/{file_name}".encode(), "image/jpeg"
+
+
+@pytest.fixture
+def media_services(workdir, monkeypatch):
+    services = SimpleNamespace(media_cache=MediaCache("media_cache"), google_drive_service=DriveStandIn())
+    monkeypatch.setattr(business, "services", services)
+    return services
+
+
+def test_media_is_downloaded_once_and_revalidated(media_services):
+    response = business.retrieve_media_content("a.jpg", MediaCategory.METADATA, None)
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert response.body == b"METADATA/a.jpg"
+    assert etag == f'"{hashlib.sha256(b"METADATA/a.jpg").hexdigest()}"'
+
+    assert business.retrieve_media_content("a.jpg", MediaCategory.METADATA, None).body == b"METADATA/a.jpg"
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = business.retrieve_media_content("a.jpg", MediaCategory.METADATA, if_none_match)
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+    assert business.retrieve_media_content("a.jpg", MediaCategory.METADATA, '"other"').status_code == 200
+    assert media_services.google_drive_service.downloads == 1
+
+
+def test_revalidation_is_one_cache_lookup(media_services):
+    etag = business.retrieve_media_content("a.jpg", MediaCategory.METADATA, None).headers["ETag"]
+    stats = media_services.media_cache.stats()
+
+    assert business.retrieve_media_content("a.jpg", MediaCategory.METADATA, '"stale"').status_code == 200
+    assert business.retrieve_media_content("a.jpg", MediaCategory.METADATA, etag).status_code == 304
+    assert media_services.media_cache.stats()["hits"] == stats["hits"] + 2
+    assert media_services.media_cache.stats()["misses"] == stats["misses"]
+
+
+def test_concurrent_misses_download_once(media_services):
+    media_services.google_drive_service = DriveStandIn(latency_seconds=0.2)
+    barrier = threading.Barrier(8)
+
+    def request(__):
+        barrier.wait()
+        return business.retrieve_media_content("a.jpg", MediaCategory.METADATA, None)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(request, range(8)))
+
+    assert {response.body for response in responses} == {b"METADATA/a.jpg"}
+    assert media_services.google_drive_service.downloads == 1
+    assert media_services.media_cache.stats()["coalesced"] == 7
+    assert media_services.media_cache.downloads == {}
+
+
+def test_failed_download_is_shared_and_not_cached(workdir):
+    cache = MediaCache("media_cache")
+
+    def download():
+        raise ConnectionError("Drive unreachable")
+
+    with pytest.raises(ConnectionError):
+        cache.fetch("a", download)
+    assert cache.fetch("a", lambda: (b"a", "image/jpeg"))[0] == b"a"
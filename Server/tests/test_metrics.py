@@ -0,0 +1,95 @@
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from business.config import ServerConfig
+from model.dto.guess_model import GuessInput
+from service import metrics
+from service.guess_service import GuessService, GuessOptions
+from service.metrics import MetricsRegistry, SIZE_BUCKETS
+from service.strategy.strategies import FindStrategy
+
+
+def test_histograms_are_cumulative():
+    registry = MetricsRegistry()
+    registry.add_histogram("turn_seconds", "Turns.", buckets=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.005, 0.5, 100.0):
+        registry.observe("turn_seconds", value, strategy="gini")
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP akinator_turn_seconds Turns.", "# TYPE akinator_turn_seconds histogram"]
+    assert lines[2:] == [
+        'akinator_turn_seconds_bucket{strategy="gini",le="0.01"} 2',
+        'akinator_turn_seconds_bucket{strategy="gini",le="0.1"} 2',
+        'akinator_turn_seconds_bucket{strategy="gini",le="1.0"} 3',
+        'akinator_turn_seconds_bucket{strategy="gini",le="+Inf"} 4',
+        'akinator_turn_seconds_sum{strategy="gini"} 100.51',
+        'akinator_turn_seconds_count{strategy="gini"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.add_histogram("rows", "Rows.", SIZE_BUCKETS)
+    registry.observe("rows", 3, route='/guess/"a"\\b')
+
+    assert 'akinator_rows_count{route="/guess/\\"a\\"\\\\b"} 1' in registry.render().splitlines()
+
+
+def test_stats_are_exposed_as_gauges_and_counters():
+    registry = MetricsRegistry()
+    registry.add_stats("cache", lambda: {"size": 3, "hits": 10, "ready": True, "name": "lru",
+                                         "folders": {"METADATA": {"files": 7}}}, ("hits",))
+    registry.add_stats("broken", lambda: 1 / 0)
+
+    assert registry.render().splitlines() == [
+        "# TYPE akinator_cache_size gauge", "akinator_cache_size 3",
+        "# TYPE akinator_cache_hits_total counter", "akinator_cache_hits_total 10",
+        "# TYPE akinator_cache_folders_metadata_files gauge", "akinator_cache_folders_metadata_files 7",
+    ]
+
+
+def test_guess_turn_stages_are_traced_and_observed(tennis_snapshot):
+    registry = MetricsRegistry()
+    registry.add_histogram("guess_stage_seconds", "Stages.")
+    registry.add_histogram("guess_section_rows", "Rows.", SIZE_BUCKETS)
+
+    with ThreadPoolExecutor(1) as executor:
+        guess_service = GuessService(None, ServerConfig().create_find_question_service(), tennis_snapshot.target_field,
+                                     tennis_snapshot, "tennis",
+                                     GuessOptions(executor=executor, metrics_registry=registry))
+
+        async def serve():
+            token, trace = metrics.start_request("request-1")
+            try:
+                await guess_service.predict_next_question_async(GuessInput(questions=[]), FindStrategy.GINI_IMPURITY)
+            finally:
+                metrics.end_request(token)
+            return trace
+
+        trace = asyncio.run(serve())
+
+    # The stages run on the executor are recorded in the trace of the request.
+    assert {"retrieve", "score"} <= set(trace.stage_durations())
+    assert trace.fields["strategy"] == "gini_impurity"
+    assert trace.fields["section_rows"] == tennis_snapshot.n_rows
+    header = metrics.format_server_timing(trace, 0.5)
+    assert re.fullmatch(r"(\w+;dur=\d+\.\d{3}, )+total;dur=500\.000", header)
+
+    rendered = registry.render()
+    for stage in ("retrieve", "score", "total"):
+        assert (f'akinator_guess_stage_seconds_count{{knowledge_base="tennis",stage="{stage}",'
+                f'strategy="gini_impurity"}} 1') in rendered
+    assert f'akinator_guess_section_rows_sum{{knowledge_base="tennis"}} {tennis_snapshot.n_rows}' in rendered
+
+
+def test_stages_outside_a_request_are_not_traced():
+    with metrics.stage("score"):
+        pass
+    scope = metrics.TimingScope()
+    with metrics.stage("score"):
+        pass
+    stages, __ = scope.close()
+
+    assert [name for name, __ in stages] == ["score"]
+    assert metrics._trace.get() is None
@@ -0,0 +1,136 @@
+import asyncio
+import time
+from concurrent.futures import Future
+from unittest import mock
+
+import fastapi
+import pytest
+
+from business.config import ServerConfig
+from model.dto.guess_model import GuessInput, GuessOutput
+from service.find_question_service import FindQuestionService
+from service.guess_service import GuessService
+from service.mr_job_queue import MRJobQueue, QueuedJob
+from service.strategy.strategies import FindStrategy
+
+
+class ExecutorStandIn:
+    """
+    Keeps the submitted jobs pending until the test finishes their futures.
+    """
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, function, *args) -> Future:
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+@pytest.fixture
+def job_queue():
+    job_queue = MRJobQueue(workers=1, max_pending=2, result_ttl_seconds=10.0)
+    job_queue.executor.shutdown()
+    job_queue.executor = ExecutorStandIn()
+    return job_queue
+
+
+def submit(job_queue: MRJobQueue, key: str, on_result=None) -> QueuedJob:
+    return job_queue.submit((key,), None, "class", FindStrategy.INFORMATION_GAIN_MR, on_result=on_result)
+
+
+def finish(future: Future, result: GuessOutput | None = None, exception: Exception | None = None):
+    future.set_running_or_notify_cancel()
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result((time.time(), result))
+
+
+def test_duplicate_requests_get_the_same_job(job_queue):
+    job = submit(job_queue, "a")
+
+    assert submit(job_queue, "a") is job
+    assert job_queue.get_in_flight(("a",)) is job
+    assert len(job_queue.executor.futures) == 1
+    assert job_queue.stats()["submitted"] == 1
+    assert job_queue.stats()["deduplicated"] == 2
+
+
+def test_full_queue_rejects_new_jobs(job_queue):
+    first = submit(job_queue, "a")
+    submit(job_queue, "b")
+
+    with pytest.raises(fastapi.HTTPException) as error:
+        submit(job_queue, "c")
+    assert error.value.status_code == 503
+    assert job_queue.stats()["rejected"] == 1
+    # A duplicate of a pending job is still answered.
+    assert submit(job_queue, "a") is first
+
+    finish(job_queue.executor.futures[0], GuessOutput(question="Outlook"))
+    assert submit(job_queue, "c").status == QueuedJob.QUEUED
+
+
+def test_finished_job_keeps_its_result(job_queue):
+    results = []
+    job = submit(job_queue, "a", on_result=results.append)
+    assert job.status == QueuedJob.QUEUED
+
+    finish(job_queue.executor.futures[0], GuessOutput(question="Outlook", values=["Sunny", "Rain"]))
+
+    assert job.status == QueuedJob.DONE
+    assert job_queue.get(job.job_id).to_output().result == GuessOutput(question="Outlook", values=["Sunny", "Rain"])
+    assert results == [job.result]
+    # The key is free again: a new request makes a new job.
+    assert job_queue.get_in_flight(("a",)) is None
+    assert submit(job_queue, "a") is not job
+
+
+def test_failed_job_keeps_its_detail(job_queue):
+    job = submit(job_queue, "a")
+    finish(job_queue.executor.futures[0], exception=fastapi.HTTPException(status_code=404, detail="No character"))
+
+    assert job.to_output().status == QueuedJob.FAILED
+    assert job.to_output().detail == "No character"
+    assert job_queue.stats()["failed"] == 1
+
+
+def test_finished_jobs_expire(job_queue, monkeypatch):
+    job = submit(job_queue, "a")
+    finish(job_queue.executor.futures[0], GuessOutput(guess="Yes"))
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11.0)
+    assert job_queue.get(job.job_id) is None
+
+
+def test_workers_compute_the_in_process_result(tennis_snapshot):
+    job_queue = MRJobQueue(workers=1, mr_in_memory=True)
+    section = tennis_snapshot.section([])
+    strategy = FindStrategy.GINI_IMPURITY_MR
+    try:
+        assert job_queue.executor._mp_context.get_start_method() in ("forkserver", "spawn")
+        job = job_queue.submit(("b",), section, tennis_snapshot.target_field, strategy)
+        job = asyncio.run(job_queue.wait(job.job_id, 60.0))
+    finally:
+        job_queue.close()
+
+    expected = FindQuestionService(mr_in_memory=True).find_best_question(section, tennis_snapshot.target_field,
+                                                                         strategy)
+    assert job.status == QueuedJob.DONE
+    assert job.result == expected
+
+
+def test_job_mode_is_disabled_without_workers(monkeypatch):
+    monkeypatch.setenv("MR_JOB_WORKERS", "0")
+    assert ServerConfig.from_environment().mr_job_workers == 0
+
+    guess_service = GuessService(mock.Mock(), FindQuestionService(), "class")
+    with pytest.raises(fastapi.HTTPException) as error:
+        asyncio.run(guess_service.submit_next_question(GuessInput(questions=[]), FindStrategy.GINI_IMPURITY_MR))
+    assert error.value.status_code == 503
@@ -0,0 +1,137 @@
+import json
+import os
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from benchmark.datasets import load_dataset
+from business.config import ServerConfig
+from benchmark.strategy_suite import make_sections
+from service.mr.query_finder_jobs import GainRatioMapReducer, CriteriaMapReducer
+from service.strategy.kernels import EncodedSection, ContingencyTable
+from service.strategy.strategies import GainRatioMRQuestionStrategy, GainRatioQuestionStrategy, \
+    InformationGainMRQuestionStrategy, GiniMRQuestionStrategy, IMRJobQuestionStrategy, \
+    InformationGainQuestionStrategy, GiniQuestionStrategy
+
+MR_STRATEGIES = [InformationGainMRQuestionStrategy, GiniMRQuestionStrategy, GainRatioMRQuestionStrategy]
+
+
+@pytest.fixture(scope="module")
+def anime_sections():
+    # Sections of a knowledge base with one item per class: many features have the same gain ratio.
+    data, target_field = load_dataset("anime_25")
+    sections = [data] + [data.sample(frac=fraction, random_state=seed) for seed, fraction in
+                         enumerate([0.8, 0.6, 0.4, 0.3, 0.2])]
+    return [section.reset_index(drop=True) for section in sections], target_field
+
+
+@pytest.fixture(scope="module")
+def random_sections():
+    return [section for dataset in ("play_tennis", "criminal") for section in make_sections(dataset, [0, 2, 4], seed=1)]
+
+
+@pytest.mark.parametrize("in_memory", [True, False])
+def test_separate_and_fused_gain_ratio_jobs_agree(workdir, anime_sections, in_memory):
+    sections, target_field = anime_sections
+    separate = GainRatioMRQuestionStrategy(in_memory=in_memory, fused=False)
+    fused = GainRatioMRQuestionStrategy(in_memory=in_memory, fused=True)
+
+    for section in sections:
+        assert separate.find_best_feature(section, target_field) == fused.find_best_feature(section, target_field)
+
+
+@pytest.mark.parametrize("ratios", [[0.5, 0.5 + 1e-15, 0.25], [0.25, 0.5 + 1e-15, 0.5], [0.0, 0.0]])
+def test_reducers_break_gain_ratio_ties_as_the_strategy(ratios):
+    attributes = [f"attribute_{attribute_id}" for attribute_id in range(len(ratios))]
+    args = ["--target", "class", "--attributes", json.dumps(attributes)]
+    best_index = GainRatioQuestionStrategy().select_best(np.array(ratios))
+    # Without a positive ratio the strategy asks nothing, the jobs keep the last attribute.
+    expected = attributes[best_index] if best_index is not None else attributes[-1]
+
+    records = list(enumerate(ratios))
+    [(separate, __)] = GainRatioMapReducer(args=args).reducer_result(None, iter(records))
+    fused = dict(CriteriaMapReducer(args=args).reducer_result(
+        None, ((attribute_id, {CriteriaMapReducer.INFORMATION_GAIN: 0.0, CriteriaMapReducer.GAIN_RATIO: ratio,
+                               CriteriaMapReducer.GINI_IMPURITY: 0.5}) for attribute_id, ratio in records)))
+
+    assert separate == expected
+    assert fused[CriteriaMapReducer.GAIN_RATIO][0] == expected
+
+
+@pytest.mark.parametrize("strategy_class", MR_STRATEGIES)
+def test_in_memory_jobs_match_the_runner(workdir, random_sections, strategy_class):
+    in_memory = strategy_class(in_memory=True)
+    runner = strategy_class(in_memory=False)
+
+    for depth, section, target_field in random_sections:
+        with mock.patch.object(IMRJobQuestionStrategy, "save_input_to_file", side_effect=AssertionError("file")):
+            in_memory_outputs = in_memory.get_job_outputs(section, target_field)
+        assert in_memory_outputs == runner.get_job_outputs(section, target_field), depth
+    assert os.listdir("tmp") == []
+
+
+@pytest.mark.parametrize("chunk_rows", [None, 5])
+@pytest.mark.parametrize("strategy_class, kernel_strategy, pick", [
+    (InformationGainMRQuestionStrategy, InformationGainQuestionStrategy(), max),
+    (GiniMRQuestionStrategy, GiniQuestionStrategy(), min),
+])
+def test_job_scores_match_the_kernels(random_sections, strategy_class, kernel_strategy, pick, chunk_rows):
+    strategy = strategy_class(in_memory=True, chunk_rows=chunk_rows)
+    for depth, section, target_field in random_sections:
+        # The jobs never see the features without a known value.
+        section = section.dropna(axis=1, how="all")
+        [(best_feature, best_score)] = strategy.get_job_outputs(section, target_field)
+
+        encoded = EncodedSection.from_dataframe(section, target_field)
+        scores = kernel_strategy.score_features(ContingencyTable.from_section(encoded))
+        assert best_score == pytest.approx(pick(scores)), depth
+        assert scores[encoded.feature_index(best_feature)] == pytest.approx(best_score), depth
+
+
+def test_fused_job_scores_every_criterion_as_the_separate_jobs(workdir, random_sections):
+    fused = InformationGainMRQuestionStrategy(in_memory=True, fused=True)
+    for depth, section, target_field in random_sections:
+        criteria = fused.find_best_feature_per_criterion(section, target_field)
+        for strategy_class in MR_STRATEGIES:
+            separate = strategy_class(in_memory=True)
+            [(best_feature, best_score)] = separate.get_job_outputs(section, target_field)
+            fused_feature, fused_score = criteria[separate.get_criterion()]
+            assert (fused_feature, fused_score) == (best_feature, pytest.approx(best_score)), depth
+
+
+def test_fused_job_runs_once_per_section(workdir, random_sections):
+    __, section, target_field = random_sections[-1]
+    strategies = [strategy_class(in_memory=True, fused=True) for strategy_class in MR_STRATEGIES]
+    IMRJobQuestionStrategy._IMRJobQuestionStrategy__fused_results.clear()
+    with mock.patch.object(IMRJobQuestionStrategy, "get_job_outputs",
+                           autospec=True, side_effect=IMRJobQuestionStrategy.get_job_outputs) as get_job_outputs:
+        for strategy in strategies:
+            strategy.find_best_feature(section.copy(), target_field)
+    assert get_job_outputs.call_count == 1
+
+
+@pytest.mark.parametrize("strategy_class", MR_STRATEGIES)
+def test_row_chunks_match_the_column_input(workdir, random_sections, strategy_class):
+    column_input = strategy_class(in_memory=True)
+    chunked = [strategy_class(in_memory=True, chunk_rows=chunk_rows) for chunk_rows in (1, 7, 10000)]
+    chunked_runner = strategy_class(in_memory=False, chunk_rows=7)
+
+    for depth, section, target_field in random_sections:
+        [(best_feature, best_score)] = column_input.get_job_outputs(section, target_field)
+        for strategy in chunked + [chunked_runner]:
+            [(feature, score)] = strategy.get_job_outputs(section, target_field)
+            assert (feature, score) == (best_feature, pytest.approx(best_score)), (depth, strategy.chunk_rows)
+
+
+def test_chunk_rows_are_read_from_the_environment(monkeypatch):
+    monkeypatch.setenv("MR_CHUNK_ROWS", "64")
+    config = ServerConfig.from_environment()
+
+    assert config.mr_chunk_rows == 64
+    mr_strategies = [strategy for strategy in config.create_find_question_service().evaluator_list
+                     if hasattr(strategy, "chunk_rows")]
+    assert len(mr_strategies) == 3 and all(strategy.chunk_rows == 64 for strategy in mr_strategies)
+
+    monkeypatch.delenv("MR_CHUNK_ROWS")
+    assert ServerConfig.from_environment().mr_chunk_rows is None
@@ -0,0 +1,35 @@
+import pytest
+
+from business.config import ServerConfig
+from model.dto.guess_model import GuessInput, Question
+from service.guess_service import GuessService
+from service.opening_book import OpeningBookCompiler, OpeningBook, UNKNOWN_ANSWER
+from service.strategy.strategies import STRATEGY_NAMES
+
+
+def book_paths(node: dict | None, questions: list[Question]):
+    if node is None:
+        return
+    yield questions
+    for answer, child in node.get("children", {}).items():
+        question = Question(name=node["question"], answer=None if answer == UNKNOWN_ANSWER else answer)
+        yield from book_paths(child, questions + [question])
+
+
+@pytest.mark.parametrize("strategy_name", list(STRATEGY_NAMES))
+def test_compiled_book_matches_the_server(workdir, tennis_snapshot, strategy_name):
+    config = ServerConfig()
+    strategy = STRATEGY_NAMES[strategy_name]
+    # Two workers: the subtrees below the first question are compiled in other processes.
+    compiler = OpeningBookCompiler(tennis_snapshot, "tennis", config.create_find_question_service)
+    book = compiler.compile(strategy, 3, workers=2, split_depth=1)
+    book = OpeningBook.load(book.save("books"))
+
+    guess_service = GuessService(None, config.create_find_question_service(), tennis_snapshot.target_field,
+                                 tennis_snapshot)
+    paths = list(book_paths(book.root, []))
+    assert len(paths) > 1
+    for questions in paths:
+        expected = guess_service.predict_next_question(GuessInput(questions=questions), strategy)
+        result = book.lookup(questions)
+        assert (result.question, result.values, result.guess) == (expected.question, expected.values, expected.guess)
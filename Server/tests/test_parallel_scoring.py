@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from business.config import ServerConfig
+from service.strategy.kernels import ContingencyTable
+from service.strategy.parallel_scoring import ParallelScorer
+from service.strategy.strategies import InformationGainQuestionStrategy, GainRatioQuestionStrategy, \
+    GiniQuestionStrategy
+
+
+@pytest.fixture(scope="module")
+def scorer():
+    # Threshold 0: every section goes to the pool.
+    scorer = ParallelScorer(2, threshold_cells=0)
+    scorer.start()
+    yield scorer
+    scorer.close()
+
+
+def test_pool_started_without_fork(scorer):
+    assert scorer.executor is not None
+    assert scorer.executor._mp_context.get_start_method() in ("forkserver", "spawn")
+
+
+@pytest.mark.parametrize("strategy", [InformationGainQuestionStrategy(), GainRatioQuestionStrategy(),
+                                      GiniQuestionStrategy()], ids=lambda strategy: type(strategy).__name__)
+def test_parallel_scores_match_in_process(scorer, anime_snapshot, strategy):
+    section = anime_snapshot.section([])
+
+    assert scorer.accepts(section)
+    table = ContingencyTable.from_section(section, strategy.get_weights(section))
+    np.testing.assert_allclose(scorer.score(strategy, section), strategy.score_features(table))
+    assert strategy.find_best_feature_encoded(section, scorer) == strategy.find_best_feature_encoded(section)
+
+
+def test_parallel_scoring_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("PARALLEL_SCORING_WORKERS", raising=False)
+
+    assert ServerConfig().parallel_scoring_workers == 0
+    assert ServerConfig.from_environment().create_find_question_service().parallel_scorer is None
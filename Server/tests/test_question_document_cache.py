@@ -0,0 +1,109 @@
+import asyncio
+import email.utils
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from business import business
+from service.question_document_cache import QuestionDocumentCache
+
+DOCUMENTS = {
+    "Hair_Color": {"_id": "Hair_Color", "question": "What is the hair color?",
+                   "metadata": [{"value": "Red", "image_id": "red.jpg"}]},
+    "Glasses": {"_id": "Glasses", "question": "Does the character wear glasses?", "metadata": []},
+}
+
+
+def resolve_images(documents: list[dict]):
+    for document in documents:
+        for element in document.get("metadata", []):
+            element["image_url"] = f"https://lh3.example/{element['image_id']}"
+
+
+class StorageStandIn:
+
+    def __init__(self):
+        self.loads = 0
+
+    def get_all_questions(self) -> list[dict]:
+        return [json.loads(json.dumps(document)) for document in DOCUMENTS.values()]
+
+    async def get_question(self, question: str) -> dict | None:
+        self.loads += 1
+        document = DOCUMENTS.get(question)
+        return json.loads(json.dumps(document)) if document is not None else None
+
+
+def test_entries_expire(clock):
+    cache = QuestionDocumentCache(resolve_images, max_age_seconds=60.0)
+    entry = cache.put("anime", "Glasses", "v1", DOCUMENTS["Glasses"])
+
+    assert json.loads(entry.body) == DOCUMENTS["Glasses"]
+    assert cache.get("anime", "Glasses", "v1") is entry
+    assert cache.get("anime", "Glasses", "v2") is None
+    clock.advance(61.0)
+    assert cache.get("anime", "Glasses", "v1") is None
+
+
+def test_last_modified_is_kept_for_the_same_content(clock, monkeypatch):
+    cache = QuestionDocumentCache(resolve_images)
+    monkeypatch.setattr(time, "time", lambda: 1000.0)
+    first = cache.put("anime", "Glasses", "v1", DOCUMENTS["Glasses"])
+    monkeypatch.setattr(time, "time", lambda: 2000.0)
+    same = cache.put("anime", "Glasses", "v1", dict(DOCUMENTS["Glasses"]))
+    changed = cache.put("anime", "Glasses", "v1", dict(DOCUMENTS["Glasses"], question="Glasses?"))
+
+    assert (same.etag, same.last_modified) == (first.etag, 1000.0)
+    assert changed.etag != first.etag
+    assert changed.last_modified == 2000.0
+
+
+def test_warm_caches_the_current_version(clock):
+    cache = QuestionDocumentCache(resolve_images)
+    versions = iter(["v1", "v2"])
+    version = next(versions)
+    cache.register("anime", StorageStandIn(), lambda: version)
+
+    assert cache.warm("anime") == len(DOCUMENTS)
+    entry = cache.get("anime", "Hair_Color", "v1")
+    assert json.loads(entry.body)["metadata"][0]["image_url"] == "https://lh3.example/red.jpg"
+
+    version = next(versions)
+    cache.warm("anime")
+    assert cache.get("anime", "Hair_Color", "v1") is None
+    assert cache.stats()["size"] == len(DOCUMENTS)
+
+
+@pytest.fixture
+def question_services(monkeypatch):
+    storage_service = StorageStandIn()
+    cache = QuestionDocumentCache(resolve_images)
+    cache.register("anime", storage_service, lambda: "v1")
+    services = SimpleNamespace(question_document_cache=cache, resolve_image_urls=resolve_images,
+                               get_guess_service=lambda set_type: SimpleNamespace(
+                                   async_storage_service=storage_service))
+    monkeypatch.setattr(business, "services", services)
+    return storage_service
+
+
+def retrieve(question: str, if_none_match: str | None = None, if_modified_since: str | None = None):
+    return asyncio.run(business.retrieve_question(question, "anime", if_none_match, if_modified_since))
+
+
+def test_question_is_loaded_once_and_revalidated(question_services):
+    response = retrieve("Hair_Color")
+    assert response.status_code == 200
+    assert json.loads(response.body)["metadata"][0]["image_url"] == "https://lh3.example/red.jpg"
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    assert retrieve("Hair_Color", if_none_match=etag).status_code == 304
+    assert retrieve("Hair_Color", if_none_match='"other"').status_code == 200
+    assert retrieve("Hair_Color", if_modified_since=last_modified).status_code == 304
+    earlier = email.utils.formatdate(email.utils.parsedate_to_datetime(last_modified).timestamp() - 10, usegmt=True)
+    assert retrieve("Hair_Color", if_modified_since=earlier).status_code == 200
+    # If-Modified-Since is ignored next to an If-None-Match.
+    assert retrieve("Hair_Color", if_none_match='"other"', if_modified_since=last_modified).status_code == 200
+    assert question_services.loads == 1
@@ -0,0 +1,93 @@
+import gzip
+import importlib.util
+import json
+import os
+import random
+import shutil
+
+import numpy as np
+import pytest
+
+from service.metrics import RequestTrace
+from service.request_log import RequestLog
+
+ANALYZER_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "InitialExperiments", "analyze_request_log.py")
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    spec = importlib.util.spec_from_file_location("analyze_request_log", ANALYZER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_trace(request_id: str, strategy: str, section_rows: int, score_seconds: float) -> RequestTrace:
+    trace = RequestTrace(request_id)
+    trace.timings += [("retrieve", 0.001), ("score", score_seconds / 2), ("score", score_seconds / 2)]
+    trace.fields.update(knowledge_base="anime", strategy=strategy, section_rows=section_rows, source="section")
+    return trace
+
+
+def test_requests_are_written_as_json_lines(workdir):
+    request_log = RequestLog("logs/requests.jsonl")
+    request_log.write(make_trace("request-1", "gini_impurity", 25, 0.004), "POST", "/guess/anime", 200, 0.0061)
+    request_log.close()
+
+    with open("logs/requests.jsonl") as log_file:
+        [record] = [json.loads(line) for line in log_file]
+    assert record["request_id"] == "request-1"
+    assert (record["method"], record["route"], record["status"], record["total_ms"]) == \
+           ("POST", "/guess/anime", 200, 6.1)
+    assert record["stages_ms"] == {"retrieve": 1.0, "score": 4.0}
+    assert (record["strategy"], record["section_rows"], record["source"]) == ("gini_impurity", 25, "section")
+
+
+def test_logs_are_rotated(workdir):
+    request_log = RequestLog("logs/requests.jsonl", max_bytes=1024, backup_count=2)
+    for index in range(50):
+        request_log.write(make_trace(f"request-{index}", "gini_impurity", 25, 0.004), "POST", "/guess/anime", 200,
+                          0.005)
+    request_log.close()
+
+    assert sorted(os.listdir("logs")) == ["requests.jsonl", "requests.jsonl.1", "requests.jsonl.2"]
+    assert all(os.path.getsize(os.path.join("logs", name)) <= 1024 for name in os.listdir("logs"))
+
+
+def test_sketch_quantiles_are_within_the_accuracy(analyzer):
+    random.seed(12)
+    values = [random.lognormvariate(1.0, 1.5) for __ in range(20000)] + [0.0] * 100
+    sketch = analyzer.QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.1, 0.5, 0.9, 0.99):
+        expected = np.sort(values)[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(expected, rel=0.01)
+    assert sketch.quantile(0.0) == 0.0
+    assert sketch.max == max(values)
+    # The bins depend on the range of the values, not on their number.
+    assert len(sketch.bins) < 2000
+
+
+def test_analyzer_groups_by_strategy_and_section_size(workdir, analyzer):
+    request_log = RequestLog("logs/requests.jsonl")
+    for index in range(30):
+        request_log.write(make_trace(f"turn-{index}", "gini_impurity", 20 + index, 0.002 * (index + 1)),
+                          "POST", "/guess/anime", 200, 0.1)
+    request_log.write(make_trace("failed", "gini_impurity", 20, 1.0), "POST", "/guess/anime", 404, 1.0)
+    request_log.write(RequestTrace("stats"), "GET", "/stats/cache", 200, 0.001)
+    request_log.close()
+
+    # A compressed rotated log, and a line cut by a crash.
+    with open("logs/requests.jsonl", "rb") as log_file, gzip.open("logs/requests.jsonl.1.gz", "wb") as gz_file:
+        shutil.copyfileobj(log_file, gz_file)
+    with open("logs/requests.jsonl", "a") as log_file:
+        log_file.write('{"status": 200, "strat')
+
+    groups, used, skipped = analyzer.analyze(["logs/requests.jsonl", "logs/requests.jsonl.1.gz"], "score", "anime")
+    assert (used, skipped) == (60, 1)
+    assert {key: sketch.count for key, sketch in groups.items()} == {("gini_impurity", 25): 12,
+                                                                    ("gini_impurity", 50): 48}
+    assert groups[("gini_impurity", 50)].max == pytest.approx(60.0)
+    assert analyzer.analyze(["logs/requests.jsonl"], "score", "criminal")[1] == 0
@@ -0,0 +1,54 @@
+import random
+
+import numpy as np
+import pytest
+
+from benchmark.bitmap_filter import random_game
+from benchmark.section_counts import STRATEGIES, to_comparable
+from benchmark.section_queries import create_storage
+from model.dto.guess_model import GuessInput
+from service.find_question_service import FindQuestionService
+from service.guess_service import GuessService, GuessOptions
+from service.strategy.kernels import ContingencyTable
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["plain", "tokens"])
+def storage(request):
+    storage_service, snapshot = create_storage(None, "anime_25")
+    if request.param:
+        storage_service.migrate_to_token_schema()
+    return storage_service, snapshot
+
+
+def test_counts_match_the_section_tables(storage):
+    storage_service, snapshot = storage
+    random.seed(14)
+    for depth in (0, 2, 4):
+        questions = random_game(snapshot, depth)
+        section_counts = storage_service.get_section_counts(questions, snapshot.target_field)
+        section = snapshot.section(questions)
+
+        assert section_counts.n_rows == section.n_rows
+        assert sorted(section_counts.features) == sorted(section.features)
+        counts_table = section_counts.to_contingency_table()
+        section_table = ContingencyTable.from_section(section)
+        order = [section_counts.features.index(feature) for feature in section.features]
+        np.testing.assert_allclose(counts_table.information_gain()[order], section_table.information_gain())
+        np.testing.assert_allclose(counts_table.weighted_gini()[order], section_table.weighted_gini())
+
+
+def test_counts_turns_match_the_section_turns(storage):
+    storage_service, snapshot = storage
+    target_field = snapshot.target_field
+    find_question_service = FindQuestionService()
+    section_service = GuessService(storage_service, find_question_service, target_field)
+    counts_service = GuessService(storage_service, find_question_service, target_field,
+                                  options=GuessOptions(section_counts=True))
+
+    random.seed(15)
+    for depth in (2, 6):
+        questions = random_game(snapshot, depth)
+        for strategy in STRATEGIES:
+            guess_input = GuessInput(questions=questions)
+            assert to_comparable(counts_service.predict_next_question(guess_input, strategy)) == \
+                   to_comparable(section_service.predict_next_question(guess_input, strategy)), (questions, strategy)
@@ -0,0 +1,43 @@
+import importlib
+import threading
+
+from fastapi.testclient import TestClient
+
+from business import business
+from business.config import ServerConfig
+
+
+class ServicesStandIn:
+
+    def __init__(self, config: ServerConfig):
+        self.config = config
+        self.events = ["built"]
+
+    def start(self):
+        self.events.append("started")
+
+    def close(self):
+        self.events.append("closed")
+
+
+def test_import_starts_nothing(workdir):
+    threads = {thread.name for thread in threading.enumerate()}
+    server = importlib.import_module("server")
+
+    assert business.services is None
+    assert {thread.name for thread in threading.enumerate()} == threads
+    assert server.app.router.lifespan_context is not None
+
+
+def test_lifespan_builds_and_closes_the_services(workdir, monkeypatch):
+    server = importlib.import_module("server")
+    monkeypatch.setattr(business, "Services", ServicesStandIn)
+    monkeypatch.setenv("MR_SHARD_COUNT", "3")
+
+    with TestClient(server.app):
+        services = business.services
+        assert services.events == ["built", "started"]
+        assert services.config.mr_shard_count == 3
+
+    assert services.events == ["built", "started", "closed"]
+    assert business.services is None
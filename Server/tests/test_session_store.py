@@ -0,0 +1,164 @@
+import random
+
+import fastapi
+import pytest
+
+from benchmark.bitmap_filter import random_game
+from model.dto.guess_model import GuessInput, GuessOutput, Question
+from service.find_question_service import FindQuestionService
+from service.guess_service import GuessService, GuessOptions
+from service.session_store import SessionStore, GameSession
+from service.strategy.strategies import FindStrategy
+
+
+def new_session(store: SessionStore, bitmap: int = 0b1011):
+    session = store.new_session("v1", bitmap)
+    store.put(session)
+    return session
+
+
+def test_session_expires_without_turn(clock):
+    store = SessionStore(ttl_seconds=10.0)
+    session = new_session(store)
+
+    clock.advance(9.0)
+    assert store.get(session.session_id) is session
+    clock.advance(11.0)
+    assert store.get(session.session_id) is None
+    assert store.stats()["expired"] == 1
+    assert store.stats()["used_bytes"] == 0
+
+
+def test_get_refreshes_the_session(clock):
+    store = SessionStore(ttl_seconds=10.0)
+    session = new_session(store)
+
+    for __ in range(3):
+        clock.advance(8.0)
+        assert store.get(session.session_id) is session
+
+
+def test_expired_session_behind_a_live_one_is_dropped(clock):
+    store = SessionStore(ttl_seconds=10.0)
+    old = new_session(store)
+    clock.advance(5.0)
+    live = new_session(store)
+
+    # The old session moves behind the live one, then expires first.
+    assert store.get(old.session_id) is old
+    clock.advance(6.0)
+    assert store.get(live.session_id) is live
+    clock.advance(9.5)
+    assert store.get(old.session_id) is None
+    assert store.get(live.session_id) is live
+    assert store.stats()["sessions"] == 1
+
+
+def test_least_recently_used_sessions_are_evicted(clock):
+    store = SessionStore(ttl_seconds=10.0)
+    sessions = [new_session(store) for __ in range(3)]
+    store.max_bytes = store.used_bytes - 1
+
+    # The first session is used again, the second one is the least recently used.
+    assert store.get(sessions[0].session_id) is sessions[0]
+    new_session(store)
+
+    assert store.get(sessions[1].session_id) is None
+    assert store.get(sessions[0].session_id) is sessions[0]
+    assert store.stats()["evicted"] >= 1
+
+
+def play_session(guess_service: GuessService, questions: list[Question], strategy: FindStrategy) -> list[GuessOutput]:
+    # One answer per turn, the newest only, as a client in session mode.
+    results = [guess_service.predict_next_question(GuessInput(questions=[], start_session=True), strategy)]
+    for question in questions:
+        session_input = GuessInput(questions=[question], session_id=results[-1].session_id)
+        results.append(guess_service.predict_next_question(session_input, strategy))
+    return results
+
+
+def test_session_turns_match_stateless_turns(clock, anime_snapshot):
+    find_question_service = FindQuestionService()
+    target_field = anime_snapshot.target_field
+    store = SessionStore(ttl_seconds=10.0)
+    session_service = GuessService(None, find_question_service, target_field, anime_snapshot,
+                                   options=GuessOptions(session_store=store))
+    guess_service = GuessService(None, find_question_service, target_field, anime_snapshot)
+
+    random.seed(10)
+    for __ in range(5):
+        questions = random_game(anime_snapshot, 5)
+        for strategy in (FindStrategy.INFORMATION_GAIN, FindStrategy.GAIN_RATIO):
+            results = play_session(session_service, questions, strategy)
+            for depth, result in enumerate(results):
+                expected = guess_service.predict_next_question(GuessInput(questions=questions[:depth]), strategy)
+                assert result.session_id is not None
+                assert (result.question, result.values, result.guess) == \
+                       (expected.question, expected.values, expected.guess)
+
+
+def test_expired_session_turn_is_gone(clock, anime_snapshot):
+    store = SessionStore(ttl_seconds=10.0)
+    guess_service = GuessService(None, FindQuestionService(), anime_snapshot.target_field, anime_snapshot,
+                                 options=GuessOptions(session_store=store))
+    result = guess_service.predict_next_question(GuessInput(questions=[], start_session=True),
+                                                 FindStrategy.INFORMATION_GAIN)
+
+    clock.advance(11.0)
+    with pytest.raises(fastapi.HTTPException) as error:
+        guess_service.predict_next_question(GuessInput(questions=[], session_id=result.session_id),
+                                            FindStrategy.INFORMATION_GAIN)
+    assert error.value.status_code == 410
+
+
+def test_put_refuses_a_session_changed_meanwhile(clock):
+    store = SessionStore(ttl_seconds=10.0)
+    session = new_session(store)
+
+    first = GameSession(session.session_id, "v1", [Question(name="a", answer="1")], 0b1, session.turn + 1)
+    second = GameSession(session.session_id, "v1", [Question(name="b", answer="1")], 0b10, session.turn + 1)
+    assert store.put(first, expected_turn=session.turn)
+    assert not store.put(second, expected_turn=session.turn)
+    assert store.get(session.session_id) is first
+
+
+def session_service(anime_snapshot) -> GuessService:
+    return GuessService(None, FindQuestionService(), anime_snapshot.target_field, anime_snapshot,
+                        options=GuessOptions(session_store=SessionStore(ttl_seconds=10.0)))
+
+
+def test_retried_turn_does_not_answer_twice(clock, anime_snapshot):
+    guess_service = session_service(anime_snapshot)
+    random.seed(3)
+    question, other = random_game(anime_snapshot, 2)
+    start = guess_service.predict_next_question(GuessInput(questions=[], start_session=True))
+
+    turn_input = GuessInput(questions=[question], session_id=start.session_id)
+    result = guess_service.predict_next_question(turn_input)
+    assert guess_service.predict_next_question(turn_input) == result
+    duplicate = GuessInput(questions=[question, other, other], session_id=start.session_id)
+    guess_service.predict_next_question(duplicate)
+
+    session = guess_service.session_store.get(start.session_id)
+    assert [answered.name for answered in session.questions] == [question.name, other.name]
+    assert session.turn == 4
+
+
+def test_concurrent_turns_of_a_session_are_serialized(clock, anime_snapshot):
+    guess_service = session_service(anime_snapshot)
+    random.seed(4)
+    first, second = random_game(anime_snapshot, 2)
+    start = guess_service.predict_next_question(GuessInput(questions=[], start_session=True))
+    session = guess_service.session_store.get(start.session_id)
+
+    # The second turn starts from the same state as the first one, which is recorded meanwhile.
+    store_get = guess_service.session_store.get
+    stale = GameSession(session.session_id, session.version, list(session.questions), session.bitmap, session.turn)
+    guess_service.predict_next_question(GuessInput(questions=[first], session_id=start.session_id))
+    guess_service.session_store.get = lambda session_id: stale
+    with pytest.raises(fastapi.HTTPException) as error:
+        guess_service.predict_next_question(GuessInput(questions=[second], session_id=start.session_id))
+    guess_service.session_store.get = store_get
+
+    assert error.value.status_code == 409
+    assert [answered.name for answered in store_get(start.session_id).questions] == [first.name]
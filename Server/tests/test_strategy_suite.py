@@ -0,0 +1,46 @@
+import pytest
+
+from benchmark.strategy_suite import compare, make_sections, run
+
+
+def make_result(strategy: str = "gini_impurity", depth: int = 0, p50_ms: float = 1.0, rows: int = 14,
+                features: int = 4) -> dict:
+    return {"strategy": strategy, "dataset": "play_tennis", "depth": depth, "rows": rows, "features": features,
+            "p50_ms": p50_ms, "mean_ms": p50_ms}
+
+
+@pytest.mark.parametrize("p50_ms, regressions", [(1.05, 0), (1.2, 1), (0.5, 0)])
+def test_slower_cases_are_regressions(p50_ms, regressions):
+    baseline = {"results": [make_result()]}
+    current = {"results": [make_result(p50_ms=p50_ms)]}
+    assert len(compare(current, baseline, threshold=0.1, min_delta_ms=0.05)) == regressions
+
+
+def test_small_slowdowns_are_noise():
+    baseline = {"results": [make_result(p50_ms=0.01)]}
+    current = {"results": [make_result(p50_ms=0.03)]}
+    assert compare(current, baseline, threshold=0.1, min_delta_ms=0.05) == []
+
+
+def test_other_sections_are_reported_and_missing_cases_ignored():
+    baseline = {"results": [make_result(), make_result(depth=4)]}
+    current = {"results": [make_result(rows=13), make_result(strategy="gain_ratio")]}
+    [regression] = compare(current, baseline, threshold=0.1, min_delta_ms=0.05)
+    assert regression == "gini_impurity play_tennis depth 0: section is 13x4, was 14x4"
+
+
+def test_sections_are_reproducible():
+    first = make_sections("anime_25", [0, 2, 4], seed=3)
+    second = make_sections("anime_25", [0, 2, 4], seed=3)
+    assert [(depth, data.shape) for depth, data, __ in first] == [(depth, data.shape) for depth, data, __ in second]
+    assert all(first_data.equals(second_data) for (__, first_data, __), (__, second_data, __) in zip(first, second))
+
+
+def test_run_measures_the_six_strategies(workdir):
+    report = run(["play_tennis"], [0], repetitions=2, mr_repetitions=1, mr_runner=False, seed=0)
+    assert {result["strategy"] for result in report["results"]} == {
+        "information_gain", "gain_ratio", "gini_impurity",
+        "information_gain_mr", "gain_ratio_mr", "gini_impurity_mr"}
+    assert all(result["p50_ms"] > 0 and result["rows"] == 14 for result in report["results"])
+    # A run compared with itself has no regression.
+    assert compare(report, report, threshold=0.1, min_delta_ms=0.05) == []
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import random
+from unittest import mock
+
+import pytest
+
+import service.async_mongo_service
+from benchmark.bitmap_filter import random_game
+from benchmark.load_games import AsyncClientStandIn, MongoStandIn
+from benchmark.section_queries import create_storage, plan_stages, SCRATCH_DATABASE
+from model.dto.guess_model import Question
+from service.async_mongo_service import AsyncMongoService
+from service.mongo_service import MongoService
+
+# MongoDB server of the query plan tests, which mongomock does not have. The scratch database is dropped.
+MONGODB_TEST_CONNECTION = os.environ.get("MONGODB_TEST_CONNECTION")
+
+
+def insert_item(storage_service: MongoService, snapshot) -> dict:
+    item = {snapshot.target_field: "inserted after the migration", snapshot.attributes[0]: snapshot.values[0][0]}
+    storage_service.db["knowledge"].insert_one(item)
+    return item
+
+
+def test_items_without_tokens_fail_the_sections():
+    storage_service, snapshot = create_storage(None, "play_tennis")
+    questions = [Question(name=snapshot.attributes[0], answer=snapshot.values[0][0])]
+    storage_service.migrate_to_token_schema()
+    insert_item(storage_service, snapshot)
+
+    with pytest.raises(RuntimeError, match="1 knowledge items"):
+        list(storage_service.get_knowledge_section(questions))
+
+    storage_service.migrate_to_token_schema()
+    section = list(storage_service.get_knowledge_section(questions))
+    assert "inserted after the migration" in [item[snapshot.target_field] for item in section]
+
+
+def test_items_without_tokens_fail_the_async_sections():
+    storage_service, snapshot = create_storage(None, "play_tennis")
+    storage_service.migrate_to_token_schema()
+    insert_item(storage_service, snapshot)
+
+    with mock.patch.dict(MongoStandIn.clients, {"mongodb://localhost:27017/": storage_service.mongo_client}), \
+            mock.patch.object(service.async_mongo_service, "AsyncIOMotorClient", AsyncClientStandIn):
+        async_storage_service = AsyncMongoService("mongodb://localhost:27017/", SCRATCH_DATABASE)
+        with pytest.raises(RuntimeError):
+            asyncio.run(async_storage_service.get_knowledge_section([]))
+
+
+@pytest.mark.skipif(MONGODB_TEST_CONNECTION is None, reason="MONGODB_TEST_CONNECTION is not set")
+def test_token_sections_scan_the_multikey_indexes():
+    storage_service, snapshot = create_storage(MONGODB_TEST_CONNECTION, "anime_25")
+    try:
+        storage_service.migrate_to_token_schema()
+        random.seed(5)
+        for depth in (1, 2, 4, 8):
+            questions = random_game(snapshot, depth, unknown_rate=0.0)
+            # Reads the token schema of the migrated knowledge base.
+            list(storage_service.get_knowledge_section(questions))
+            query, projection = MongoService.build_section_query(questions, storage_service.token_attributes)
+            output = storage_service.db.command("explain", {"find": "knowledge", "filter": query,
+                                                            "projection": projection}, verbosity="queryPlanner")
+            winning_plan = output["queryPlanner"]["winningPlan"]
+            stages = plan_stages(winning_plan)
+
+            assert "IXSCAN" in stages and "COLLSCAN" not in stages, stages
+            assert index_scans(winning_plan) <= {(f"{MongoService.TOKENS_FIELD}_1", True),
+                                                 (f"{MongoService.MISSING_FIELD}_1", True)}
+    finally:
+        storage_service.mongo_client.drop_database(SCRATCH_DATABASE)
+
+
+def index_scans(plan: dict) -> set[tuple[str, bool]]:
+    """
+    (index name, multikey) of the index scans of a query plan.
+    """
+
+    scans = set()
+    if plan.get("stage") == "IXSCAN":
+        scans.add((plan["indexName"], plan.get("isMultiKey", False)))
+    for child in plan.get("inputStages", []) + [plan.get("inputStage", {})]:
+        if child:
+            scans |= index_scans(child)
+    return scans